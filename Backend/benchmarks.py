@@ -0,0 +1,361 @@
+"""
+Local benchmarks for the dashboard backend. Nothing here talks to AWS; every
+AWS-facing piece is replaced with an in-process stub.
+
+Usage:
+    python benchmarks.py stream --subscribers 500 --instances 20 --rounds 10
+    python benchmarks.py uptime --sizes 2 50 500 --latency 0.02
+    python benchmarks.py instrumentation --calls 5000
+    python benchmarks.py clients --regions eu-west-1 eu-west-2 --checks 20
+
+Each benchmark prints a JSON summary so results can be compared across changes.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Shared'))
+
+
+def _percentiles(samples):
+    """Summarises a list of seconds as milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+
+def bench_stream(args):
+    """
+    Opens many /api/stream subscribers against a stubbed data source and measures
+    how long each changed record takes to reach every subscriber.
+    """
+    from werkzeug.serving import make_server
+    import flaskBackend
+    from collector import MetricsCollector
+
+    configs = [{'id': f"i-{n:017x}", 'region': 'eu-west-2', 'name': f"Bench {n}"} for n in range(args.instances)]
+    current_round = [0]
+    sent_at = {}
+
+    def stub_cpu(instance_configs):
+        return [{"instanceId": c['id'], "region": c['region'], "cpu": current_round[0]} for c in instance_configs]
+
+    collector = MetricsCollector(
+        fetchers={'cpu': stub_cpu}, get_configs=lambda: configs,
+        interval=3600, on_update=flaskBackend.change_feed.publish,
+    )
+    flaskBackend.metrics_collector = collector
+    flaskBackend.limiter.enabled = False
+    collector.refresh(configs)
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, flaskBackend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    expected = args.instances * args.rounds
+    latencies = []
+    latencies_lock = threading.Lock()
+    ready = threading.Barrier(args.subscribers + 1)
+
+    def subscriber():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('GET', '/api/stream')
+        response = conn.getresponse()
+        initial, received, local = 0, 0, []
+        waiting = True
+        for raw in response:
+            line = raw.decode().rstrip('\n')
+            if not line.startswith('data: '):
+                continue
+            record = json.loads(line[6:])
+            if record['cpu'] == 0:
+                initial += 1
+                if initial == args.instances and waiting:
+                    waiting = False
+                    ready.wait()
+                continue
+            local.append(time.perf_counter() - sent_at[record['cpu']])
+            received += 1
+            if received == expected:
+                break
+        conn.close()
+        with latencies_lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(args.subscribers)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+
+    started = time.perf_counter()
+    for round_number in range(1, args.rounds + 1):
+        current_round[0] = round_number
+        sent_at[round_number] = time.perf_counter()
+        collector.refresh(configs)
+        time.sleep(args.pause)
+    for thread in threads:
+        thread.join(timeout=60)
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    return {
+        "benchmark": "stream",
+        "subscribers": args.subscribers,
+        "instances": args.instances,
+        "rounds": args.rounds,
+        "events_expected": expected * args.subscribers,
+        "events_delivered": len(latencies),
+        "wall_seconds": round(elapsed, 3),
+        "fanout_latency": _percentiles(latencies),
+    }
+
+
+def _fake_instance(instance_id):
+    return {
+        'InstanceId': instance_id,
+        'State': {'Code': 16, 'Name': 'running'},
+        'LaunchTime': datetime.now(timezone.utc) - timedelta(days=3),
+    }
+
+
+def _stubbed_ec2(latency, calls):
+    """An EC2 client whose DescribeInstances calls are counted and delayed by `latency` seconds."""
+    import boto3
+    from botocore.stub import Stubber
+
+    client = boto3.client('ec2', region_name='eu-west-2', aws_access_key_id='bench', aws_secret_access_key='bench')
+
+    def simulate_round_trip(**kwargs):
+        calls.append(time.perf_counter())
+        time.sleep(latency)
+
+    client.meta.events.register('before-parameter-build.ec2.DescribeInstances', simulate_round_trip)
+    return client, Stubber(client)
+
+
+def bench_uptime(args):
+    """
+    Compares the old per-instance boto3.resource + load() path with the batched
+    DescribeInstances path, counting calls and wall time for each fleet size.
+    """
+    from botocore.stub import Stubber
+    import boto3
+    from ec2_inventory import MAX_IDS_PER_FILTER, fetch_uptime_records
+
+    results = []
+    for size in args.sizes:
+        instance_ids = [f"i-{n:017x}" for n in range(size)]
+
+        legacy_calls = []
+
+        def simulate_round_trip(**kwargs):
+            legacy_calls.append(time.perf_counter())
+            time.sleep(args.latency)
+
+        started = time.perf_counter()
+        for instance_id in instance_ids:
+            resource = boto3.resource('ec2', region_name='eu-west-2', aws_access_key_id='bench', aws_secret_access_key='bench')
+            resource.meta.client.meta.events.register('before-parameter-build.ec2.DescribeInstances', simulate_round_trip)
+            with Stubber(resource.meta.client) as stubber:
+                stubber.add_response('describe_instances', {'Reservations': [{'Instances': [_fake_instance(instance_id)]}]})
+                instance = resource.Instance(instance_id)
+                instance.load()
+                _ = (instance.state['Name'], instance.launch_time)
+        legacy_seconds = time.perf_counter() - started
+
+        batched_calls = []
+        client, stubber = _stubbed_ec2(args.latency, batched_calls)
+        for offset in range(0, size, MAX_IDS_PER_FILTER):
+            chunk = instance_ids[offset:offset + MAX_IDS_PER_FILTER]
+            stubber.add_response('describe_instances', {'Reservations': [{'Instances': [_fake_instance(i) for i in chunk]}]})
+        with stubber:
+            started = time.perf_counter()
+            records = fetch_uptime_records(client, instance_ids, 'eu-west-2')
+            batched_seconds = time.perf_counter() - started
+        assert len(records) == size
+
+        results.append({
+            "instances": size,
+            "per_instance": {"describe_calls": len(legacy_calls), "wall_ms": round(legacy_seconds * 1000, 2)},
+            "batched": {"describe_calls": len(batched_calls), "wall_ms": round(batched_seconds * 1000, 2)},
+        })
+
+    return {"benchmark": "uptime", "simulated_latency_ms": args.latency * 1000, "results": results}
+
+
+def bench_instrumentation(args):
+    """
+    Measures what the metrics layer adds to each AWS call: the raw cost of one
+    histogram observation, the cost of the before-call/after-call events with and
+    without the hooks, and a plain vs instrumented stubbed client end to end
+    (the last is dominated by botocore itself, so it mostly shows the noise floor).
+    """
+    import boto3
+    from botocore.stub import Stubber
+    from instrumentation import MetricsRegistry, instrument_client
+
+    histogram = MetricsRegistry().histogram('bench_seconds', 'Benchmark histogram.', ('service', 'region', 'operation'))
+    labels = ('ec2', 'eu-west-2', 'DescribeInstances')
+    started = time.perf_counter()
+    for n in range(args.calls):
+        histogram.observe(labels, n * 1e-6)
+    observe_us = (time.perf_counter() - started) / args.calls * 1e6
+
+    def timed_calls(client):
+        stubber = Stubber(client)
+        for _ in range(args.calls):
+            stubber.add_response('describe_instances', {'Reservations': []})
+        with stubber:
+            client.describe_instances()  # Warm up the operation model and handler caches
+            started = time.perf_counter()
+            for _ in range(args.calls - 1):
+                client.describe_instances()
+            return (time.perf_counter() - started) / (args.calls - 1)
+
+    def new_client():
+        return boto3.client('ec2', region_name='eu-west-2', aws_access_key_id='bench', aws_secret_access_key='bench')
+
+    def timed_events(client):
+        model = client.meta.service_model.operation_model('DescribeInstances')
+        emit = client.meta.events.emit
+        parsed = {'Reservations': []}
+        started = time.perf_counter()
+        for _ in range(args.calls):
+            context = {}
+            emit('before-call.ec2.DescribeInstances', model=model, params={}, request_signer=None, context=context)
+            emit('after-call.ec2.DescribeInstances', http_response=None, parsed=parsed, model=model, context=context)
+        return (time.perf_counter() - started) / args.calls
+
+    # Best of several rounds, alternating, so background noise does not land on one side only.
+    plain, instrumented, plain_events, instrumented_events = [], [], [], []
+    for _ in range(args.rounds):
+        plain.append(timed_calls(new_client()))
+        instrumented.append(timed_calls(instrument_client(new_client())))
+        plain_events.append(timed_events(new_client()))
+        instrumented_events.append(timed_events(instrument_client(new_client())))
+
+    return {
+        "benchmark": "instrumentation",
+        "calls": args.calls,
+        "histogram_observe_us": round(observe_us, 3),
+        "hook_overhead_per_call_us": round((min(instrumented_events) - min(plain_events)) * 1e6, 3),
+        "stubbed_call_us": {"plain": round(min(plain) * 1e6, 2), "instrumented": round(min(instrumented) * 1e6, 2)},
+    }
+
+
+def bench_clients(args):
+    """
+    Startup and first-request cost of boto3 clients: the old eager module-level
+    client + resource, the first request on a cold vs a pre-warmed pool, and a
+    monitor check that creates a client every time vs one that reuses the pool.
+    Every measurement starts from a fresh boto3 session, so service models are
+    loaded again as they would be in a new process.
+    """
+    import boto3
+    from botocore.stub import Stubber
+    from client_pool import ClientPool
+
+    credentials = {'aws_access_key_id': 'bench', 'aws_secret_access_key': 'bench'}
+    session_factory = lambda: boto3.session.Session(**credentials)
+
+    def first_call(client):
+        with Stubber(client) as stubber:
+            stubber.add_response('describe_instances', {'Reservations': []})
+            client.describe_instances()
+
+    def ms(seconds):
+        return round(seconds * 1000, 2)
+
+    started = time.perf_counter()
+    session = session_factory()
+    session.client('ec2', region_name=args.regions[0])
+    session.resource('ec2', region_name=args.regions[0])
+    eager_import = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cold_pool = ClientPool(session_factory=session_factory)
+    lazy_import = time.perf_counter() - started
+    started = time.perf_counter()
+    for region in args.regions:
+        first_call(cold_pool.get('ec2', region))
+    cold_first = time.perf_counter() - started
+
+    warm_pool = ClientPool(session_factory=session_factory)
+    started = time.perf_counter()
+    warm_pool.prewarm(('ec2', 'cloudwatch'), args.regions, background=False)
+    prewarm_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for region in args.regions:
+        first_call(warm_pool.get('ec2', region))
+    warm_first = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.checks):
+        first_call(session_factory().client('ec2', region_name=args.regions[0]))
+    per_check_client = (time.perf_counter() - started) / args.checks
+
+    pooled = ClientPool(session_factory=session_factory)
+    started = time.perf_counter()
+    for _ in range(args.checks):
+        first_call(pooled.get('ec2', args.regions[0]))
+    per_check_pooled = (time.perf_counter() - started) / args.checks
+
+    return {
+        "benchmark": "clients",
+        "regions": args.regions,
+        "startup_ms": {"eager_client_and_resource": ms(eager_import), "lazy_pool": ms(lazy_import),
+                       "background_prewarm_ec2_cloudwatch": ms(prewarm_seconds)},
+        "first_request_ms": {"cold_pool": ms(cold_first), "prewarmed_pool": ms(warm_first)},
+        "monitor_check_ms": {"new_client_per_check": ms(per_check_client), "pooled_client": ms(per_check_pooled)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local backend benchmarks (no AWS calls).")
+    sub = parser.add_subparsers(dest='benchmark', required=True)
+
+    stream = sub.add_parser('stream', help="SSE fan-out latency with many subscribers")
+    stream.add_argument('--subscribers', type=int, default=200)
+    stream.add_argument('--instances', type=int, default=10)
+    stream.add_argument('--rounds', type=int, default=5)
+    stream.add_argument('--pause', type=float, default=0.2, help="Seconds between published rounds")
+    stream.set_defaults(run=bench_stream)
+
+    uptime = sub.add_parser('uptime', help="DescribeInstances calls and wall time, per-instance vs batched")
+    uptime.add_argument('--sizes', type=int, nargs='+', default=[2, 50, 500])
+    uptime.add_argument('--latency', type=float, default=0.02, help="Simulated seconds per AWS round trip")
+    uptime.set_defaults(run=bench_uptime)
+
+    instrumentation = sub.add_parser('instrumentation', help="Per-call overhead of the AWS call metrics hooks")
+    instrumentation.add_argument('--calls', type=int, default=5000)
+    instrumentation.add_argument('--rounds', type=int, default=5)
+    instrumentation.set_defaults(run=bench_instrumentation)
+
+    clients = sub.add_parser('clients', help="Client startup, first-request and per-check cost, eager vs pooled")
+    clients.add_argument('--regions', nargs='+', default=['eu-west-1', 'eu-west-2'])
+    clients.add_argument('--checks', type=int, default=20)
+    clients.set_defaults(run=bench_clients)
+
+    args = parser.parse_args()
+    print(json.dumps(args.run(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+CloudWatch metrics engine for the dashboard backend.
+
+Fetches the latest CPUUtilization value for every instance in a region with a
+single paginated GetMetricData call, instead of one GetMetricStatistics call
+per instance followed by a client-side sort.
+"""
+from datetime import datetime, timedelta, timezone
+
+CPU_LOOKBACK_MINUTES = 10
+CPU_PERIOD_SECONDS = 60
+# GetMetricData accepts at most 500 metric queries per request.
+MAX_QUERIES_PER_REQUEST = 500
+
+
+def _build_cpu_queries(instance_ids, period):
+    """Builds one MetricDataQuery per instance. Query ids must start with a lowercase letter."""
+    return [
+        {
+            'Id': f"cpu{index}",
+            'MetricStat': {
+                'Metric': {
+                    'Namespace': 'AWS/EC2',
+                    'MetricName': 'CPUUtilization',
+                    'Dimensions': [{'Name': 'InstanceId', 'Value': instance_id}],
+                },
+                'Period': period,
+                'Stat': 'Average',
+            },
+            'ReturnData': True,
+        }
+        for index, instance_id in enumerate(instance_ids)
+    ]
+
+
+def fetch_latest_cpu(cloudwatch, instance_ids, lookback_minutes=CPU_LOOKBACK_MINUTES, period=CPU_PERIOD_SECONDS):
+    """
+    Gets the most recent average CPU utilisation for each instance in one region.
+
+    Uses ScanBy=TimestampDescending so CloudWatch returns the newest datapoint
+    first for every query; only that first value is kept, no sorting is done here.
+    Returns a dict of instance_id -> {"cpu": float|None, plus "timestamp" of the
+    datapoint, or "message"/"error" when there is no value}.
+    Raises whatever the client raises if the request as a whole fails.
+    """
+    results = {}
+    end_time = datetime.now(timezone.utc)
+    start_time = end_time - timedelta(minutes=lookback_minutes)
+    paginator = cloudwatch.get_paginator('get_metric_data')
+
+    for offset in range(0, len(instance_ids), MAX_QUERIES_PER_REQUEST):
+        chunk = instance_ids[offset:offset + MAX_QUERIES_PER_REQUEST]
+        query_to_instance = {f"cpu{index}": instance_id for index, instance_id in enumerate(chunk)}
+        latest = {}
+        failures = {}
+
+        pages = paginator.paginate(
+            MetricDataQueries=_build_cpu_queries(chunk, period),
+            StartTime=start_time,
+            EndTime=end_time,
+            ScanBy='TimestampDescending',
+        )
+        for page in pages:
+            for result in page.get('MetricDataResults', []):
+                query_id = result['Id']
+                # A series can continue on a later page; the first value seen is the newest.
+                if query_id not in latest and result.get('Values'):
+                    latest[query_id] = (result['Values'][0], result['Timestamps'][0])
+                if result.get('StatusCode') in ('Forbidden', 'InternalError'):
+                    messages = "; ".join(m.get('Value', '') for m in result.get('Messages', []))
+                    failures[query_id] = f"CloudWatch returned {result['StatusCode']}" + (f": {messages}" if messages else "")
+
+        for query_id, instance_id in query_to_instance.items():
+            if query_id in latest:
+                value, timestamp = latest[query_id]
+                results[instance_id] = {"cpu": round(value, 2), "timestamp": timestamp.isoformat()}
+            elif query_id in failures:
+                results[instance_id] = {"cpu": None, "error": failures[query_id]}
+            else:
+                results[instance_id] = {
+                    "cpu": None,
+                    "message": f"No CPU data points found for this instance in the last {lookback_minutes} minutes."
+                }
+    return results
+
+
+def fetch_cpu_series(cloudwatch, instance_id, start_time, end_time, period):
+    """
+    Gets the average CPU series for one instance between two datetimes, oldest first.
+    Used to backfill gaps in the local history store. Returns [(datetime, value), ...].
+    """
+    points = []
+    paginator = cloudwatch.get_paginator('get_metric_data')
+    pages = paginator.paginate(
+        MetricDataQueries=_build_cpu_queries([instance_id], period),
+        StartTime=start_time,
+        EndTime=end_time,
+        ScanBy='TimestampAscending',
+    )
+    for page in pages:
+        for result in page.get('MetricDataResults', []):
+            points.extend(zip(result.get('Timestamps', []), result.get('Values', [])))
+    return points
@@ -0,0 +1,132 @@
+"""
+Background metrics collector with a shared in-memory snapshot.
+
+A single thread refreshes every configured instance on a schedule, and the API
+endpoints serve from the snapshot instead of going to AWS per browser tab.
+Entries older than the TTL are still served (stale-while-revalidate) while the
+collector is woken to refresh them; entries that are missing, e.g. right after
+an invalidation, are fetched synchronously for just those instances; concurrent
+requests for the same missing entry share one fetch.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+COLLECTOR_INTERVAL_SECONDS = float(os.getenv('METRICS_COLLECTOR_INTERVAL_SECONDS', '30'))
+SNAPSHOT_TTL_SECONDS = float(os.getenv('METRICS_SNAPSHOT_TTL_SECONDS', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsCollector:
+    """
+    Keeps the latest record per (kind, instanceId, region).
+
+    `fetchers` maps a kind such as 'cpu' or 'uptime' to a callable that takes a
+    list of instance configs and returns one record per config, each carrying
+    "instanceId" and "region". `get_configs` returns the instances to refresh.
+    `on_update(kind, records)`, if given, is called after every fetch.
+    """
+
+    def __init__(self, fetchers, get_configs, interval=COLLECTOR_INTERVAL_SECONDS, ttl=SNAPSHOT_TTL_SECONDS, on_update=None):
+        self.fetchers = fetchers
+        self.get_configs = get_configs
+        self.on_update = on_update
+        self.interval = interval
+        self.ttl = ttl
+        self._entries = {kind: {} for kind in fetchers}  # kind -> {(id, region): (record, fetched_at)}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._inflight = {}  # (kind, id, region) -> Event set when the request fetching it is done
+        self._thread = None
+
+    def start(self):
+        """Starts the collector thread once; safe to call on every request."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='metrics-collector', daemon=True)
+            self._thread.start()
+        logger.info(f"Metrics collector started (interval {self.interval:g}s, TTL {self.ttl:g}s)")
+
+    def _run(self):
+        while True:
+            # Cleared before the refresh, not after the wait: a wake-up that arrives while
+            # refreshing (e.g. an invalidate()) then triggers another refresh straight away.
+            self._wake.clear()
+            try:
+                self.refresh(self.get_configs())
+            except Exception as e:
+                logger.error(f"Metrics collector refresh failed: {e}")
+            self._wake.wait(self.interval)
+
+    def refresh(self, configs, kinds=None):
+        """Fetches fresh records for the given configs and stores them in the snapshot."""
+        if not configs:
+            return
+        for kind in kinds or self.fetchers:
+            records = self.fetchers[kind](configs)
+            fetched_at = time.time()
+            with self._lock:
+                for record in records:
+                    self._entries[kind][(record['instanceId'], record['region'])] = (record, fetched_at)
+            if self.on_update:
+                self.on_update(kind, records)
+
+    def invalidate(self, instance_id, region):
+        """Drops every cached record for an instance so the next read fetches it from AWS."""
+        with self._lock:
+            for entries in self._entries.values():
+                entries.pop((instance_id, region), None)
+        self._wake.set()
+
+    def get(self, kind, configs):
+        """
+        Returns one record per config from the snapshot, annotated with "fetchedAt" and "age".
+        """
+        self.start()
+        done = threading.Event()
+        missing, pending = [], set()
+        with self._lock:
+            for config in configs:
+                key = (config['id'], config['region'])
+                if key in self._entries[kind]:
+                    continue
+                inflight = self._inflight.get((kind, *key))
+                if inflight is None:
+                    self._inflight[(kind, *key)] = done
+                    missing.append(config)
+                else:
+                    pending.add(inflight)  # Another request is already fetching it
+        if missing:
+            try:
+                self.refresh(missing, kinds=[kind])
+            finally:
+                with self._lock:
+                    for config in missing:
+                        self._inflight.pop((kind, config['id'], config['region']), None)
+                done.set()
+        for inflight in pending:
+            inflight.wait()
+
+        now = time.time()
+        records = []
+        stale = False
+        with self._lock:
+            for config in configs:
+                cached = self._entries[kind].get((config['id'], config['region']))
+                if cached is None:
+                    continue
+                record, fetched_at = cached
+                age = now - fetched_at
+                stale = stale or age > self.ttl
+                records.append({
+                    **record,
+                    "fetchedAt": datetime.fromtimestamp(fetched_at, timezone.utc).isoformat(),
+                    "age": round(age, 1),
+                })
+        if stale:
+            self._wake.set()  # Serve what we have now, refresh in the background.
+        return records
@@ -0,0 +1,83 @@
+"""
+Batched EC2 instance lookups for the dashboard backend.
+
+Describes every configured instance in a region with one paginated
+DescribeInstances call and builds the uptime records straight from the client
+response, instead of loading a boto3 resource per instance per request.
+"""
+from datetime import datetime, timezone
+
+# Values allowed in a single DescribeInstances filter.
+MAX_IDS_PER_FILTER = 200
+DESCRIBE_PAGE_SIZE = 1000
+
+
+def describe_instances_by_id(ec2_client, instance_ids):
+    """
+    Returns a dict of instance_id -> instance description for one region.
+
+    Filters by instance-id rather than passing InstanceIds, so an id that no
+    longer exists is simply missing from the result instead of failing the
+    whole call with InvalidInstanceID.NotFound.
+    """
+    found = {}
+    paginator = ec2_client.get_paginator('describe_instances')
+    for offset in range(0, len(instance_ids), MAX_IDS_PER_FILTER):
+        chunk = instance_ids[offset:offset + MAX_IDS_PER_FILTER]
+        pages = paginator.paginate(
+            Filters=[{'Name': 'instance-id', 'Values': chunk}],
+            PaginationConfig={'PageSize': DESCRIBE_PAGE_SIZE},
+        )
+        for page in pages:
+            for reservation in page.get('Reservations', []):
+                for instance in reservation.get('Instances', []):
+                    found[instance['InstanceId']] = instance
+    return found
+
+
+def build_uptime_record(instance_id, region, instance_state, launch_time):
+    """Builds the /api/uptime record for one instance from its state and launch time."""
+    uptime_str = instance_state.capitalize()
+    uptime_d = 0
+
+    if instance_state == 'running' and launch_time:
+        now_utc = datetime.now(timezone.utc)
+        uptime_delta = now_utc - launch_time
+
+        days = uptime_delta.days
+        hours, remainder = divmod(uptime_delta.seconds, 3600)
+        minutes, _ = divmod(remainder, 60)
+
+        uptime_str = f"{days}d {hours}h {minutes}m"
+        uptime_d = round(uptime_delta.total_seconds() / (24 * 3600), 2)
+    elif not launch_time and instance_state == 'running':
+        uptime_str = "Running (launch time unavailable)"
+
+    return {
+        "instanceId": instance_id, "region": region,
+        "uptime": uptime_str, "uptime_days": uptime_d, "status": instance_state,
+        "launchTime": launch_time.isoformat() if launch_time else None
+    }
+
+
+def fetch_uptime_records(ec2_client, instance_ids, region):
+    """
+    Returns a dict of instance_id -> uptime record for every requested id in one region.
+    Raises whatever the client raises if the request as a whole fails.
+    """
+    instances = describe_instances_by_id(ec2_client, instance_ids)
+    records = {}
+    for instance_id in instance_ids:
+        instance = instances.get(instance_id)
+        if instance is None:
+            records[instance_id] = {
+                "instanceId": instance_id, "region": region, "uptime": "Error",
+                "uptime_days": 0, "status": "Error",
+                "error": f"Instance {instance_id} not found in region {region}."
+            }
+            continue
+        # LaunchTime is already a timezone-aware (UTC) datetime in the client response.
+        records[instance_id] = build_uptime_record(
+            instance_id, region, instance['State']['Name'], instance.get('LaunchTime')
+        )
+    return records
@@ -0,0 +1,71 @@
+"""
+Change feed behind the /api/stream Server-Sent Events endpoint.
+
+The metrics collector publishes every refresh here; only records that actually
+changed get a new sequence id. Subscribers never talk to AWS, they wait on a
+shared condition and are handed the records newer than the last id they saw,
+which is also how a reconnect with Last-Event-ID resumes without a full reload.
+"""
+import json
+import threading
+import time
+
+STREAM_KEEPALIVE_SECONDS = 15
+
+
+class ChangeFeed:
+    """Latest record per (kind, instanceId, region), each tagged with the sequence id of its last change."""
+
+    def __init__(self):
+        # Seeded from the clock so ids keep increasing across backend restarts
+        # and a reconnecting browser never holds an id from the "future".
+        self.seq = int(time.time() * 1000)
+        self._latest = {}  # (kind, instance_id, region) -> (seq, kind, record)
+        self._condition = threading.Condition()
+
+    def publish(self, kind, records):
+        """Stores a batch of records, assigning new sequence ids only to the ones that changed."""
+        with self._condition:
+            changed = False
+            for record in records:
+                key = (kind, record['instanceId'], record['region'])
+                current = self._latest.get(key)
+                if current is not None and current[2] == record:
+                    continue
+                self.seq += 1
+                self._latest[key] = (self.seq, kind, record)
+                changed = True
+            if changed:
+                self._condition.notify_all()
+
+    def changes_since(self, last_seq, timeout=None):
+        """
+        Returns [(seq, kind, record), ...] newer than last_seq in sequence order,
+        waiting up to `timeout` seconds for something to change. Empty on timeout.
+        """
+        with self._condition:
+            if self.seq <= last_seq:
+                self._condition.wait(timeout)
+            if self.seq <= last_seq:
+                return []
+            return sorted(entry for entry in self._latest.values() if entry[0] > last_seq)
+
+    def subscribe(self, last_event_id=None, keepalive=STREAM_KEEPALIVE_SECONDS):
+        """
+        Yields SSE-formatted chunks forever. Without a last_event_id the client
+        first receives the current state of every instance.
+        """
+        try:
+            last_seq = int(last_event_id) if last_event_id else 0
+        except ValueError:
+            last_seq = 0
+
+        yield "retry: 3000\n\n"
+        while True:
+            events = self.changes_since(last_seq, timeout=keepalive)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for seq, kind, record in events:
+                yield f"id: {seq}\nevent: {kind}\ndata: {json.dumps(record, default=str)}\n\n"
+                last_seq = seq
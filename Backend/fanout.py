@@ -0,0 +1,42 @@
+"""
+Bounded concurrent fan-out for AWS calls.
+
+Runs one task per region/instance on a shared worker pool so an endpoint's
+latency is roughly that of its slowest call instead of the sum of all calls.
+Results always come back in the order the tasks were given.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+
+FANOUT_MAX_WORKERS = int(os.getenv('AWS_FANOUT_MAX_WORKERS', '16'))
+AWS_CALL_TIMEOUT_SECONDS = float(os.getenv('AWS_CALL_TIMEOUT_SECONDS', '5'))
+
+_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_WORKERS, thread_name_prefix='aws-fanout')
+
+
+def fan_out(tasks, timeout=AWS_CALL_TIMEOUT_SECONDS):
+    """
+    Runs (key, callable) tasks concurrently and returns [(key, result, error), ...] in task order.
+
+    Each call gets `timeout` seconds. When there are more tasks than workers the
+    overall wait is stretched by the number of rounds the pool needs, so queued
+    calls get the same budget as the first ones. A call that misses its deadline
+    is reported with a TimeoutError; it is cancelled if it has not started yet.
+    """
+    if not tasks:
+        return []
+
+    futures = [_executor.submit(fn) for _, fn in tasks]
+    rounds = math.ceil(len(tasks) / FANOUT_MAX_WORKERS)
+    wait(futures, timeout=timeout * rounds)
+
+    merged = []
+    for (key, _), future in zip(tasks, futures):
+        if not future.done():
+            future.cancel()
+            merged.append((key, None, FuturesTimeoutError(f"Call did not complete within {timeout:g} seconds")))
+            continue
+        error = future.exception()
+        merged.append((key, None if error else future.result(), error))
+    return merged
@@ -1,23 +1,39 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-import boto3
-from datetime import datetime, timedelta, timezone
+from botocore.config import Config
+from datetime import datetime, timezone
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import atexit
+import gzip
 import os
+import sys
+import time
+from functools import partial
 from dotenv import load_dotenv # For loading .env file
 
-# Loads .env file
+# Loads .env file before the local modules below, which read their settings when imported
 load_dotenv()
 
-app = Flask(__name__)
+from cloudwatch_metrics import fetch_cpu_series, fetch_latest_cpu
+from ec2_inventory import fetch_uptime_records
+from fanout import fan_out, AWS_CALL_TIMEOUT_SECONDS
+from collector import MetricsCollector
+from instance_jobs import JobTracker, MAX_JOB_INSTANCES, TARGET_STATES
+from instance_registry import InstanceRegistry, DR_DISCOVERY_REGIONS
+from event_stream import ChangeFeed
+from history_store import HistoryStore, parse_range, resolution_for_range
+from fleet_query import QueryError, build_rows, page_etag, query_rows, to_columnar
+
+# Modules shared with the failover monitor live in ../Shared (copied next to this file in the Docker image).
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Shared'))
+from instrumentation import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS_REGISTRY, instrument_client
+from client_pool import AWS_PREWARM_CLIENTS, ClientPool
+from health_checks import fetch_region_health
 
-REGION = os.getenv("AWS_REGION", "eu-west-2") # Use environment variable, default to eu-west-2
-ec2 = boto3.client('ec2', region_name=REGION)
-ec2_resource = boto3.resource('ec2', region_name=REGION) # Added for instance description and state
+app = Flask(__name__)
 
 CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000", "http://10.0.0.253:3000"]}})
-instance_id = 'i-072c32506d067a13a' # EC2 instance ID
 
 # Set up rate limiting
 limiter = Limiter(
@@ -32,16 +48,19 @@ AWS_REGION_PRIMARY = os.getenv('AWS_REGION_PRIMARY')
 INSTANCE_ID_SECONDARY = os.getenv('INSTANCE_ID_SECONDARY')
 AWS_REGION_SECONDARY = os.getenv('AWS_REGION_SECONDARY') 
 
-def get_instance_configs():
+def _static_instance_configs():
     """
     Builds a list of instance configurations from specific environment variables.
+    These are always tracked, alongside any instances discovered by tag.
     """
     configs = []
     if INSTANCE_ID_PRIMARY and AWS_REGION_PRIMARY:
         configs.append({
             'id': INSTANCE_ID_PRIMARY,
             'region': AWS_REGION_PRIMARY,
-            'name': 'Primary EC2' 
+            'name': 'Primary EC2',
+            'role': 'primary',
+            'pair': 'default'
         })
         app.logger.info(f"Primary instance configured: {INSTANCE_ID_PRIMARY} in {AWS_REGION_PRIMARY}")
     else:
@@ -51,30 +70,255 @@ def get_instance_configs():
         configs.append({
             'id': INSTANCE_ID_SECONDARY,
             'region': AWS_REGION_SECONDARY,
-            'name': 'Secondary EC2'
+            'name': 'Secondary EC2',
+            'role': 'backup',
+            'pair': 'default'
         })
         app.logger.info(f"Secondary instance configured: {INSTANCE_ID_SECONDARY} in {AWS_REGION_SECONDARY}")
     
-    if not configs:
-        app.logger.error("CRITICAL: No EC2 instances have been configured in the .env file. Backend API will not return EC2 data.")
+    if not configs and not DR_DISCOVERY_REGIONS:
+        app.logger.error("CRITICAL: No EC2 instances configured in the .env file and DR_DISCOVERY_REGIONS is empty. Backend API will not return EC2 data.")
     return configs
 
-# --- Helper function to get Boto3 clients (cached) ---
-# This is good for performance and managing clients for different regions.
-boto_clients_cache = {}
+# Per-call deadlines for AWS requests, so one slow region cannot hold a request open.
+AWS_CLIENT_CONFIG = Config(
+    connect_timeout=AWS_CALL_TIMEOUT_SECONDS,
+    read_timeout=AWS_CALL_TIMEOUT_SECONDS,
+    retries={'max_attempts': 2, 'mode': 'standard'},
+)
+
+# --- Boto3 clients ---
+# One shared pool (see Shared/client_pool.py): clients are created lazily per service and
+# region from a single session, with pooled keep-alive connections, and every call is instrumented.
+aws_clients = ClientPool(config=AWS_CLIENT_CONFIG, on_create=instrument_client)
 
 def get_boto_client(service_name, region_name):
-    """Gets a Boto3 client for a given service and region, caching it."""
-    cache_key = f"{service_name}_{region_name}"
-    if cache_key not in boto_clients_cache:
-        try:
-            boto_clients_cache[cache_key] = boto3.client(service_name, region_name=region_name)
-            app.logger.info(f"Successfully created Boto3 client for {service_name} in region: {region_name}")
-        except Exception as e:
-            app.logger.error(f"Error creating Boto3 {service_name} client for region {region_name}: {e}")
-            return None
-    return boto_clients_cache[cache_key]
+    """Gets the shared Boto3 client for a given service and region, or None if it cannot be created."""
+    try:
+        return aws_clients.get(service_name, region_name)
+    except Exception as e:
+        app.logger.error(f"Error creating Boto3 {service_name} client for region {region_name}: {e}")
+        return None
+
+# Fleet registry: tag-discovered instances plus the ones from .env, indexed for O(1) lookups.
+# Built once at startup; discovery is refreshed in the background.
+STATIC_INSTANCE_CONFIGS = _static_instance_configs()
+instance_registry = InstanceRegistry(
+    get_client=get_boto_client,
+    regions=DR_DISCOVERY_REGIONS or [config['region'] for config in STATIC_INSTANCE_CONFIGS],
+    static_configs=STATIC_INSTANCE_CONFIGS,
+)
 
+if AWS_PREWARM_CLIENTS:
+    # Build the clients the first requests will need while the server is starting up.
+    aws_clients.prewarm(('ec2', 'cloudwatch'), instance_registry.regions + [c['region'] for c in STATIC_INSTANCE_CONFIGS])
+
+def get_instance_configs():
+    """Returns every tracked instance config from the registry."""
+    return instance_registry.configs()
+
+def group_configs_by_region(instance_configs):
+    """Groups instance configs by region, keeping the configured order within each region."""
+    grouped = {}
+    for config in instance_configs:
+        grouped.setdefault(config['region'], []).append(config)
+    return grouped
+
+
+# --- Data collection (used by the background collector) ---
+
+def _fetch_region_cpu(region, instance_ids):
+    """Fetches the latest CPU value for every instance in one region."""
+    cloudwatch = get_boto_client('cloudwatch', region)
+    if not cloudwatch:
+        return {
+            instance_id: {
+                "cpu": None,
+                "error": f"Could not initialize CloudWatch client for region {region}. AWS credentials/permissions issue?"
+            }
+            for instance_id in instance_ids
+        }
+    return fetch_latest_cpu(cloudwatch, instance_ids)
+
+
+def collect_cpu_records(instance_configs):
+    """Fetches CPU records from CloudWatch for the given instances, in config order."""
+    # One GetMetricData call per region covers every instance in that region;
+    # regions are queried concurrently.
+    tasks = [
+        (region, partial(_fetch_region_cpu, region, [config['id'] for config in region_configs]))
+        for region, region_configs in group_configs_by_region(instance_configs).items()
+    ]
+    cpu_by_instance = {}
+    for region, region_results, error in fan_out(tasks):
+        if error:
+            app.logger.error(f"Error fetching CPU for instances in {region}: {error}")
+            region_results = {
+                config['id']: {"cpu": None, "error": str(error)}
+                for config in instance_configs if config['region'] == region
+            }
+        for instance_id, result in region_results.items():
+            cpu_by_instance[(instance_id, region)] = result
+
+    all_cpu_data = [
+        {"instanceId": config['id'], "region": config['region'], **cpu_by_instance[(config['id'], config['region'])]}
+        for config in instance_configs
+    ]
+    return all_cpu_data
+
+
+def _fetch_region_uptime(region, instance_ids):
+    """Describes every instance in one region with a single batched DescribeInstances call."""
+    ec2_client = get_boto_client('ec2', region)
+    if not ec2_client:
+        return {
+            instance_id: {
+                "instanceId": instance_id, "region": region, "uptime": "Error",
+                "uptime_days": 0, "status": "Error",
+                "error": f"Could not get EC2 client for region {region}. AWS credentials/permissions issue?"
+            }
+            for instance_id in instance_ids
+        }
+    return fetch_uptime_records(ec2_client, instance_ids, region)
+
+
+def collect_uptime_records(instance_configs):
+    """Fetches uptime/state records from EC2 for the given instances, in config order."""
+    # One DescribeInstances call per region; regions are queried concurrently.
+    tasks = [
+        (region, partial(_fetch_region_uptime, region, [config['id'] for config in region_configs]))
+        for region, region_configs in group_configs_by_region(instance_configs).items()
+    ]
+    uptime_by_instance = {}
+    for region, region_records, error in fan_out(tasks):
+        if error:
+            app.logger.error(f"Error fetching uptime for instances in {region}: {error}")
+            region_records = {
+                config['id']: {
+                    "instanceId": config['id'], "region": region, "uptime": "Error",
+                    "uptime_days": 0, "status": "Error",
+                    "error": f"Could not get EC2 instance details. AWS credentials/permissions issue? Error: {str(error)}"
+                }
+                for config in instance_configs if config['region'] == region
+            }
+        for instance_id, record in region_records.items():
+            uptime_by_instance[(instance_id, region)] = record
+
+    return [uptime_by_instance[(config['id'], config['region'])] for config in instance_configs]
+
+
+def _fetch_region_health(region, instance_ids):
+    """Status checks and alarm state for every instance in one region: one DescribeInstanceStatus and one DescribeAlarms."""
+    ec2_client = get_boto_client('ec2', region)
+    if not ec2_client:
+        raise RuntimeError(f"Could not get EC2 client for region {region}. AWS credentials/permissions issue?")
+    return fetch_region_health(ec2_client, get_boto_client('cloudwatch', region), region, instance_ids)
+
+
+def collect_health_records(instance_configs):
+    """Fetches status-check/alarm health records for the given instances, in config order."""
+    # A fixed number of calls per region whatever the number of instances; regions are queried concurrently.
+    tasks = [
+        (region, partial(_fetch_region_health, region, [config['id'] for config in region_configs]))
+        for region, region_configs in group_configs_by_region(instance_configs).items()
+    ]
+    health_by_instance = {}
+    for region, region_records, error in fan_out(tasks):
+        if error:
+            app.logger.error(f"Error fetching health for instances in {region}: {error}")
+            region_records = {
+                config['id']: {
+                    "instanceId": config['id'], "region": region, "state": None, "health": "unknown",
+                    "systemStatus": None, "instanceStatus": None, "alarms": [], "reasons": [],
+                    "error": f"Could not get instance status. AWS credentials/permissions issue? Error: {str(error)}"
+                }
+                for config in instance_configs if config['region'] == region
+            }
+        for instance_id, record in region_records.items():
+            health_by_instance[(instance_id, region)] = record
+
+    return [health_by_instance[(config['id'], config['region'])] for config in instance_configs]
+
+
+# Every collector refresh is pushed to the change feed behind /api/stream.
+change_feed = ChangeFeed()
+
+# Local CPU history, fed by the collector and backfilled from CloudWatch only for gaps.
+history_store = HistoryStore()
+atexit.register(history_store.flush)
+HISTORY_BACKFILL_RETRY_SECONDS = 300
+_history_backfill_attempts = {} # (instance_id, resolution) -> time of the last CloudWatch backfill
+
+def _backfill_cpu_history(config, resolution, empty_buckets):
+    """
+    Fills empty history buckets from CloudWatch with one GetMetricData call.
+    Returns True if anything was fetched. Each series is backfilled at most once
+    per HISTORY_BACKFILL_RETRY_SECONDS so gaps CloudWatch cannot fill are not re-requested.
+    """
+    # The newest couple of buckets are usually empty only because CloudWatch has not published yet.
+    settled = [b for b in empty_buckets if b < time.time() - 2 * resolution]
+    attempt_key = (config['id'], resolution)
+    if not settled or time.time() - _history_backfill_attempts.get(attempt_key, 0) < HISTORY_BACKFILL_RETRY_SECONDS:
+        return False
+    _history_backfill_attempts[attempt_key] = time.time()
+
+    cloudwatch = get_boto_client('cloudwatch', config['region'])
+    if not cloudwatch:
+        return False
+    try:
+        series = fetch_cpu_series(
+            cloudwatch, config['id'],
+            datetime.fromtimestamp(settled[0], timezone.utc),
+            datetime.fromtimestamp(settled[-1] + resolution, timezone.utc),
+            resolution,
+        )
+    except Exception as e:
+        app.logger.error(f"Error backfilling CPU history for {config['id']} in {config['region']}: {e}")
+        return False
+    for timestamp, value in series:
+        history_store.record_rollup(config['id'], 'cpu', resolution, timestamp.timestamp(), value)
+    return bool(series)
+
+def _on_collector_update(kind, records):
+    """Pushes every collector refresh to the SSE change feed and the CPU history."""
+    change_feed.publish(kind, records)
+    if kind == 'cpu':
+        for record in records:
+            if record.get('cpu') is not None and record.get('timestamp'):
+                history_store.record(
+                    record['instanceId'], 'cpu', datetime.fromisoformat(record['timestamp']).timestamp(), record['cpu']
+                )
+
+# Shared snapshot served to every client; refreshed by a background thread.
+metrics_collector = MetricsCollector(
+    fetchers={'cpu': collect_cpu_records, 'uptime': collect_uptime_records, 'health': collect_health_records},
+    get_configs=get_instance_configs,
+    on_update=_on_collector_update,
+)
+
+# Bulk start/stop jobs; every observed state change drops the instance's cached records.
+instance_jobs = JobTracker(get_boto_client, on_instance_changed=metrics_collector.invalidate)
+
+
+# --- Request metrics ---
+HTTP_REQUEST_SECONDS = METRICS_REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to build the response for each Flask endpoint.', ('endpoint', 'method'))
+HTTP_REQUESTS = METRICS_REGISTRY.counter(
+    'http_requests_total', 'Requests served by each Flask endpoint, by status code.', ('endpoint', 'method', 'status'))
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    # Streaming responses (/api/stream) are timed until the stream is handed to the server.
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe((endpoint, request.method), time.perf_counter() - started)
+        HTTP_REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+    return response
 
 
 # --- API Endpoints ---
@@ -84,120 +328,152 @@ def get_server_status_check():
     """A simple endpoint to check if the backend is running."""
     return jsonify({"message": "Backend is running", "timestamp": datetime.now(timezone.utc).isoformat()}), 200
 
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def get_metrics():
+    """Prometheus scrape endpoint: AWS call latency/errors/throttles and per-endpoint request latency."""
+    return Response(METRICS_REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/cpu', methods=['GET'])
 def get_cpu_utilization_all():
     instance_configs = get_instance_configs()
     if not instance_configs:
-        return jsonify({"error": "No EC2 instances configured on the backend. Please check backend .env file and logs."}), 500
+        return jsonify({"error": "No EC2 instances configured on the backend. Please check backend .env file, DR instance tags and logs."}), 500
 
-    all_cpu_data = []
-    for config in instance_configs:
-        instance_id = config['id']
-        region = config['region']
-        cloudwatch = get_boto_client('cloudwatch', region)
+    return jsonify(metrics_collector.get('cpu', instance_configs))
 
-        if not cloudwatch:
-            all_cpu_data.append({
-                "instanceId": instance_id, "region": region, "cpu": None,
-                "error": f"Could not initialize CloudWatch client for region {region}. AWS credentials/permissions issue?"
-            })
-            continue
-        
-        try:
-            response = cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2', MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}],
-                StartTime=datetime.now(timezone.utc) - timedelta(minutes=10), # From user's original code
-                EndTime=datetime.now(timezone.utc),
-                Period=60, # From user's original code
-                Statistics=['Average']
-            )
-            if response['Datapoints']:
-                latest_datapoint = sorted(response['Datapoints'], key=lambda x: x['Timestamp'], reverse=True)[0]
-                all_cpu_data.append({
-                    "instanceId": instance_id, "region": region, 
-                    "cpu": round(latest_datapoint['Average'], 2)
-                })
-            else:
-                all_cpu_data.append({
-                    "instanceId": instance_id, "region": region, "cpu": None,
-                    "message": "No CPU data points found for this instance in the last 10 minutes."
-                })
-        except Exception as e:
-            app.logger.error(f"Error fetching CPU for {instance_id} in {region}: {e}")
-            all_cpu_data.append({
-                "instanceId": instance_id, "region": region, "cpu": None, "error": str(e)
-            })
-            
-    return jsonify(all_cpu_data)
+
+@app.route('/api/cpu/history', methods=['GET'])
+def get_cpu_history():
+    """
+    CPU history for one instance from the local store, e.g. ?instance_id=i-...&range=6h.
+    The resolution (60, 300 or 3600 seconds) is picked from the range; points are [epochSeconds, average].
+    """
+    instance_id = request.args.get('instance_id')
+    if not instance_id:
+        return jsonify({"error": "Missing 'instance_id' query parameter"}), 400
+    config = instance_registry.get(instance_id)
+    if not config:
+        return jsonify({"error": f"Instance {instance_id} is not tracked by this backend"}), 404
+    try:
+        range_seconds = parse_range(request.args.get('range', '1h'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    resolution = resolution_for_range(range_seconds)
+    end = time.time()
+    start = end - range_seconds
+    points, empty = history_store.query(instance_id, 'cpu', start, end, resolution)
+    backfilled = bool(empty) and _backfill_cpu_history(config, resolution, empty)
+    if backfilled:
+        points, empty = history_store.query(instance_id, 'cpu', start, end, resolution)
+
+    return jsonify({
+        "instanceId": instance_id, "region": config['region'],
+        "range": request.args.get('range', '1h'), "resolution": resolution,
+        "points": points, "backfilled": backfilled
+    })
 
 
 @app.route('/api/uptime', methods=['GET'])
 def get_instance_uptime_all():
     instance_configs = get_instance_configs()
     if not instance_configs:
-        return jsonify({"error": "No EC2 instances configured on the backend. Please check backend .env file and logs."}), 500
+        return jsonify({"error": "No EC2 instances configured on the backend. Please check backend .env file, DR instance tags and logs."}), 500
 
-    all_uptime_data = []
-    for config in instance_configs:
-        instance_id = config['id']
-        region = config['region']
-        # For uptime, EC2 resource is convenient for launch_time and state
-        # We are not caching resource clients here for simplicity, but you could.
-        try:
-            ec2_resource_client = boto3.resource('ec2', region_name=region)
-            instance = ec2_resource_client.Instance(instance_id)
-            instance.load() # Make sure instance data is loaded
-        except Exception as e:
-            app.logger.error(f"Error creating EC2 resource or loading instance {instance_id} in {region}: {e}")
-            all_uptime_data.append({
-                "instanceId": instance_id, "region": region, "uptime": "Error",
-                "uptime_days": 0, "status": "Error", 
-                "error": f"Could not get EC2 instance details. AWS credentials/permissions or instance ID issue? Error: {str(e)}"
-            })
-            continue
-            
-        try:
-            instance_state = instance.state['Name']
-            launch_time = instance.launch_time # This is already timezone-aware (UTC)
-            
-            uptime_str = instance_state.capitalize()
-            uptime_d = 0
-            status = instance_state
-
-            if instance_state == 'running' and launch_time:
-                now_utc = datetime.now(timezone.utc)
-                uptime_delta = now_utc - launch_time
-                
-                days = uptime_delta.days
-                hours, remainder = divmod(uptime_delta.seconds, 3600)
-                minutes, _ = divmod(remainder, 60)
-                
-                uptime_str = f"{days}d {hours}h {minutes}m"
-                uptime_d = round(uptime_delta.total_seconds() / (24 * 3600), 2)
-            elif not launch_time and instance_state == 'running':
-                uptime_str = "Running (launch time unavailable)"
-
-
-            all_uptime_data.append({
-                "instanceId": instance_id, "region": region,
-                "uptime": uptime_str, "uptime_days": uptime_d, "status": status,
-                "launchTime": launch_time.isoformat() if launch_time else None
-            })
-        except Exception as e:
-            app.logger.error(f"Error processing uptime for {instance_id} in {region}: {e}")
-            all_uptime_data.append({
-                "instanceId": instance_id, "region": region, "uptime": "Processing Error",
-                "uptime_days": 0, "status": "Error", "error": str(e)
-            })
-            
-    return jsonify(all_uptime_data)
+    return jsonify(metrics_collector.get('uptime', instance_configs))
+
+
+@app.route('/api/health', methods=['GET'])
+def get_instance_health_all():
+    """
+    EC2 system/instance status checks and CloudWatch alarm state per instance, with an overall
+    verdict ('healthy', 'impaired', 'initializing', 'down' or 'unknown') and counts per verdict.
+    """
+    instance_configs = get_instance_configs()
+    if not instance_configs:
+        return jsonify({"error": "No EC2 instances configured on the backend. Please check backend .env file, DR instance tags and logs."}), 500
+
+    records = metrics_collector.get('health', instance_configs)
+    summary = {}
+    for record in records:
+        summary[record['health']] = summary.get(record['health'], 0) + 1
+    return jsonify({"summary": summary, "instances": records})
+
+
+@app.route('/api/instances', methods=['GET'])
+def query_instances():
+    """
+    One row per instance (state, CPU, uptime, role, pair), filterable by
+    region/state/role, sortable and cursor-paginated. ?format=columnar returns
+    each field as a list. Responses carry a weak ETag and are gzipped when the
+    client accepts it; an unchanged poll with If-None-Match gets a 304.
+    """
+    instance_configs = get_instance_configs()
+    if not instance_configs:
+        return jsonify({"error": "No EC2 instances configured on the backend. Please check backend .env file, DR instance tags and logs."}), 500
+
+    rows = build_rows(
+        instance_configs,
+        metrics_collector.get('cpu', instance_configs),
+        metrics_collector.get('uptime', instance_configs),
+    )
+    try:
+        page, next_cursor, total = query_rows(rows, request.args)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+
+    output_format = request.args.get('format', 'rows')
+    if output_format == 'columnar':
+        payload = {"count": len(page), "total": total, "nextCursor": next_cursor, "columns": to_columnar(page)}
+    elif output_format == 'rows':
+        payload = {"count": len(page), "total": total, "nextCursor": next_cursor, "instances": page}
+    else:
+        return jsonify({"error": "'format' must be 'rows' or 'columnar'"}), 400
+
+    response = jsonify(payload)
+    body = response.get_data()
+    etag = page_etag(page, total, next_cursor, output_format)
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '') and len(body) > 1024
+    if use_gzip:
+        etag += '-gz' # Each encoding is a separate representation
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Weak: the tag ignores fetchedAt, so equal tags mean the same rows, not byte-identical bodies.
+    response.set_etag(etag, weak=True)
+
+    if request.if_none_match.contains_weak(etag):
+        response.status_code = 304
+        response.set_data(b'')
+        return response
+    if use_gzip:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@app.route('/api/stream', methods=['GET'])
+def stream_instance_updates():
+    """
+    Server-Sent Events stream of instance records. Each event is a 'cpu', 'uptime' or 'health'
+    record that changed, with a sequence id; browsers resend it as Last-Event-ID on reconnect.
+    """
+    metrics_collector.start()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    return Response(
+        stream_with_context(change_feed.subscribe(last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 @app.route('/api/start', methods=['POST'])
 def start_instance_req():
     instance_id = request.args.get('instance_id')
     region = request.args.get('region')
+    if instance_id and not region:
+        # The region can be omitted for instances the registry knows about.
+        known = instance_registry.get(instance_id)
+        region = known['region'] if known else None
 
     if not instance_id or not region:
         return jsonify({"error": "Missing 'instance_id' or 'region' query parameter"}), 400
@@ -209,6 +485,7 @@ def start_instance_req():
     try:
         response = ec2_control_client.start_instances(InstanceIds=[instance_id])
         app.logger.info(f"Start instance API call response for {instance_id} in {region}: {response}")
+        metrics_collector.invalidate(instance_id, region) # Next read shows the new state, not the cached one
         return jsonify({
             "message": f"Start initiated for instance {instance_id} in {region}",
             "instanceId": instance_id, "region": region,
@@ -225,6 +502,10 @@ def start_instance_req():
 def stop_instance_req():
     instance_id = request.args.get('instance_id')
     region = request.args.get('region')
+    if instance_id and not region:
+        # The region can be omitted for instances the registry knows about.
+        known = instance_registry.get(instance_id)
+        region = known['region'] if known else None
 
     if not instance_id or not region:
         return jsonify({"error": "Missing 'instance_id' or 'region' query parameter"}), 400
@@ -236,6 +517,7 @@ def stop_instance_req():
     try:
         response = ec2_control_client.stop_instances(InstanceIds=[instance_id])
         app.logger.info(f"Stop instance API call response for {instance_id} in {region}: {response}")
+        metrics_collector.invalidate(instance_id, region) # Next read shows the new state, not the cached one
         return jsonify({
             "message": f"Stop initiated for instance {instance_id} in {region}",
             "instanceId": instance_id, "region": region,
@@ -248,6 +530,56 @@ def stop_instance_req():
             "instanceId": instance_id, "region": region
         }), 500
 
+@app.route('/api/instances/actions', methods=['POST'])
+def submit_instance_action():
+    """
+    Starts or stops many instances as one job. Body: {"action": "start"|"stop", "instances": [...]}
+    where each instance is an id (region looked up in the registry) or {"instanceId", "region"}.
+    Returns 202 with the job; follow its progress at /api/jobs/<jobId>.
+    """
+    payload = request.get_json(silent=True) or {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    action = payload.get('action')
+    if action not in TARGET_STATES:
+        return jsonify({"error": "'action' must be 'start' or 'stop'"}), 400
+    entries = payload.get('instances')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "'instances' must be a non-empty list"}), 400
+    if len(entries) > MAX_JOB_INSTANCES:
+        return jsonify({"error": f"At most {MAX_JOB_INSTANCES} instances per job"}), 400
+
+    targets, unresolved, seen = [], [], set()
+    for index, entry in enumerate(entries):
+        if isinstance(entry, dict):
+            instance_id, region = entry.get('instanceId'), entry.get('region')
+        else:
+            instance_id, region = entry, None
+        if not isinstance(instance_id, str) or not (region is None or isinstance(region, str)):
+            return jsonify({"error": f"Instance {index}: 'instanceId' and 'region' must be strings", "index": index}), 400
+        if instance_id and not region:
+            known = instance_registry.get(instance_id)
+            region = known['region'] if known else None
+        if not instance_id or not region:
+            unresolved.append(entry)
+        elif (instance_id, region) not in seen:
+            seen.add((instance_id, region))
+            targets.append((instance_id, region))
+    if unresolved:
+        return jsonify({"error": "Each instance needs an 'instanceId' and a 'region' (which can be omitted for known instances)",
+                        "instances": unresolved}), 400
+
+    job = instance_jobs.submit(action, targets)
+    app.logger.info(f"Job {job['jobId']}: {action} {len(targets)} instance(s)")
+    return jsonify(job), 202, {'Location': f"/api/jobs/{job['jobId']}"}
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_instance_job(job_id):
+    job = instance_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job)
+
 if __name__ == '__main__':
     # Enable Flask's built-in logger to see messages in console
     app.logger.setLevel(os.getenv('FLASK_LOG_LEVEL', 'INFO').upper())
@@ -0,0 +1,158 @@
+"""
+Query helpers behind /api/instances.
+
+Joins the CPU and uptime snapshots into one row per instance, then applies
+server-side filtering, sorting and keyset (cursor) pagination, and can encode
+the page column-by-column so large fleets do not repeat every key per row.
+"""
+import base64
+import hashlib
+import json
+from functools import cmp_to_key
+
+INSTANCE_FIELDS = [
+    'instanceId', 'region', 'name', 'role', 'pair', 'status', 'cpu',
+    'uptime', 'uptime_days', 'launchTime', 'fetchedAt', 'error',
+]
+SORTABLE_FIELDS = {'instanceId', 'region', 'name', 'role', 'pair', 'status', 'cpu', 'uptime_days', 'launchTime'}
+NUMERIC_FIELDS = {'cpu', 'uptime_days'}
+VOLATILE_FIELDS = {'fetchedAt'} # Changes on every refresh even when nothing else does
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class QueryError(ValueError):
+    """Raised for invalid query parameters; the message is safe to return to the client."""
+
+
+def build_rows(instance_configs, cpu_records, uptime_records):
+    """Merges config, CPU and uptime records into one row per instance, in config order."""
+    cpu_by_key = {(r['instanceId'], r['region']): r for r in cpu_records}
+    uptime_by_key = {(r['instanceId'], r['region']): r for r in uptime_records}
+    rows = []
+    for config in instance_configs:
+        key = (config['id'], config['region'])
+        cpu = cpu_by_key.get(key, {})
+        uptime = uptime_by_key.get(key, {})
+        errors = [e for e in (uptime.get('error'), cpu.get('error')) if e]
+        rows.append({
+            'instanceId': config['id'],
+            'region': config['region'],
+            'name': config.get('name'),
+            'role': config.get('role'),
+            'pair': config.get('pair'),
+            'status': uptime.get('status'),
+            'cpu': cpu.get('cpu'),
+            'uptime': uptime.get('uptime'),
+            'uptime_days': uptime.get('uptime_days'),
+            'launchTime': uptime.get('launchTime'),
+            # The older of the two reads, so clients know the worst-case freshness.
+            'fetchedAt': min(filter(None, (cpu.get('fetchedAt'), uptime.get('fetchedAt'))), default=None),
+            'error': "; ".join(errors) if errors else None,
+        })
+    return rows
+
+
+def _split(value):
+    return {v.strip() for v in value.split(',') if v.strip()} if value else None
+
+
+def _sort_key(row, field):
+    # instanceId breaks ties so the order is total and cursors are unambiguous.
+    value = row.get(field)
+    return (value is None, value if value is not None else 0, row['instanceId'])
+
+
+def _compare(a, b, descending):
+    """Orders sort keys; rows missing the field always come last, in either direction."""
+    if a[0] != b[0]:
+        return 1 if a[0] else -1
+    if a[1:] == b[1:]:
+        return 0
+    before = a[1:] < b[1:]
+    return (1 if before else -1) if descending else (-1 if before else 1)
+
+
+def _encode_cursor(key, field, descending):
+    payload = json.dumps({'k': key, 'f': field, 'd': descending})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, field, descending):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = tuple(payload['k'])
+    except Exception:
+        raise QueryError("Invalid 'cursor' parameter")
+    if payload.get('f') != field or payload.get('d') != descending:
+        raise QueryError("'cursor' does not match the requested sort order")
+    if not _valid_key(key, field):
+        raise QueryError("Invalid 'cursor' parameter")
+    return key
+
+
+def _valid_key(key, field):
+    """Checks a decoded cursor key has the shape _sort_key gives `field`, so comparing it cannot raise."""
+    if len(key) != 3 or not isinstance(key[0], bool) or not isinstance(key[2], str):
+        return False
+    missing, value = key[0], key[1]
+    if missing:
+        return value == 0 and not isinstance(value, bool)
+    if field in NUMERIC_FIELDS:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, str)
+
+
+def query_rows(rows, args):
+    """
+    Applies filters, sort and pagination from the request args.
+
+    Supported args: region, state, role (comma-separated lists), sort (field,
+    prefix '-' for descending), limit and cursor. Returns (page, next_cursor, total)
+    where total counts the rows matching the filters.
+    """
+    regions, states, roles = _split(args.get('region')), _split(args.get('state')), _split(args.get('role'))
+    matching = [
+        row for row in rows
+        if (regions is None or row['region'] in regions)
+        and (states is None or row['status'] in states)
+        and (roles is None or row['role'] in roles)
+    ]
+
+    sort = args.get('sort', 'instanceId')
+    descending = sort.startswith('-')
+    field = sort.lstrip('-')
+    if field not in SORTABLE_FIELDS:
+        raise QueryError(f"Cannot sort by '{field}'. Sortable fields: {', '.join(sorted(SORTABLE_FIELDS))}")
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise QueryError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise QueryError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+
+    keyed = sorted(
+        ((_sort_key(row, field), row) for row in matching),
+        key=cmp_to_key(lambda x, y: _compare(x[0], y[0], descending)),
+    )
+    if args.get('cursor'):
+        after = _decode_cursor(args['cursor'], field, descending)
+        keyed = [item for item in keyed if _compare(item[0], after, descending) > 0]
+
+    page = keyed[:limit]
+    next_cursor = _encode_cursor(page[-1][0], field, descending) if len(keyed) > limit else None
+    return [row for _, row in page], next_cursor, len(matching)
+
+
+def to_columnar(rows, fields=INSTANCE_FIELDS):
+    """Encodes rows as {field: [values...]} so each key appears once per page."""
+    return {field: [row.get(field) for row in rows] for field in fields}
+
+
+def page_etag(page, total, next_cursor, output_format):
+    """An ETag for a page built from its row data and paging fields, ignoring VOLATILE_FIELDS."""
+    rows = [{field: value for field, value in row.items() if field not in VOLATILE_FIELDS} for row in page]
+    source = json.dumps([output_format, total, next_cursor, rows], sort_keys=True, default=str)
+    return hashlib.sha1(source.encode()).hexdigest()
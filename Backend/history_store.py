@@ -0,0 +1,194 @@
+"""
+Local time-series history for instance metrics.
+
+Each (instance, metric) series is a fixed-size, array-backed ring buffer at
+three resolutions: 1-minute, 5-minute and 1-hour. A sample is written to its
+1-minute slot and folded into the matching 5-minute and 1-hour rollups, so
+trend queries never need to go back to CloudWatch once the data is local.
+
+Slots are addressed by bucket time (bucket_start // resolution % capacity) and
+remember which bucket they hold, so a slot left over from an earlier lap of the
+ring is simply treated as empty and no head/tail bookkeeping is needed.
+
+A rollup slot filled by record_rollup (a CloudWatch backfill) already holds the
+average of the whole bucket, so it is stored with a negative count to mark it
+final; later 1-minute samples in that bucket are not folded into it.
+
+When HISTORY_DIR is set every series lives in its own memory-mapped file there,
+so history survives backend restarts; otherwise it is kept in process memory.
+"""
+import mmap
+import os
+import re
+import threading
+
+HISTORY_DIR = os.getenv('HISTORY_DIR')
+
+# (resolution in seconds, number of slots): 1 day of minutes, 7 days of 5 minutes, 90 days of hours.
+RESOLUTIONS = ((60, 1440), (300, 2016), (3600, 2160))
+_SLOT_WIDTH = 3  # bucket start, sum, count (negative for a final slot); all stored as float64
+_FORMAT_VERSION = 1.0
+_HEADER_DOUBLES = 2  # format version, layout checksum
+
+_RANGE_PATTERN = re.compile(r'^(\d+)([mhd])$')
+_RANGE_UNITS = {'m': 60, 'h': 3600, 'd': 86400}
+MAX_RANGE_SECONDS = RESOLUTIONS[-1][0] * RESOLUTIONS[-1][1]
+
+
+def parse_range(value):
+    """Parses '30m', '6h' or '7d' into seconds. Raises ValueError if invalid or too long."""
+    match = _RANGE_PATTERN.match(value or '')
+    if not match:
+        raise ValueError("'range' must look like 30m, 6h or 7d")
+    seconds = int(match.group(1)) * _RANGE_UNITS[match.group(2)]
+    if not 0 < seconds <= MAX_RANGE_SECONDS:
+        raise ValueError(f"'range' must be between 1m and {MAX_RANGE_SECONDS // 86400}d")
+    return seconds
+
+
+def resolution_for_range(range_seconds):
+    """Picks the finest resolution whose ring still covers the whole range."""
+    for resolution, capacity in RESOLUTIONS:
+        if range_seconds <= resolution * capacity:
+            return resolution
+    return RESOLUTIONS[-1][0]
+
+
+class _Series:
+    """One metric for one instance: a float64 view over a bytearray or an mmapped file."""
+
+    _layout = list(RESOLUTIONS)
+    _size = (_HEADER_DOUBLES + sum(cap for _, cap in RESOLUTIONS) * _SLOT_WIDTH) * 8
+
+    def __init__(self, path=None):
+        self._file = None
+        self._mmap = None
+        if path:
+            fresh = not os.path.exists(path) or os.path.getsize(path) != self._size
+            self._file = open(path, 'r+b' if not fresh else 'w+b')
+            if fresh:
+                self._file.truncate(self._size)
+            self._mmap = mmap.mmap(self._file.fileno(), self._size)
+            self._values = memoryview(self._mmap).cast('d')
+        else:
+            fresh = True
+            self._values = memoryview(bytearray(self._size)).cast('d')
+
+        checksum = float(sum(res * cap for res, cap in self._layout))
+        if fresh or self._values[0] != _FORMAT_VERSION or self._values[1] != checksum:
+            # New file, or one written with a different ring layout: start empty.
+            self._values[:] = memoryview(bytearray(self._size)).cast('d')
+            self._values[0], self._values[1] = _FORMAT_VERSION, checksum
+
+        # Offset (in doubles) of each resolution's ring inside the buffer.
+        self._offsets = {}
+        offset = _HEADER_DOUBLES
+        for resolution, capacity in self._layout:
+            self._offsets[resolution] = (offset, capacity)
+            offset += capacity * _SLOT_WIDTH
+
+    def _slot(self, resolution, bucket):
+        offset, capacity = self._offsets[resolution]
+        return offset + (bucket // resolution % capacity) * _SLOT_WIDTH
+
+    def _read(self, resolution, bucket):
+        """Returns (sum, count) for a bucket, or None if the slot holds another bucket."""
+        i = self._slot(resolution, bucket)
+        values = self._values
+        if values[i] != bucket or values[i + 2] == 0:
+            return None
+        return values[i + 1], abs(values[i + 2])
+
+    def _add(self, resolution, bucket, delta_sum, delta_count):
+        i = self._slot(resolution, bucket)
+        values = self._values
+        if values[i] != bucket:
+            values[i], values[i + 1], values[i + 2] = bucket, 0.0, 0.0
+        elif values[i + 2] < 0:
+            return  # Final: backfilled with the whole bucket's average
+        values[i + 1] += delta_sum
+        values[i + 2] += delta_count
+
+    def record(self, timestamp, value):
+        """
+        Sets the 1-minute value for `timestamp` and adjusts the rollups. Recording
+        the same minute again replaces it, so repeated reads of one datapoint are harmless.
+        """
+        minute = int(timestamp) // 60 * 60
+        previous = self._read(60, minute)
+        if previous is None:
+            delta_sum, delta_count = value, 1.0
+        else:
+            delta_sum, delta_count = value - previous[0], 0.0
+        i = self._slot(60, minute)
+        self._values[i], self._values[i + 1], self._values[i + 2] = minute, value, 1.0
+        for resolution, _ in self._layout[1:]:
+            self._add(resolution, minute // resolution * resolution, delta_sum, delta_count)
+
+    def record_rollup(self, resolution, timestamp, value):
+        """
+        Stores a coarse datapoint (e.g. a CloudWatch backfill) directly into an empty rollup
+        slot and marks it final, so later samples in the same bucket do not skew its average.
+        """
+        bucket = int(timestamp) // resolution * resolution
+        if self._read(resolution, bucket) is None:
+            i = self._slot(resolution, bucket)
+            self._values[i], self._values[i + 1], self._values[i + 2] = bucket, value, -1.0
+
+    def points(self, resolution, start, end):
+        """Returns ([bucket, average], ...) and the list of empty buckets between start and end."""
+        points, empty = [], []
+        bucket = int(start) // resolution * resolution
+        while bucket <= end:
+            stored = self._read(resolution, bucket)
+            if stored is None:
+                empty.append(bucket)
+            else:
+                points.append([bucket, round(stored[0] / stored[1], 2)])
+            bucket += resolution
+        return points, empty
+
+    def flush(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+
+
+class HistoryStore:
+    """All series, keyed by (instance_id, metric)."""
+
+    def __init__(self, directory=HISTORY_DIR):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _get(self, instance_id, metric):
+        key = (instance_id, metric)
+        series = self._series.get(key)
+        if series is None:
+            path = os.path.join(self.directory, f"{instance_id}.{metric}.ring") if self.directory else None
+            series = self._series[key] = _Series(path)
+        return series
+
+    def record(self, instance_id, metric, timestamp, value):
+        with self._lock:
+            self._get(instance_id, metric).record(timestamp, value)
+
+    def record_rollup(self, instance_id, metric, resolution, timestamp, value):
+        with self._lock:
+            series = self._get(instance_id, metric)
+            if resolution == 60:
+                series.record(timestamp, value)
+            else:
+                series.record_rollup(resolution, timestamp, value)
+
+    def query(self, instance_id, metric, start, end, resolution):
+        """Returns (points, empty_buckets) for the range at the given resolution."""
+        with self._lock:
+            return self._get(instance_id, metric).points(resolution, start, end)
+
+    def flush(self):
+        with self._lock:
+            for series in self._series.values():
+                series.flush()
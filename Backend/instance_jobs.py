@@ -0,0 +1,274 @@
+"""
+Bulk start/stop jobs for the dashboard backend.
+
+A job covers many instances across regions. The worker issues one
+StartInstances/StopInstances call per region, all regions at once, then tracks
+every job with batched DescribeInstances polling (one call per region shared by
+all running jobs) until each instance reaches its target state, fails or times out.
+Callers get a job id immediately and read progress with `get`.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from datetime import datetime, timezone
+from functools import partial
+
+from botocore.exceptions import ClientError
+
+from ec2_inventory import describe_instances_by_id
+from fanout import fan_out
+
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '2'))
+JOB_TIMEOUT_SECONDS = float(os.getenv('JOB_TIMEOUT_SECONDS', '900'))
+JOB_HISTORY_LIMIT = int(os.getenv('JOB_HISTORY_LIMIT', '100'))  # Finished jobs kept for /api/jobs/<id>
+MAX_JOB_INSTANCES = 1000
+
+TARGET_STATES = {'start': 'running', 'stop': 'stopped'}
+# States an instance cannot leave on its way to the target.
+DEAD_END_STATES = {'shutting-down', 'terminated'}
+
+logger = logging.getLogger(__name__)
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _issue_region_action(get_client, action, region, instance_ids):
+    """
+    Starts or stops every instance of one region with a single API call.
+    If the batched call is rejected (one bad id fails the whole request), each
+    instance is retried on its own so the others still go through.
+    Returns {instance_id: (current_state, error)}.
+    """
+    client = get_client('ec2', region)
+    if client is None:
+        return {i: (None, f"Could not get EC2 client for region {region}") for i in instance_ids}
+    call = client.start_instances if action == 'start' else client.stop_instances
+    result_key = 'StartingInstances' if action == 'start' else 'StoppingInstances'
+
+    def states_from(response):
+        return {item['InstanceId']: item.get('CurrentState', {}).get('Name') for item in response.get(result_key, [])}
+
+    try:
+        states = states_from(call(InstanceIds=list(instance_ids)))
+        return {i: (states.get(i), None) for i in instance_ids}
+    except ClientError as e:
+        if len(instance_ids) == 1:
+            return {instance_ids[0]: (None, str(e))}
+        logger.warning(f"Batched {action} of {len(instance_ids)} instance(s) in {region} failed, retrying one by one: {e}")
+
+    results = {}
+    for instance_id in instance_ids:
+        try:
+            results[instance_id] = (states_from(call(InstanceIds=[instance_id])).get(instance_id), None)
+        except ClientError as e:
+            results[instance_id] = (None, str(e))
+    return results
+
+
+class JobTracker:
+    """
+    Runs bulk start/stop jobs on one background worker thread.
+
+    `get_client(service, region)` returns a boto3 client. `on_instance_changed(id, region)`,
+    if given, is called whenever an instance's observed state changes (the backend uses it
+    to invalidate the metrics snapshot).
+    """
+
+    def __init__(self, get_client, on_instance_changed=None, poll_interval=JOB_POLL_SECONDS,
+                 timeout=JOB_TIMEOUT_SECONDS, history_limit=JOB_HISTORY_LIMIT):
+        self.get_client = get_client
+        self.on_instance_changed = on_instance_changed
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.history_limit = history_limit
+        self._jobs = OrderedDict()  # job_id -> job, oldest first
+        self._to_issue = []  # job ids whose start/stop calls have not been made yet
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the worker thread once; safe to call on every request."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='instance-jobs', daemon=True)
+            self._thread.start()
+
+    def submit(self, action, targets):
+        """Queues a job for (instance_id, region) targets and returns its initial snapshot."""
+        target_state = TARGET_STATES[action]
+        job_id = uuid.uuid4().hex
+        job = {
+            'jobId': job_id, 'action': action, 'status': 'pending',
+            'createdAt': _now_iso(), 'updatedAt': _now_iso(), 'completedAt': None,
+            'started': time.monotonic(),
+            'instances': OrderedDict(
+                ((instance_id, region), {'instanceId': instance_id, 'region': region, 'targetState': target_state,
+                                         'state': None, 'error': None})
+                for instance_id, region in targets
+            ),
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._to_issue.append(job_id)
+            self._trim_history()
+            snapshot = self._snapshot(job)
+        self.start()
+        self._wake.set()
+        return snapshot
+
+    def get(self, job_id):
+        """Returns a snapshot of a job, or None if it is unknown or was dropped from the history."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def _snapshot(self, job):
+        instances = [dict(entry) for entry in job['instances'].values()]
+        done = sum(1 for entry in instances if entry['state'] == entry['targetState'])
+        failed = sum(1 for entry in instances if entry['error'])
+        return {
+            **{key: value for key, value in job.items() if key not in ('instances', 'started')},
+            'summary': {'total': len(instances), 'done': done, 'failed': failed,
+                        'pending': len(instances) - done - failed},
+            'instances': instances,
+        }
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['completedAt']]
+        for job_id in finished[:max(0, len(finished) - self.history_limit)]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            try:
+                self._issue_pending()
+                active = self._poll()
+            except Exception as e:
+                logger.error(f"Instance job worker failed: {e}")
+                active = True
+            if active:
+                self._wake.wait(self.poll_interval)
+            else:
+                self._wake.wait()
+            self._wake.clear()
+
+    def _issue_pending(self):
+        """Makes the start/stop calls for newly submitted jobs, one per job and region, all at once."""
+        with self._lock:
+            jobs = [self._jobs[job_id] for job_id in self._to_issue if job_id in self._jobs]
+            self._to_issue = []
+            tasks = []
+            for job in jobs:
+                job['status'] = 'running'
+                by_region = OrderedDict()
+                for instance_id, region in job['instances']:
+                    by_region.setdefault(region, []).append(instance_id)
+                for region, instance_ids in by_region.items():
+                    tasks.append(((job['jobId'], region),
+                                  partial(_issue_region_action, self.get_client, job['action'], region, instance_ids)))
+
+        for (job_id, region), result, error in fan_out(tasks):
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    continue
+                if isinstance(error, FuturesTimeoutError):
+                    # The call may still have gone through; polling finds out, and the job timeout covers the rest.
+                    logger.warning(f"Job {job_id}: {job['action']} in {region} timed out, checking instance states")
+                    job['updatedAt'] = _now_iso()
+                    continue
+                if error is not None:
+                    logger.error(f"Job {job_id}: {job['action']} in {region} failed: {error}")
+                    result = {instance_id: (None, str(error)) for instance_id, r in job['instances'] if r == region}
+                for instance_id, (state, call_error) in result.items():
+                    self._update(job, instance_id, region, state, call_error)
+                job['updatedAt'] = _now_iso()
+
+    def _poll(self):
+        """
+        Describes every instance still on its way to a target state, one call per region for
+        all running jobs together. Returns True while any job is still running.
+        """
+        with self._lock:
+            waiting = {}
+            for job in self._jobs.values():
+                if job['status'] != 'running':
+                    continue
+                for (instance_id, region), entry in job['instances'].items():
+                    if entry['error'] is None and entry['state'] != entry['targetState']:
+                        waiting.setdefault(region, set()).add(instance_id)
+        if not waiting:
+            self._finish_jobs()
+            return False
+
+        tasks = [(region, partial(self._describe, region, sorted(instance_ids))) for region, instance_ids in waiting.items()]
+        observed = {}
+        for region, result, error in fan_out(tasks):
+            if error is not None:
+                logger.warning(f"Job polling: DescribeInstances failed in {region}, will retry: {error}")
+                continue
+            for instance_id in waiting[region]:
+                observed[(instance_id, region)] = result.get(instance_id)
+
+        with self._lock:
+            for job in self._jobs.values():
+                if job['status'] != 'running':
+                    continue
+                for (instance_id, region), entry in job['instances'].items():
+                    if (instance_id, region) in observed and entry['error'] is None:
+                        state = observed[(instance_id, region)]
+                        self._update(job, instance_id, region, state,
+                                     None if state is not None else "Instance not found")
+                job['updatedAt'] = _now_iso()
+        return self._finish_jobs()
+
+    def _describe(self, region, instance_ids):
+        client = self.get_client('ec2', region)
+        if client is None:
+            raise RuntimeError(f"Could not get EC2 client for region {region}")
+        described = describe_instances_by_id(client, instance_ids)
+        return {instance_id: instance['State']['Name'] for instance_id, instance in described.items()}
+
+    def _update(self, job, instance_id, region, state, error):
+        """Records what was seen for one instance of a job. Must hold the lock."""
+        entry = job['instances'][(instance_id, region)]
+        if error:
+            entry['error'] = error
+        elif state in DEAD_END_STATES and state != entry['targetState']:
+            entry['error'] = f"Instance is {state}"
+        if state is not None and state != entry['state']:
+            entry['state'] = state
+            if self.on_instance_changed:
+                self.on_instance_changed(instance_id, region)
+
+    def _finish_jobs(self):
+        """Marks jobs whose instances are all settled, or that ran out of time. Returns True if any still run."""
+        now = time.monotonic()
+        still_running = False
+        with self._lock:
+            for job in self._jobs.values():
+                if job['status'] != 'running':
+                    continue
+                entries = job['instances'].values()
+                if now - job['started'] > self.timeout:
+                    for entry in entries:
+                        if entry['error'] is None and entry['state'] != entry['targetState']:
+                            entry['error'] = f"Timed out waiting for state '{entry['targetState']}'"
+                    job['status'] = 'timed_out'
+                elif any(entry['error'] is None and entry['state'] != entry['targetState'] for entry in entries):
+                    still_running = True
+                    continue
+                else:
+                    job['status'] = 'failed' if any(entry['error'] for entry in entries) else 'succeeded'
+                job['completedAt'] = job['updatedAt'] = _now_iso()
+                logger.info(f"Job {job['jobId']} ({job['action']}, {len(entries)} instance(s)) {job['status']}")
+            self._trim_history()
+        return still_running
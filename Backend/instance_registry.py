@@ -0,0 +1,160 @@
+"""
+In-memory registry of the DR fleet.
+
+Instances are discovered by tag (DR-Role / DR-Pair by default) with paginated,
+filtered DescribeInstances calls, one per region, and kept indexed by id and
+region so lookups stay O(1) however large the fleet gets. A background thread
+re-runs discovery periodically and applies only the differences, so the indexes
+are never rebuilt from scratch. Discovery talks to AWS without holding the lock;
+only applying its results does, so lookups never wait on the network.
+"""
+import logging
+import os
+import threading
+import time
+
+DR_ROLE_TAG = os.getenv('DR_ROLE_TAG', 'DR-Role')
+DR_PAIR_TAG = os.getenv('DR_PAIR_TAG', 'DR-Pair')
+REGISTRY_REFRESH_SECONDS = float(os.getenv('REGISTRY_REFRESH_SECONDS', '300'))
+DR_DISCOVERY_REGIONS = [r.strip() for r in os.getenv('DR_DISCOVERY_REGIONS', '').split(',') if r.strip()]
+
+# Terminated and shutting-down instances are gone for good and are left out.
+_TRACKED_STATES = ['running', 'pending', 'stopping', 'stopped']
+
+logger = logging.getLogger(__name__)
+
+
+class InstanceRegistry:
+    """
+    Holds one config dict per instance: {"id", "region", "name", "role", "pair"}.
+
+    `get_client(service, region)` returns a boto3 client (or None). `static_configs`
+    are always present regardless of discovery, which keeps the INSTANCE_ID_*
+    settings from .env working for deployments that do not tag their instances.
+    """
+
+    def __init__(self, get_client, regions, static_configs=(), refresh_interval=REGISTRY_REFRESH_SECONDS,
+                 role_tag=DR_ROLE_TAG, pair_tag=DR_PAIR_TAG):
+        self.get_client = get_client
+        self.regions = list(dict.fromkeys(regions))
+        self.refresh_interval = refresh_interval
+        self.role_tag = role_tag
+        self.pair_tag = pair_tag
+        self._static_ids = {config['id'] for config in static_configs}
+        self._by_id = {}
+        self._by_region = {}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock() # Held through the first discovery, so only one request runs it
+        self._loaded = False
+        self._thread = None
+        for config in static_configs:
+            self._add(config)
+
+    # --- Index maintenance (callers hold the lock) ---
+
+    def _add(self, config):
+        self._by_id[config['id']] = config
+        self._by_region.setdefault(config['region'], {})[config['id']] = config
+
+    def _remove(self, instance_id):
+        config = self._by_id.pop(instance_id, None)
+        if config is None:
+            return
+        bucket = self._by_region.get(config['region'])
+        if bucket is not None:
+            bucket.pop(instance_id, None)
+            if not bucket:
+                del self._by_region[config['region']]
+
+    # --- Discovery ---
+
+    def _discover_region(self, region):
+        """Returns {instance_id: config} for every DR-tagged instance in one region."""
+        ec2_client = self.get_client('ec2', region)
+        if not ec2_client:
+            raise RuntimeError(f"Could not get EC2 client for region {region}")
+
+        discovered = {}
+        paginator = ec2_client.get_paginator('describe_instances')
+        pages = paginator.paginate(
+            Filters=[
+                {'Name': 'tag-key', 'Values': [self.role_tag]},
+                {'Name': 'instance-state-name', 'Values': _TRACKED_STATES},
+            ],
+            PaginationConfig={'PageSize': 1000},
+        )
+        for page in pages:
+            for reservation in page.get('Reservations', []):
+                for instance in reservation.get('Instances', []):
+                    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+                    discovered[instance['InstanceId']] = {
+                        'id': instance['InstanceId'],
+                        'region': region,
+                        'name': tags.get('Name', instance['InstanceId']),
+                        'role': tags.get(self.role_tag),
+                        'pair': tags.get(self.pair_tag),
+                    }
+        return discovered
+
+    def refresh(self):
+        """
+        Re-discovers every region, then applies adds, updates and removals to the indexes
+        in one step under the lock.
+        """
+        discovered_by_region = {}
+        for region in self.regions:
+            try:
+                discovered_by_region[region] = self._discover_region(region)
+            except Exception as e:
+                # Keep what we already know about this region rather than emptying it.
+                logger.error(f"Instance discovery failed in {region}: {e}")
+
+        with self._lock:
+            for region, discovered in discovered_by_region.items():
+                known = {i for i in self._by_region.get(region, {}) if i not in self._static_ids}
+                for instance_id in known - discovered.keys():
+                    self._remove(instance_id)
+                    logger.info(f"Registry: {instance_id} in {region} is no longer tagged or was terminated")
+                for instance_id, config in discovered.items():
+                    current = self._by_id.get(instance_id)
+                    if instance_id in self._static_ids:
+                        # Tags on a statically configured instance only fill in role/pair.
+                        config = {**current, 'role': config['role'] or current.get('role'),
+                                  'pair': config['pair'] or current.get('pair')}
+                    if current == config:
+                        continue
+                    self._remove(instance_id)
+                    self._add(config)
+                    if current is None:
+                        logger.info(f"Registry: discovered {instance_id} in {region} (role={config['role']}, pair={config['pair']})")
+            self._loaded = True
+
+    def start(self):
+        """
+        Starts periodic background discovery once. The first discovery runs synchronously;
+        concurrent callers wait for it, while get() keeps answering from the static configs.
+        """
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            if not self._loaded:
+                self.refresh()
+            self._thread = threading.Thread(target=self._run, name='instance-registry', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self.refresh()
+
+    # --- Lookups ---
+
+    def configs(self):
+        """Returns every known instance config, in a stable order."""
+        self.start()
+        with self._lock:
+            return list(self._by_id.values())
+
+    def get(self, instance_id):
+        with self._lock:
+            return self._by_id.get(instance_id)
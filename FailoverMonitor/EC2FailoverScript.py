@@ -1,34 +1,85 @@
-import boto3
+import asyncio
+import json
+import os
+import sys
 import time
 import logging
 from botocore.exceptions import ClientError
 
+from poll_scheduler import AdaptivePollScheduler, STEADY_INTERVAL_SECONDS
+from health_probes import HEALTHY, UNHEALTHY, HealthProber, combine_state
+
+# Modules shared with the backend live in ../Shared (copied next to this file in the Docker image).
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Shared"))
+from aws_errors import is_throttling_error
+from instrumentation import REGISTRY as METRICS_REGISTRY, instrument_client, start_metrics_server
+from client_pool import AWS_PREWARM_CLIENTS, ClientPool
+from event_journal import EventJournal, setup_queue_logging
+from health_checks import IMPAIRED, fetch_region_health
+
 # --- Configuration ---
 # Main EC2 Instance
-MAIN_INSTANCE_ID = "i-072c32506d067a13a"  
-MAIN_REGION = "eu-west-2"             
+MAIN_INSTANCE_ID = "i-072c32506d067a13a"
+MAIN_REGION = "eu-west-2"
+
+# Optional application health check for the main instance, e.g. http://<main-ip>:5000/api/status_check
+# or tcp://<main-ip>:22. When set, a running main whose application stops answering is failed over too.
+MAIN_PROBE_URL = os.getenv("MONITOR_MAIN_PROBE_URL")
 
 # Backup EC2 Instance
-BACKUP_INSTANCE_ID = "i-0391db570934d58c5" 
-BACKUP_REGION = "eu-west-1"          
+BACKUP_INSTANCE_ID = "i-0391db570934d58c5"
+BACKUP_REGION = "eu-west-1"
+
+# Additional primary/backup pairs can be supervised by the same process by setting
+# FAILOVER_PAIRS to a JSON list, e.g.
+# [{"name": "web", "main_instance_id": "i-...", "main_region": "eu-west-2",
+#   "backup_instance_id": "i-...", "backup_region": "eu-west-1", "main_probe_url": "http://..."}]
+# When unset, the single pair above is monitored.
+FAILOVER_PAIRS = os.getenv("FAILOVER_PAIRS")
 
 # Script Configuration
-CHECK_INTERVAL_SECONDS = 5  # How often to check (in seconds)
+CHECK_INTERVAL_SECONDS = STEADY_INTERVAL_SECONDS  # How often to check while every pair is steady (MONITOR_STEADY_INTERVAL_SECONDS)
+STATS_LOG_INTERVAL_SECONDS = 300 # How often the poll scheduler counters are logged
+METRICS_PORT = int(os.getenv("MONITOR_METRICS_PORT", "9101")) # Prometheus /metrics listener; 0 disables it
 LOG_FILE = "failover_monitor.log"
+JOURNAL_FILE = os.getenv("MONITOR_JOURNAL_FILE", "failover_journal.jsonl") # State changes only; empty disables it
 MAIN_INSTANCE_STABLE_WAIT_SECONDS = 300 # 5 minutes
+MAX_IDS_PER_FILTER = 200 # DescribeInstances filter value limit
+# Read states with DescribeInstanceStatus + DescribeAlarms instead of DescribeInstances (two calls per region
+# instead of one), and fail over a running main whose status checks fail or whose alarm is in ALARM.
+USE_HEALTH_CHECKS = os.getenv("MONITOR_HEALTH_CHECKS", "false").lower() == "true"
 
-# --- Setup Logging ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()  # Also print to console
-    ]
-)
+# --- Logging ---
+# The log file and journal are opened by the __main__ block below, so importing this
+# module (failover_handler.py, benchmarks) writes nothing; until then the journal is a no-op.
+journal = EventJournal(None)
+
+# --- AWS clients, one per service and region, shared by every call (see Shared/client_pool.py) ---
+aws_clients = ClientPool(on_create=instrument_client)
+
+def get_ec2_client(region_name):
+    """Returns the shared EC2 client for a region, creating it on first use."""
+    return aws_clients.get('ec2', region_name)
+
+def describe_instance_states(region_name, instance_ids):
+    """
+    Gets the states of many EC2 instances in one region with a single paginated DescribeInstances call.
+    Returns {instance_id: state}; instances that were not found are missing from the result.
+    Raises on AWS errors so the caller can treat the whole region as unknown.
+    """
+    states = {}
+    paginator = get_ec2_client(region_name).get_paginator('describe_instances')
+    for offset in range(0, len(instance_ids), MAX_IDS_PER_FILTER):
+        chunk = list(instance_ids[offset:offset + MAX_IDS_PER_FILTER])
+        for page in paginator.paginate(Filters=[{'Name': 'instance-id', 'Values': chunk}]):
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    states[instance['InstanceId']] = instance['State']['Name']
+    return states
 
-# Variable to track if we've recently confirmed the main instance is stable
-main_instance_confirmed_stable_since = None
+def describe_region_health(region_name, instance_ids):
+    """Status-check and alarm health records ({instance_id: record}) for many instances in one region."""
+    return fetch_region_health(get_ec2_client(region_name), aws_clients.get('cloudwatch', region_name), region_name, instance_ids)
 
 def get_instance_state(instance_id, region_name):
     """
@@ -37,12 +88,10 @@ def get_instance_state(instance_id, region_name):
     Returns None if an error occurs or instance not found.
     """
     try:
-        ec2_client = boto3.client('ec2', region_name=region_name)
-        response = ec2_client.describe_instances(InstanceIds=[instance_id])
-        if not response['Reservations'] or not response['Reservations'][0]['Instances']:
+        state = describe_instance_states(region_name, [instance_id]).get(instance_id)
+        if state is None:
             logging.warning(f"Instance {instance_id} not found in region {region_name}.")
-            return None
-        return response['Reservations'][0]['Instances'][0]['State']['Name']
+        return state
     except ClientError as e:
         logging.error(f"AWS API Error checking instance {instance_id} in {region_name}: {e}")
         return None
@@ -50,14 +99,16 @@ def get_instance_state(instance_id, region_name):
         logging.error(f"An unexpected error occurred checking instance {instance_id} in {region_name}: {e}")
         return None
 
-def start_instance(instance_id, region_name):
+def start_instance(instance_id, region_name, current_state=None):
     """
     Starts a given EC2 instance.
+    Pass current_state when it is already known to skip the extra DescribeInstances call.
     Returns True if start command issued or already running, False otherwise.
     """
     try:
-        ec2_client = boto3.client('ec2', region_name=region_name)
-        current_state = get_instance_state(instance_id, region_name)
+        ec2_client = get_ec2_client(region_name)
+        if current_state is None:
+            current_state = get_instance_state(instance_id, region_name)
 
         if current_state == 'running':
             logging.info(f"Instance {instance_id} in {region_name} is already running.")
@@ -84,14 +135,16 @@ def start_instance(instance_id, region_name):
         logging.error(f"An unexpected error occurred starting instance {instance_id} in {region_name}: {e}")
         return False
 
-def stop_instance(instance_id, region_name):
+def stop_instance(instance_id, region_name, current_state=None):
     """
     Stops a given EC2 instance.
+    Pass current_state when it is already known to skip the extra DescribeInstances call.
     Returns True if stop command issued or already stopped/stopping, False otherwise.
     """
     try:
-        ec2_client = boto3.client('ec2', region_name=region_name)
-        current_state = get_instance_state(instance_id, region_name)
+        ec2_client = get_ec2_client(region_name)
+        if current_state is None:
+            current_state = get_instance_state(instance_id, region_name)
 
         if current_state == 'stopped':
             logging.info(f"Instance {instance_id} in {region_name} is already stopped.")
@@ -117,71 +170,340 @@ def stop_instance(instance_id, region_name):
         logging.error(f"An unexpected error occurred stopping instance {instance_id} in {region_name}: {e}")
         return False
 
-def main_monitoring_loop():
-    global main_instance_confirmed_stable_since
-    logging.info("--- Starting EC2 Failover Monitor ---")
-    logging.info(f"Main Instance: {MAIN_INSTANCE_ID} ({MAIN_REGION})")
-    logging.info(f"Backup Instance: {BACKUP_INSTANCE_ID} ({BACKUP_REGION})")
-    logging.info(f"Main instance stability period before stopping backup: {MAIN_INSTANCE_STABLE_WAIT_SECONDS} seconds")
+class FailoverPair:
+    """
+    State machine for one primary/backup pair, with its own stability timer.
+    `evaluate` is given the states read this tick and returns the action to take
+    on the backup: ('start', state), ('stop', state) or None.
+    """
+
+    def __init__(self, name, main_instance_id, main_region, backup_instance_id, backup_region,
+                 stable_wait_seconds=MAIN_INSTANCE_STABLE_WAIT_SECONDS, main_probe_url=None):
+        self.name = name
+        self.main_instance_id = main_instance_id
+        self.main_region = main_region
+        self.backup_instance_id = backup_instance_id
+        self.backup_region = backup_region
+        self.stable_wait_seconds = stable_wait_seconds
+        self.main_probe_url = main_probe_url
+        self.main_confirmed_stable_since = None
+
+    def evaluate(self, main_state, backup_state, now):
+        main_id, backup_id = self.main_instance_id, self.backup_instance_id
+
+        if main_state == 'running':
+            if self.main_confirmed_stable_since is None:
+                self.main_confirmed_stable_since = now
+                logging.info(f"[{self.name}] Main instance {main_id} confirmed running. Starting stability timer.")
 
+            if now - self.main_confirmed_stable_since >= self.stable_wait_seconds:
+                if backup_state == 'running':
+                    logging.info(f"[{self.name}] Main instance is stable and backup instance {backup_id} is running. Attempting to stop backup instance.")
+                    return ('stop', backup_state)
+                elif backup_state is None:
+                    logging.warning(f"[{self.name}] Could not determine state of backup instance {backup_id} while main is stable.")
+                elif backup_state != 'stopped':
+                    logging.debug(f"[{self.name}] Backup instance {backup_id} is in state '{backup_state}'. No stop action needed.")
+            return None
+
+        if main_state is None: # Error or instance not found
+            logging.error(f"[{self.name}] Could not determine state of main instance {main_id}. Not taking failover action to be safe.")
+            self.main_confirmed_stable_since = None # Reset stability timer
+            return None
+
+        # Main instance is not running (e.g., 'stopped', 'stopping', 'terminated')
+        if self.main_confirmed_stable_since is not None or backup_state != 'running':
+            logging.warning(f"[{self.name}] Main instance {main_id} is NOT RUNNING (state: {main_state}). Backup instance {backup_id} state: {backup_state}.")
+        self.main_confirmed_stable_since = None # Reset stability timer
+
+        if backup_state == 'stopped':
+            logging.info(f"[{self.name}] Backup instance {backup_id} is stopped. Attempting to start it.")
+            return ('start', backup_state)
+        elif backup_state is None:
+            logging.error(f"[{self.name}] Could not determine state of backup instance {backup_id}. Cannot start it.")
+        elif backup_state != 'running':
+            logging.debug(f"[{self.name}] Backup instance {backup_id} is in state '{backup_state}'. Not attempting to start automatically.")
+        return None
+
+def load_failover_pairs():
+    """Builds the pairs to supervise from FAILOVER_PAIRS, or the single configured pair."""
+    if not FAILOVER_PAIRS:
+        return [FailoverPair("default", MAIN_INSTANCE_ID, MAIN_REGION, BACKUP_INSTANCE_ID, BACKUP_REGION,
+                             main_probe_url=MAIN_PROBE_URL)]
+    return [
+        FailoverPair(
+            entry.get("name", f"pair-{index}"),
+            entry["main_instance_id"], entry["main_region"],
+            entry["backup_instance_id"], entry["backup_region"],
+            entry.get("stable_wait_seconds", MAIN_INSTANCE_STABLE_WAIT_SECONDS),
+            entry.get("main_probe_url"),
+        )
+        for index, entry in enumerate(json.loads(FAILOVER_PAIRS))
+    ]
+
+async def read_states(pairs, scheduler=None, sleep=asyncio.sleep):
+    """
+    Reads the state of every instance in every pair: one DescribeInstances call per region
+    (or, with USE_HEALTH_CHECKS, one DescribeInstanceStatus and one DescribeAlarms), all regions
+    at once. Each call waits for the scheduler's per-region budget first, and regions the
+    scheduler is backing off after throttling are skipped until their backoff is over.
+    Returns ({(instance_id, region): state}, throttled_regions, {(instance_id, region): health});
+    throttled_regions includes the skipped ones, unknown states are None and health is only
+    filled in with USE_HEALTH_CHECKS.
+    """
+    ids_by_region = {}
+    for pair in pairs:
+        ids_by_region.setdefault(pair.main_region, set()).add(pair.main_instance_id)
+        ids_by_region.setdefault(pair.backup_region, set()).add(pair.backup_instance_id)
+
+    calls_per_region = 2 if USE_HEALTH_CHECKS else 1
+
+    async def read_region(region):
+        if scheduler is not None:
+            wait = sum(scheduler.reserve(region) for _ in range(calls_per_region))
+            if wait > 0:
+                await sleep(wait)
+        if USE_HEALTH_CHECKS:
+            return await asyncio.to_thread(describe_region_health, region, sorted(ids_by_region[region]))
+        return await asyncio.to_thread(describe_instance_states, region, sorted(ids_by_region[region]))
+
+    states = {}
+    health = {}
+    throttled_regions = set()
+    regions = []
+    for region in ids_by_region:
+        if scheduler is not None and scheduler.region_delay(region) > 0:
+            throttled_regions.add(region)
+            states.update({(instance_id, region): None for instance_id in ids_by_region[region]})
+        else:
+            regions.append(region)
+    results = await asyncio.gather(*(read_region(region) for region in regions), return_exceptions=True)
+    for region, result in zip(regions, results):
+        throttled = isinstance(result, Exception) and is_throttling_error(result)
+        if scheduler is not None:
+            for _ in range(calls_per_region):
+                scheduler.record_call(throttled=throttled, region=region)
+        if throttled:
+            logging.warning(f"DescribeInstances throttled in {region}; backing off before the next check.")
+            journal.error(f"describe:{region}", "throttled", region=region)
+            throttled_regions.add(region)
+            result = {}
+        elif isinstance(result, Exception):
+            logging.error(f"AWS API Error checking {len(ids_by_region[region])} instance(s) in {region}: {result}")
+            journal.error(f"describe:{region}", str(result), region=region)
+            result = {}
+        else:
+            journal.recovered(f"describe:{region}", region=region)
+        for instance_id in ids_by_region[region]:
+            found = result.get(instance_id)
+            if USE_HEALTH_CHECKS and found is not None:
+                health[(instance_id, region)] = found["health"]
+                found = found["state"]
+            states[(instance_id, region)] = found
+    return states, throttled_regions, health
+
+def apply_backup_action(action, region_name, targets):
+    """
+    Starts or stops several backup instances in one region with a single API call.
+    `targets` is a list of (instance_id, current_state). If the batched call is rejected
+    (e.g. one instance changed state meanwhile) each instance is retried on its own.
+    """
+    handler = start_instance if action == 'start' else stop_instance
+    if len(targets) == 1:
+        return [handler(targets[0][0], region_name, targets[0][1])]
+
+    instance_ids = [instance_id for instance_id, _ in targets]
+    try:
+        ec2_client = get_ec2_client(region_name)
+        if action == 'start':
+            ec2_client.start_instances(InstanceIds=instance_ids)
+        else:
+            ec2_client.stop_instances(InstanceIds=instance_ids)
+        logging.info(f"{action.capitalize()} command issued for {len(instance_ids)} instance(s) in {region_name}: {', '.join(instance_ids)}")
+        return [True] * len(instance_ids)
+    except Exception as e:
+        logging.error(f"Batched {action} failed in {region_name}, retrying instances individually: {e}")
+        return [handler(instance_id, region_name, state) for instance_id, state in targets]
+
+def build_prober(pairs, clock=time.time):
+    """A HealthProber for the main instances that have a probe URL, or None if none do."""
+    targets = {pair.main_instance_id: pair.main_probe_url for pair in pairs if pair.main_probe_url}
+    return HealthProber(targets, clock=clock) if targets else None
+
+def needs_attention(main_state, backup_state):
+    """
+    True while a pair is transitioning or unhealthy, i.e. when it is worth polling fast.
+    A pair that has fully failed over (main down, backup running) is steady again.
+    """
+    if main_state in (None, 'pending', 'stopping', 'shutting-down') or backup_state in ('pending', 'stopping'):
+        return True
+    return main_state != 'running' and backup_state != 'running'
+
+async def monitor_tick(pairs, clock=time.time, scheduler=None, sleep=asyncio.sleep, prober=None):
+    """
+    Runs one check of every pair. Backup start/stop actions are grouped into one call
+    per action and region, and all of those calls run concurrently.
+    A main that EC2 reports as running but whose probe (with a prober) or status checks/alarms
+    (with USE_HEALTH_CHECKS) are failing counts as 'impaired'.
+    Pairs in a throttled region are not evaluated this tick: a throttled read says nothing
+    about the instances, so their stability timers and pending decisions are left as they were,
+    and they do not make the tick urgent (the scheduler backs off that region instead).
+    """
+    states, throttled_regions, health = await read_states(pairs, scheduler=scheduler, sleep=sleep)
+    now = clock()
+    batches = {}
+    urgent = False
+    for pair in pairs:
+        if pair.main_region in throttled_regions or pair.backup_region in throttled_regions:
+            continue # Left to the scheduler's backoff; polling fast would only be throttled again
+        main_state = states[(pair.main_instance_id, pair.main_region)]
+        if prober is not None:
+            main_state = combine_state(main_state, prober.status(pair.main_instance_id))
+        if health.get((pair.main_instance_id, pair.main_region)) == IMPAIRED:
+            main_state = combine_state(main_state, UNHEALTHY)
+        backup_state = states[(pair.backup_instance_id, pair.backup_region)]
+        journal.transition(pair.main_instance_id, main_state, pair=pair.name, role="main", region=pair.main_region)
+        journal.transition(pair.backup_instance_id, backup_state, pair=pair.name, role="backup", region=pair.backup_region)
+        urgent = urgent or needs_attention(main_state, backup_state)
+        decision = pair.evaluate(main_state, backup_state, now)
+        if decision is not None:
+            action, backup_state = decision
+            batches.setdefault((action, pair.backup_region), []).append((pair.backup_instance_id, backup_state, pair.name))
+
+    async def apply(action, region, targets):
+        if scheduler is not None:
+            wait = scheduler.reserve(region)
+            if wait > 0:
+                await sleep(wait)
+            scheduler.record_call(region=region)
+        started = time.perf_counter()
+        results = await asyncio.to_thread(apply_backup_action, action, region, [(i, state) for i, state, _ in targets])
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        for (instance_id, state, pair_name), ok in zip(targets, results):
+            journal.record("action", action=action, pair=pair_name, subject=instance_id, region=region,
+                           fromState=state, ok=ok, durationMs=duration_ms)
+        return results
+
+    if batches:
+        await asyncio.gather(*(apply(action, region, targets) for (action, region), targets in batches.items()))
+    if scheduler is not None:
+        scheduler.set_urgent(urgent or bool(batches))
+        journal.transition("scheduler", "fast" if scheduler.urgent else "steady")
+    return states
+
+SCHEDULER_MODE = METRICS_REGISTRY.gauge(
+    "failover_monitor_fast_polling", "1 while the monitor polls at the fast interval, 0 while steady.")
+SCHEDULER_CALLS_PER_MINUTE = METRICS_REGISTRY.gauge(
+    "failover_monitor_api_calls_per_minute", "AWS calls made by the monitor in the last minute.")
+SCHEDULER_DETECTION_INTERVAL = METRICS_REGISTRY.gauge(
+    "failover_monitor_detection_interval_seconds", "Average time between recent checks.")
+SCHEDULER_THROTTLED_CALLS = METRICS_REGISTRY.gauge(
+    "failover_monitor_throttled_calls", "Throttled AWS calls seen by the poll scheduler since start.")
+
+PROBE_HEALTHY = METRICS_REGISTRY.gauge(
+    "failover_monitor_probe_healthy", "1 while a main instance's health probe is healthy, 0 while unhealthy.", ("instance_id",))
+
+def publish_scheduler_metrics(scheduler):
+    stats = scheduler.stats()
+    SCHEDULER_MODE.set((), 1 if stats["mode"] == "fast" else 0)
+    SCHEDULER_CALLS_PER_MINUTE.set((), stats["api_calls_per_minute"])
+    SCHEDULER_THROTTLED_CALLS.set((), stats["throttled_calls_total"])
+    if stats["effective_detection_interval_seconds"] is not None:
+        SCHEDULER_DETECTION_INTERVAL.set((), stats["effective_detection_interval_seconds"])
+
+async def probe_mains(prober):
+    """
+    Runs one round of health probes. Returns True if a main instance became unhealthy or
+    recovered, which is worth an immediate check.
+    """
+    changed = await asyncio.to_thread(prober.probe_all)
+    for instance_id, (old, new, error) in changed.items():
+        if new == UNHEALTHY:
+            logging.warning(f"Health probe for {instance_id} is failing ({error}).")
+        else:
+            logging.info(f"Health probe for {instance_id} is {new}.")
+        journal.transition(f"probe:{instance_id}", new, url=prober.targets[instance_id], error=error if new == UNHEALTHY else None)
+        if new in (HEALTHY, UNHEALTHY):
+            PROBE_HEALTHY.set((instance_id,), 1 if new == HEALTHY else 0)
+    return any(UNHEALTHY in (old, new) for old, new, _ in changed.values())
+
+async def wait_for_next_check(delay, clock=time.time, sleep=asyncio.sleep, prober=None):
+    """
+    Waits `delay` seconds for the next AWS check. With a prober the wait is spent probing the
+    main instances every prober.interval seconds, and ends early when one of them changes health.
+    """
+    deadline = clock() + delay
     while True:
-        try:
-            logging.info(f"Checking status of main instance: {MAIN_INSTANCE_ID} ({MAIN_REGION})")
-            main_instance_state = get_instance_state(MAIN_INSTANCE_ID, MAIN_REGION)
-            logging.info(f"Main instance {MAIN_INSTANCE_ID} current state: {main_instance_state}")
-
-            if main_instance_state == 'running':
-                logging.info(f"Main instance {MAIN_INSTANCE_ID} is running.")
-                if main_instance_confirmed_stable_since is None:
-                    main_instance_confirmed_stable_since = time.time()
-                    logging.info(f"Main instance {MAIN_INSTANCE_ID} confirmed running. Starting stability timer.")
-
-                if time.time() - main_instance_confirmed_stable_since >= MAIN_INSTANCE_STABLE_WAIT_SECONDS:
-                    logging.info(f"Main instance {MAIN_INSTANCE_ID} has been stable for over {MAIN_INSTANCE_STABLE_WAIT_SECONDS} seconds.")
-                    backup_instance_state = get_instance_state(BACKUP_INSTANCE_ID, BACKUP_REGION)
-                    logging.info(f"Checking backup instance {BACKUP_INSTANCE_ID} state: {backup_instance_state}")
-                    if backup_instance_state == 'running':
-                        logging.info(f"Main instance is stable and backup instance {BACKUP_INSTANCE_ID} is running. Attempting to stop backup instance.")
-                        stop_instance(BACKUP_INSTANCE_ID, BACKUP_REGION)
-                    elif backup_instance_state == 'stopped':
-                        logging.info(f"Backup instance {BACKUP_INSTANCE_ID} is already stopped. No action needed for backup.")
-                    elif backup_instance_state is None:
-                        logging.warning(f"Could not determine state of backup instance {BACKUP_INSTANCE_ID} while main is stable.")
-                    else:
-                         logging.info(f"Backup instance {BACKUP_INSTANCE_ID} is in state '{backup_instance_state}'. No stop action needed.")
-                else:
-                    wait_remaining = MAIN_INSTANCE_STABLE_WAIT_SECONDS - (time.time() - main_instance_confirmed_stable_since)
-                    logging.info(f"Main instance {MAIN_INSTANCE_ID} is running, waiting for {wait_remaining:.0f} more seconds to confirm stability before potentially stopping backup.")
-
-            elif main_instance_state is None: # Error or instance not found
-                logging.error(f"Could not determine state of main instance {MAIN_INSTANCE_ID}. Not taking failover action to be safe.")
-                main_instance_confirmed_stable_since = None # Reset stability timer
-
-            else: # Main instance is not running (e.g., 'stopped', 'stopping', 'terminated')
-                logging.warning(f"Main instance {MAIN_INSTANCE_ID} is NOT RUNNING (state: {main_instance_state}). Initiating check for backup instance.")
-                main_instance_confirmed_stable_since = None # Reset stability timer
-
-                backup_instance_state = get_instance_state(BACKUP_INSTANCE_ID, BACKUP_REGION)
-                logging.info(f"Backup instance {BACKUP_INSTANCE_ID} current state: {backup_instance_state}")
-
-                if backup_instance_state == 'running':
-                    logging.info(f"Backup instance {BACKUP_INSTANCE_ID} is already running.")
-                elif backup_instance_state == 'stopped':
-                    logging.info(f"Backup instance {BACKUP_INSTANCE_ID} is stopped. Attempting to start it.")
-                    start_instance(BACKUP_INSTANCE_ID, BACKUP_REGION)
-                elif backup_instance_state is None:
-                    logging.error(f"Could not determine state of backup instance {BACKUP_INSTANCE_ID}. Cannot start it.")
-                else:
-                    logging.warning(f"Backup instance {BACKUP_INSTANCE_ID} is in state '{backup_instance_state}'. Not attempting to start automatically.")
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return
+        if prober is None:
+            await sleep(remaining)
+            return
+        due = prober.seconds_until_due()
+        if due > 0:
+            await sleep(min(remaining, due))
+        elif await probe_mains(prober):
+            return
 
+async def run_monitor(pairs, check_interval=CHECK_INTERVAL_SECONDS, clock=time.time, sleep=asyncio.sleep, scheduler=None,
+                      prober=None):
+    """
+    Checks all pairs forever: every check_interval seconds while they are steady, and at the
+    scheduler's fast interval while any of them is transitioning, unhealthy or being acted on.
+    Between checks, the prober (if any) probes the main instances and can bring the next check forward.
+    """
+    if scheduler is None:
+        scheduler = AdaptivePollScheduler(steady_interval=check_interval, clock=clock)
+    last_stats_log = clock()
+    while True:
+        started = clock()
+        scheduler.record_poll()
+        try:
+            await monitor_tick(pairs, clock=clock, scheduler=scheduler, sleep=sleep, prober=prober)
         except Exception as e:
             logging.critical(f"An unhandled exception occurred in the main loop: {e}", exc_info=True)
-            main_instance_confirmed_stable_since = None # Reset stability timer on error
-        
-        logging.info(f"Waiting for {CHECK_INTERVAL_SECONDS} seconds before next check...")
-        time.sleep(CHECK_INTERVAL_SECONDS)
+            for pair in pairs:
+                pair.main_confirmed_stable_since = None # Reset stability timers on error
+        publish_scheduler_metrics(scheduler)
+        if clock() - last_stats_log >= STATS_LOG_INTERVAL_SECONDS:
+            last_stats_log = clock()
+            logging.info(f"Poll scheduler: {scheduler.stats()}")
+        await wait_for_next_check(max(0, scheduler.next_delay() - (clock() - started)), clock=clock, sleep=sleep, prober=prober)
+
+def main_monitoring_loop(clock=time.time, sleep=asyncio.sleep, prober=None):
+    """
+    Runs the monitor for the configured pairs. clock/sleep can be replaced to run it on a virtual clock,
+    and prober to probe something other than the configured probe URLs.
+    """
+    pairs = load_failover_pairs()
+    if prober is None:
+        prober = build_prober(pairs, clock=clock)
+    if AWS_PREWARM_CLIENTS:
+        aws_clients.prewarm(('ec2', 'cloudwatch') if USE_HEALTH_CHECKS else ('ec2',), [region for pair in pairs for region in (pair.main_region, pair.backup_region)])
+    logging.info("--- Starting EC2 Failover Monitor ---")
+    journal.record("monitor_started", pairs=[pair.name for pair in pairs])
+    for pair in pairs:
+        logging.info(f"[{pair.name}] Main Instance: {pair.main_instance_id} ({pair.main_region}), "
+                     f"Backup Instance: {pair.backup_instance_id} ({pair.backup_region})")
+    logging.info(f"Main instance stability period before stopping backup: {MAIN_INSTANCE_STABLE_WAIT_SECONDS} seconds")
+    logging.info(f"Supervising {len(pairs)} pair(s), checking every {CHECK_INTERVAL_SECONDS} seconds while steady")
+    if prober is not None:
+        logging.info(f"Probing {len(prober.targets)} main instance(s) every {prober.interval} seconds "
+                     f"(unhealthy after {prober.failure_threshold} consecutive failures)")
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT)
+            logging.info(f"Serving Prometheus metrics on port {METRICS_PORT} at /metrics")
+        except OSError as e:
+            logging.error(f"Could not start the metrics listener on port {METRICS_PORT}: {e}")
+    asyncio.run(run_monitor(pairs, clock=clock, sleep=sleep, prober=prober))
 
 if __name__ == "__main__":
     # Ensure your AWS credentials and region are configured where this script runs
     # e.g., via `aws configure` or environment variables.
-    main_monitoring_loop()
\ No newline at end of file
+    # Written by a background thread to a size-rotated file (and the console), so the
+    # monitoring loop never waits on disk. See Shared/event_journal.py for the limits.
+    setup_queue_logging(LOG_FILE)
+    journal = EventJournal(JOURNAL_FILE or None)
+    main_monitoring_loop()
@@ -0,0 +1,383 @@
+"""
+Failover timing benchmarks. Nothing here talks to AWS or Docker.
+
+Runs EC2FailoverScript.main_monitoring_loop and the root failover.py `main`
+against a simulated EC2 control plane on a virtual clock, through scripted
+scenarios, and reports how quickly each one notices a primary outage, starts
+the backup and stops it again after recovery. The "+probes" targets also
+probe the primary's application (simulated, no network) between EC2 checks;
+the app_hang scenario is an application that stops answering on an instance
+EC2 still reports as running. The "+health" target reads states from status
+checks and alarms; status_check_failure is a running instance failing its
+system status check.
+
+Usage:
+    python benchmarks.py
+    python benchmarks.py --scenarios primary_stop throttling --targets monitor --duration 7200
+
+Prints a JSON summary so results can be compared across changes.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+from functools import partial
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError, ConnectTimeoutError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import EC2FailoverScript
+import failover
+from event_journal import EventJournal
+from health_probes import HealthProber
+
+START_SECONDS = 30 # pending -> running
+STOP_SECONDS = 20 # stopping -> stopped
+REGION_TIMEOUT_SECONDS = 60 # botocore's default connect timeout
+LOCAL_READY_SECONDS = 5 # docker start -> local service answering its readiness URL
+STATUS_CHECK_LAG_SECONDS = 120 # a failure -> DescribeInstanceStatus reporting it (checks run every minute)
+
+
+class SimulationFinished(BaseException):
+    """Raised from the virtual sleep once the scenario is over. A BaseException so the monitors' `except Exception` lets it through."""
+
+
+class VirtualClock:
+    def __init__(self, end):
+        self.now = 0.0
+        self.end = end
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        with self._lock:
+            self.now += seconds
+
+    def sleep(self, seconds):
+        if self.now >= self.end:
+            raise SimulationFinished()
+        self.advance(max(0.0, seconds))
+
+    async def async_sleep(self, seconds):
+        self.sleep(seconds)
+
+
+class SimulatedEC2:
+    """
+    A tiny EC2 control plane: instance states with start/stop transitions, and
+    scripted events (state changes, throttling and timeout windows per region).
+    Records every API call so a scenario can be scored afterwards.
+    """
+
+    def __init__(self, clock, instances, events=(), throttled=(), timeouts=(), hangs=(), impaired=()):
+        self.clock = clock
+        self._instances = {i: {"region": region, "state": state, "until": None, "next": None} for i, (region, state) in instances.items()}
+        self._events = sorted(events)
+        self._throttled = throttled # [(region, start, end)]
+        self._timeouts = timeouts
+        self._hangs = hangs # [(instance_id, start, end)]: running, but the application does not answer
+        self._impaired = impaired # [(instance_id, start, end)]: running, but failing its system status check
+        self._lock = threading.Lock()
+        self.calls = [] # (time, region, operation)
+        self.observations = [] # (time, instance_id, state) returned to the caller
+        self.actions = [] # (time, operation, instance_id)
+
+    def _advance(self):
+        now = self.clock.time()
+        while self._events and self._events[0][0] <= now:
+            _, instance_id, state = self._events.pop(0)
+            self._transition(instance_id, state)
+        for instance in self._instances.values():
+            if instance["until"] is not None and instance["until"] <= now:
+                instance["state"], instance["until"], instance["next"] = instance["next"], None, None
+
+    def _transition(self, instance_id, target):
+        """Moves an instance towards 'running' or 'stopped' through the intermediate state."""
+        instance = self._instances[instance_id]
+        if target == "running" and instance["state"] in ("stopped", "stopping"):
+            instance["state"], instance["next"], instance["until"] = "pending", "running", self.clock.time() + START_SECONDS
+        elif target == "stopped" and instance["state"] in ("running", "pending"):
+            instance["state"], instance["next"], instance["until"] = "stopping", "stopped", self.clock.time() + STOP_SECONDS
+
+    def _call(self, region, operation):
+        now = self.clock.time()
+        with self._lock:
+            self.calls.append((now, region, operation))
+        if any(r == region and start <= now < end for r, start, end in self._timeouts):
+            self.clock.advance(REGION_TIMEOUT_SECONDS)
+            raise ConnectTimeoutError(endpoint_url=f"https://ec2.{region}.amazonaws.com")
+        if any(r == region and start <= now < end for r, start, end in self._throttled):
+            raise ClientError({"Error": {"Code": "RequestLimitExceeded", "Message": "Request limit exceeded."}}, operation)
+
+    def client(self, region):
+        return _SimulatedClient(self, region)
+
+    def states(self, region, instance_ids):
+        with self._lock:
+            self._advance()
+            found = {i: self._instances[i]["state"] for i in instance_ids
+                     if i in self._instances and self._instances[i]["region"] == region}
+            self.observations.extend((self.clock.time(), i, state) for i, state in found.items())
+            return found
+
+    def app_healthy(self, instance_id):
+        """What a health probe of the instance's application sees. Not an AWS call."""
+        with self._lock:
+            self._advance()
+            now = self.clock.time()
+            hung = any(i == instance_id and start <= now < end for i, start, end in self._hangs)
+            return self._instances[instance_id]["state"] == "running" and not hung
+
+    def system_status(self, instance_id, state):
+        """The system status check DescribeInstanceStatus reports for an instance in `state`."""
+        if state != "running":
+            return "not-applicable"
+        now = self.clock.time()
+        return "impaired" if any(i == instance_id and start <= now < end for i, start, end in self._impaired) else "ok"
+
+    def act(self, region, operation, instance_ids):
+        with self._lock:
+            self._advance()
+            for instance_id in instance_ids:
+                self.actions.append((self.clock.time(), operation, instance_id))
+                self._transition(instance_id, "running" if operation == "StartInstances" else "stopped")
+
+
+class _SimulatedClient:
+    """The subset of the boto3 EC2 and CloudWatch clients the monitors use."""
+
+    def __init__(self, sim, region):
+        self.sim = sim
+        self.region = region
+
+    def get_paginator(self, name):
+        operation = getattr(self, name)
+        return SimpleNamespace(paginate=lambda **kwargs: [operation(**kwargs)])
+
+    def describe_instances(self, Filters=(), **kwargs):
+        self.sim._call(self.region, "DescribeInstances")
+        ids = [value for f in Filters if f["Name"] == "instance-id" for value in f["Values"]]
+        states = self.sim.states(self.region, ids)
+        return {"Reservations": [{"Instances": [{"InstanceId": i, "State": {"Name": s}} for i, s in states.items()]}]}
+
+    def describe_instance_status(self, InstanceIds, IncludeAllInstances=False, **kwargs):
+        self.sim._call(self.region, "DescribeInstanceStatus")
+        states = self.sim.states(self.region, InstanceIds)
+        statuses = []
+        for i, s in states.items():
+            if IncludeAllInstances or s == "running":
+                check = self.sim.system_status(i, s)
+                statuses.append({"InstanceId": i, "InstanceState": {"Name": s}, "SystemStatus": {"Status": check},
+                                 "InstanceStatus": {"Status": "ok" if s == "running" else "not-applicable"}})
+        return {"InstanceStatuses": statuses}
+
+    def describe_alarms(self, **kwargs):
+        self.sim._call(self.region, "DescribeAlarms")
+        return {"MetricAlarms": []}
+
+    def start_instances(self, InstanceIds, **kwargs):
+        self.sim._call(self.region, "StartInstances")
+        self.sim.act(self.region, "StartInstances", InstanceIds)
+        return {}
+
+    def stop_instances(self, InstanceIds, **kwargs):
+        self.sim._call(self.region, "StopInstances")
+        self.sim.act(self.region, "StopInstances", InstanceIds)
+        return {}
+
+
+def _scenario(name, primary, region, outage_at):
+    """Events and fault windows for a scenario: (events, throttled, timeouts, outage times, recovery time)."""
+    if name == "primary_stop":
+        return [(outage_at, primary, "stopped"), (outage_at + 900, primary, "running")], (), (), [outage_at], outage_at + 900
+    if name == "flapping":
+        events = []
+        for n in range(4):
+            events += [(outage_at + n * 120, primary, "stopped"), (outage_at + n * 120 + 60, primary, "running")]
+        outages = [outage_at + n * 120 for n in range(4)]
+        return events, (), (), outages, outage_at + 3 * 120 + 60
+    if name == "throttling":
+        window = [(region, outage_at - 60, outage_at + 240)]
+        return [(outage_at, primary, "stopped"), (outage_at + 900, primary, "running")], window, (), [outage_at], outage_at + 900
+    if name == "region_timeout":
+        window = [(region, outage_at - 60, outage_at + 240)]
+        return [(outage_at, primary, "stopped"), (outage_at + 900, primary, "running")], (), window, [outage_at], outage_at + 900
+    if name in ("app_hang", "status_check_failure"):
+        return [], (), (), [outage_at], outage_at + 900
+    raise ValueError(f"unknown scenario {name}")
+
+
+def _faults(name, primary, outage_at):
+    """
+    Windows in which the primary is running but its application does not answer (hangs), or it
+    fails its system status check (impaired). EC2 reports the checks after STATUS_CHECK_LAG_SECONDS.
+    """
+    hangs = [(primary, outage_at, outage_at + 900)] if name == "app_hang" else []
+    impaired = [(primary, outage_at + STATUS_CHECK_LAG_SECONDS, outage_at + 900)] if name == "status_check_failure" else []
+    return hangs, impaired
+
+
+def _prober(sim, primary, clock):
+    """A HealthProber whose probes ask the simulation instead of the network."""
+    return HealthProber({primary: f"http://{primary}.invalid/api/status_check"},
+                        check=lambda url: sim.app_healthy(primary), clock=clock.time)
+
+
+def _first_after(times, start):
+    later = [t for t in times if t >= start]
+    return round(later[0] - start, 3) if later else None
+
+
+def _score(sim, primary, outages, recovery, backup_starts, backup_stops, duration, outage_at):
+    recovered_at = next((t for t, i, s in sim.observations if i == primary and t >= recovery and s == "running"), None)
+    steady_calls = sum(1 for t, _, _ in sim.calls if t < outage_at)
+    return {
+        "detect_seconds": _first_after([t for t, i, s in sim.observations if i == primary and s != "running"], outages[0]),
+        "start_backup_seconds": _first_after(backup_starts, outages[0]),
+        "stop_backup_after_recovery_seconds": _first_after(backup_stops, recovered_at) if recovered_at is not None else None,
+        "backup_start_commands": len(backup_starts),
+        "backup_stop_commands": len(backup_stops),
+        "aws_calls_per_hour": round(len(sim.calls) * 3600 / duration, 1),
+        "steady_aws_calls_per_hour": round(steady_calls * 3600 / outage_at, 1) if outage_at else None,
+    }
+
+
+def run_monitor_scenario(name, duration, outage_at, probes=False, health_checks=False):
+    """
+    Runs EC2FailoverScript.main_monitoring_loop for one scenario, optionally with health probes of the
+    primary and/or with states read from status checks and alarms (MONITOR_HEALTH_CHECKS).
+    """
+    m = EC2FailoverScript
+    clock = VirtualClock(duration)
+    primary, backup = m.MAIN_INSTANCE_ID, m.BACKUP_INSTANCE_ID
+    events, throttled, timeouts, outages, recovery = _scenario(name, primary, m.MAIN_REGION, outage_at)
+    sim = SimulatedEC2(clock, {primary: (m.MAIN_REGION, "running"), backup: (m.BACKUP_REGION, "stopped")},
+                       events, throttled, timeouts, *_faults(name, primary, outage_at))
+    prober = _prober(sim, primary, clock) if probes else None
+
+    original = m.get_ec2_client, m.aws_clients, m.journal, m.USE_HEALTH_CHECKS
+    m.get_ec2_client, m.journal, m.USE_HEALTH_CHECKS = sim.client, EventJournal(None, clock=clock.time), health_checks
+    m.aws_clients = SimpleNamespace(get=lambda service, region: sim.client(region))
+    try:
+        m.main_monitoring_loop(clock=clock.time, sleep=clock.async_sleep, prober=prober)
+    except SimulationFinished:
+        pass
+    finally:
+        m.get_ec2_client, m.aws_clients, m.journal, m.USE_HEALTH_CHECKS = original
+        if prober is not None:
+            prober.close()
+
+    starts = [t for t, op, i in sim.actions if op == "StartInstances" and i == backup]
+    stops = [t for t, op, i in sim.actions if op == "StopInstances" and i == backup]
+    return _score(sim, primary, outages, recovery, starts, stops, duration, outage_at)
+
+
+class _FakeDocker:
+    """
+    Stands in for the docker CLI and the services' readiness URLs in failover.py: answers
+    `docker ps` from its own container table and `docker start` by marking the container running.
+    A started service reports ready LOCAL_READY_SECONDS later.
+    """
+
+    def __init__(self, clock, project, services):
+        self.clock = clock
+        self.project = project
+        self.containers = {f"c{n}": {"service": service, "state": "exited", "ready_at": None}
+                           for n, service in enumerate(services)}
+        self.urls = {url: service for service, url in services.items()}
+        self.starts = []
+
+    def run(self, command, check=False, **kwargs):
+        args = command[1:]
+        if args[:1] == ["ps"]:
+            lines = [f"{cid}\t{self.project}-{c['service']}-1\t{c['state']}\t{c['service']}" for cid, c in self.containers.items()]
+            return subprocess.CompletedProcess(command, 0, stdout="\n".join(lines) + "\n", stderr="")
+        if args[:1] == ["start"]:
+            for cid in args[1:]:
+                self.containers[cid].update(state="running", ready_at=self.clock.time() + LOCAL_READY_SECONDS)
+            self.starts.append(self.clock.time())
+            return subprocess.CompletedProcess(command, 0, stdout="", stderr="")
+        raise subprocess.CalledProcessError(1, command)
+
+    def is_ready(self, url):
+        service = self.urls[url]
+        return any(c["service"] == service and c["ready_at"] is not None and self.clock.time() >= c["ready_at"]
+                   for c in self.containers.values())
+
+
+def run_local_scenario(name, duration, outage_at, probes=False):
+    """Runs the root failover.py `main` for one scenario; its 'backup' is the local Docker services."""
+    clock = VirtualClock(duration)
+    primary = failover.EC2_INSTANCE_ID
+    events, throttled, timeouts, outages, recovery = _scenario(name, primary, failover.REGION, outage_at)
+    sim = SimulatedEC2(clock, {primary: (failover.REGION, "running")}, events, throttled, timeouts,
+                       *_faults(name, primary, outage_at))
+    prober = _prober(sim, primary, clock) if probes else None
+    docker = _FakeDocker(clock, failover.COMPOSE_PROJECT, failover.LOCAL_SERVICES)
+    patched = {
+        "time": SimpleNamespace(sleep=clock.sleep, time=clock.time, monotonic=clock.time),
+        "aws_clients": SimpleNamespace(get=lambda service, region: sim.client(region)),
+        "subprocess": SimpleNamespace(run=docker.run, SubprocessError=subprocess.SubprocessError),
+        "is_ready": docker.is_ready,
+        "journal": EventJournal(None, clock=clock.time),
+        "starting_since": {},
+    }
+    original = {key: getattr(failover, key) for key in patched}
+    for key, value in patched.items():
+        setattr(failover, key, value)
+    try:
+        failover.main(prober=prober)
+    except SimulationFinished:
+        pass
+    finally:
+        for key, value in original.items():
+            setattr(failover, key, value)
+        if prober is not None:
+            prober.close()
+
+    # failover.py never stops the local services again, so there is no stop time to report.
+    return _score(sim, primary, outages, recovery, docker.starts, [], duration, outage_at)
+
+
+TARGETS = {
+    "monitor": run_monitor_scenario,
+    "monitor+probes": partial(run_monitor_scenario, probes=True),
+    "monitor+health": partial(run_monitor_scenario, health_checks=True),
+    "local": run_local_scenario,
+    "local+probes": partial(run_local_scenario, probes=True),
+}
+SCENARIOS = ("primary_stop", "flapping", "throttling", "region_timeout", "app_hang", "status_check_failure")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=sorted(TARGETS))
+    parser.add_argument("--duration", type=float, default=3600, help="simulated seconds per scenario")
+    parser.add_argument("--outage-at", type=float, default=600, help="simulated time of the first primary outage")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the schedulers' jitter")
+    parser.add_argument("--verbose", action="store_true", help="keep the monitors' own log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    EC2FailoverScript.METRICS_PORT = 0 # No Prometheus listener for simulated runs
+    EC2FailoverScript.AWS_PREWARM_CLIENTS = False # The simulated clients need no warming
+    results = {}
+    for target in args.targets:
+        for scenario in args.scenarios:
+            random.seed(args.seed)
+            results.setdefault(target, {})[scenario] = TARGETS[target](scenario, args.duration, args.outage_at)
+    print(json.dumps({"benchmark": "failover", "duration_seconds": args.duration, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
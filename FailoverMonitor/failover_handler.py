@@ -0,0 +1,228 @@
+import json
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+import EC2FailoverScript
+from event_journal import EventJournal, setup_queue_logging
+from instrumentation import REGISTRY as METRICS_REGISTRY, start_metrics_server
+
+# --- Configuration (see readme, Part 3) ---
+FAILOVER_SQS_QUEUE_URL = os.getenv("FAILOVER_SQS_QUEUE_URL")
+AWS_REGION_FOR_SCRIPT = os.getenv("AWS_REGION_FOR_SCRIPT", EC2FailoverScript.MAIN_REGION)
+PRIMARY_ALARM_NAME = os.getenv("PRIMARY_ALARM_NAME", "MainInstanceUnhealthyAlarm")
+BACKUP_INSTANCE_ID = os.getenv("BACKUP_INSTANCE_ID", EC2FailoverScript.BACKUP_INSTANCE_ID)
+BACKUP_INSTANCE_REGION = os.getenv("BACKUP_INSTANCE_REGION", EC2FailoverScript.BACKUP_REGION)
+
+RECEIVE_WAIT_SECONDS = 20 # SQS long poll; the maximum SQS allows
+RECEIVE_BATCH_SIZE = 10 # Messages per ReceiveMessage; the maximum SQS allows
+DEDUPE_WINDOW_SECONDS = 3600 # How long an alarm notification is remembered
+DEDUPE_MAX_ENTRIES = 4096
+# Separate from the monitor's files, so both can run side by side on the management node
+LOG_FILE = "failover_handler.log"
+JOURNAL_FILE = os.getenv("HANDLER_JOURNAL_FILE", "failover_handler_journal.jsonl") # Empty disables it
+METRICS_PORT = int(os.getenv("HANDLER_METRICS_PORT", "9102")) # Prometheus /metrics listener; 0 disables it
+
+journal = EventJournal(None) # Opened by the __main__ block below
+
+
+class AlarmDeduplicator:
+    """
+    Remembers recently handled alarm transitions so repeated notifications of the
+    same state change (SNS retries, duplicate SQS deliveries, several messages in
+    one batch) trigger only one failover action.
+    """
+
+    def __init__(self, window_seconds=DEDUPE_WINDOW_SECONDS, max_entries=DEDUPE_MAX_ENTRIES, clock=time.time):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._seen = OrderedDict()
+
+    def first_time(self, key):
+        """Returns True the first time a key is seen within the window, False for repeats."""
+        now = self.clock()
+        while self._seen and (len(self._seen) >= self.max_entries or next(iter(self._seen.values())) < now - self.window_seconds):
+            self._seen.popitem(last=False)
+        if key in self._seen:
+            return False
+        self._seen[key] = now
+        return True
+
+    def forget(self, key):
+        """Drops a key so the next notification for it is handled again."""
+        self._seen.pop(key, None)
+
+
+def parse_alarm_notification(body):
+    """
+    Extracts the CloudWatch alarm payload from an SQS message body, which is either
+    an SNS envelope (the default SNS->SQS delivery) or the raw alarm JSON.
+    Returns None if the body is not an alarm notification.
+    """
+    try:
+        payload = json.loads(body)
+        if payload.get("Type") == "Notification" and "Message" in payload:
+            payload = json.loads(payload["Message"])
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if not isinstance(payload, dict) or "AlarmName" not in payload or "NewStateValue" not in payload:
+        return None
+    return payload
+
+
+def alarm_instance_id(alarm):
+    """Returns the InstanceId dimension of the alarm's metric, if there is one."""
+    for dimension in alarm.get("Trigger", {}).get("Dimensions", []):
+        if dimension.get("name") == "InstanceId":
+            return dimension.get("value")
+    return None
+
+
+def _parse_time(value):
+    """Parses the alarm's StateChangeTime ('2025-06-02T19:50:56.123+0000') to epoch seconds."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def backup_for_alarm(alarm, pairs):
+    """
+    Picks the backup instance to start for an alarm: the pair whose main instance
+    is the alarm's InstanceId dimension, otherwise the configured BACKUP_INSTANCE_ID.
+    """
+    instance_id = alarm_instance_id(alarm)
+    for pair in pairs:
+        if instance_id and pair.main_instance_id == instance_id:
+            return pair.backup_instance_id, pair.backup_region
+    return BACKUP_INSTANCE_ID, BACKUP_INSTANCE_REGION
+
+
+def handle_messages(messages, dedupe, pairs, start_instance=EC2FailoverScript.start_instance, clock=time.time):
+    """
+    Processes one ReceiveMessage batch. Returns (messages safe to delete, latency records).
+    A message whose failover action failed is not deleted, so SQS redelivers it after
+    the visibility timeout and the start is retried.
+    """
+    deletable, latencies = [], []
+    for message in messages:
+        alarm = parse_alarm_notification(message.get("Body", ""))
+        if alarm is None:
+            logging.warning(f"Ignoring SQS message {message.get('MessageId')}: not a CloudWatch alarm notification.")
+            deletable.append(message)
+            continue
+
+        alarm_name, new_state = alarm["AlarmName"], alarm["NewStateValue"]
+        if not alarm_name.startswith(PRIMARY_ALARM_NAME) or new_state != "ALARM":
+            logging.info(f"Alarm {alarm_name} changed to {new_state}; no failover action needed.")
+            deletable.append(message)
+            continue
+
+        dedupe_key = (alarm_name, alarm.get("StateChangeTime"))
+        if not dedupe.first_time(dedupe_key):
+            logging.info(f"Duplicate notification for {alarm_name} at {alarm.get('StateChangeTime')}; already handled.")
+            deletable.append(message)
+            continue
+
+        backup_id, backup_region = backup_for_alarm(alarm, pairs)
+        logging.warning(f"Alarm {alarm_name} is in ALARM ({alarm.get('NewStateReason', 'no reason given')}). Starting backup {backup_id} ({backup_region}).")
+        started = clock()
+        ok = start_instance(backup_id, backup_region)
+        journal.record("action", action="start", subject=backup_id, region=backup_region, ok=ok,
+                       alarm=alarm_name, durationMs=round((clock() - started) * 1000, 1))
+        if ok:
+            issued_at = clock()
+            alarm_time = _parse_time(alarm.get("StateChangeTime"))
+            sent_time = int(message.get("Attributes", {}).get("SentTimestamp", 0)) / 1000 or None
+            latency = {
+                "alarm": alarm_name, "backupInstanceId": backup_id,
+                "alarmToStartSeconds": round(issued_at - alarm_time, 3) if alarm_time else None,
+                "queueToStartSeconds": round(issued_at - sent_time, 3) if sent_time else None,
+            }
+            logging.info(f"Failover latency for {alarm_name}: alarm->StartInstances {latency['alarmToStartSeconds']}s, "
+                         f"queued->StartInstances {latency['queueToStartSeconds']}s")
+            latencies.append(latency)
+            deletable.append(message)
+        else:
+            # Let the dedupe entry go so the redelivered message is acted on.
+            dedupe.forget(dedupe_key)
+            logging.error(f"Failed to start backup {backup_id}; leaving the message on the queue to retry.")
+    return deletable, latencies
+
+
+FAILOVER_LATENCY = METRICS_REGISTRY.histogram(
+    "failover_handler_start_latency_seconds",
+    "Seconds from the alarm's state change (since=alarm) or the message being queued (since=queue) to StartInstances.",
+    ("since",), buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600))
+
+
+def record_latencies(latencies):
+    """Adds the latency records returned by handle_messages/poll_once to the failover latency histogram."""
+    for latency in latencies:
+        for since, key in (("alarm", "alarmToStartSeconds"), ("queue", "queueToStartSeconds")):
+            if latency[key] is not None:
+                FAILOVER_LATENCY.observe((since,), latency[key])
+
+
+def delete_messages(sqs, queue_url, messages):
+    """Deletes handled messages with DeleteMessageBatch, 10 per call."""
+    for offset in range(0, len(messages), RECEIVE_BATCH_SIZE):
+        chunk = messages[offset:offset + RECEIVE_BATCH_SIZE]
+        response = sqs.delete_message_batch(
+            QueueUrl=queue_url,
+            Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(chunk)],
+        )
+        for failure in response.get("Failed", []):
+            logging.error(f"Could not delete SQS message {chunk[int(failure['Id'])].get('MessageId')}: {failure.get('Message')}")
+
+
+def poll_once(sqs, queue_url, dedupe, pairs, start_instance=EC2FailoverScript.start_instance):
+    """One long-poll receive, dispatch and batched delete. Returns the latency records of any failovers."""
+    response = sqs.receive_message(
+        QueueUrl=queue_url,
+        MaxNumberOfMessages=RECEIVE_BATCH_SIZE,
+        WaitTimeSeconds=RECEIVE_WAIT_SECONDS,
+        AttributeNames=["SentTimestamp"],
+    )
+    messages = response.get("Messages", [])
+    if not messages:
+        return []
+    deletable, latencies = handle_messages(messages, dedupe, pairs, start_instance=start_instance)
+    if deletable:
+        delete_messages(sqs, queue_url, deletable)
+    return latencies
+
+
+def run_handler():
+    if not FAILOVER_SQS_QUEUE_URL:
+        logging.critical("FAILOVER_SQS_QUEUE_URL is not set. Cannot start the failover handler.")
+        raise SystemExit(1)
+
+    sqs = EC2FailoverScript.aws_clients.get("sqs", AWS_REGION_FOR_SCRIPT)
+    pairs = EC2FailoverScript.load_failover_pairs()
+    dedupe = AlarmDeduplicator()
+    logging.info("--- Starting SQS Failover Handler ---")
+    logging.info(f"Queue: {FAILOVER_SQS_QUEUE_URL} ({AWS_REGION_FOR_SCRIPT}), alarm prefix: {PRIMARY_ALARM_NAME}")
+    logging.info(f"Default backup instance: {BACKUP_INSTANCE_ID} ({BACKUP_INSTANCE_REGION})")
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT)
+            logging.info(f"Serving Prometheus metrics on port {METRICS_PORT} at /metrics")
+        except OSError as e:
+            logging.error(f"Could not start the metrics listener on port {METRICS_PORT}: {e}")
+
+    while True:
+        try:
+            record_latencies(poll_once(sqs, FAILOVER_SQS_QUEUE_URL, dedupe, pairs))
+        except Exception as e:
+            logging.error(f"Error polling SQS queue: {e}")
+            time.sleep(EC2FailoverScript.CHECK_INTERVAL_SECONDS) # Avoid a hot loop if SQS is unreachable
+
+
+if __name__ == "__main__":
+    setup_queue_logging(LOG_FILE)
+    journal = EventJournal(JOURNAL_FILE or None)
+    run_handler()
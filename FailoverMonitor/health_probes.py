@@ -0,0 +1,135 @@
+"""
+Application-level health probes for the failover monitors.
+
+EC2 only knows whether an instance is running, not whether the application on
+it answers. A HealthProber checks every target concurrently, over HTTP(S)
+(`http://host:5000/api/status_check`, healthy on a 2xx/3xx answer) or TCP
+(`tcp://host:port`, healthy if it accepts a connection). Probes use short
+timeouts and one keep-alive session, so a check costs a request rather than a
+new connection, and no AWS calls at all.
+
+A target only changes between 'healthy' and 'unhealthy' after
+PROBE_FAILURE_THRESHOLD consecutive failures (or PROBE_SUCCESS_THRESHOLD
+consecutive successes), so a single slow answer does not trigger a failover.
+Until then it is 'unknown' and the monitors fall back to EC2 state alone.
+"""
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PROBE_INTERVAL_SECONDS = float(os.getenv("PROBE_INTERVAL_SECONDS", "2"))
+PROBE_TIMEOUT_SECONDS = float(os.getenv("PROBE_TIMEOUT_SECONDS", "1.5"))
+PROBE_FAILURE_THRESHOLD = int(os.getenv("PROBE_FAILURE_THRESHOLD", "3"))
+PROBE_SUCCESS_THRESHOLD = int(os.getenv("PROBE_SUCCESS_THRESHOLD", "2"))
+
+HEALTHY, UNHEALTHY, UNKNOWN = "healthy", "unhealthy", "unknown"
+
+
+class HealthProber:
+    """
+    Probes a fixed set of targets ({name: url}) concurrently and keeps a debounced health
+    status per target. `check(url)` may be replaced (e.g. in benchmarks); it returns True for
+    a healthy answer and returns False or raises otherwise.
+    """
+
+    def __init__(self, targets, interval=PROBE_INTERVAL_SECONDS, timeout=PROBE_TIMEOUT_SECONDS,
+                 failure_threshold=PROBE_FAILURE_THRESHOLD, success_threshold=PROBE_SUCCESS_THRESHOLD,
+                 check=None, clock=time.time):
+        self.targets = dict(targets)
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.success_threshold = success_threshold
+        self.check = check or self.check_url
+        self.clock = clock
+        self.last_probed = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(self.targets)), pool_maxsize=max(1, len(self.targets)), max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.targets)), thread_name_prefix="health-probe")
+        self._health = {name: {"status": UNKNOWN, "consecutiveFailures": 0, "consecutiveSuccesses": 0,
+                               "lastError": None, "latencyMs": None, "since": None}
+                        for name in self.targets}
+
+    def check_url(self, url):
+        """One HTTP GET or TCP connect against `url` with the probe timeout."""
+        parts = urlsplit(url)
+        if parts.scheme == "tcp":
+            with socket.create_connection((parts.hostname, parts.port), timeout=self.timeout):
+                return True
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return True
+
+    def _probe(self, name):
+        started = time.perf_counter()
+        try:
+            ok, error = bool(self.check(self.targets[name])), None
+            if not ok:
+                error = "unhealthy response"
+        except Exception as e:
+            ok, error = False, str(e) or e.__class__.__name__
+        return ok, error, round((time.perf_counter() - started) * 1000, 1)
+
+    def probe_all(self):
+        """
+        Probes every target at once and updates their statuses.
+        Returns the names whose status changed, as {name: (old_status, new_status, last_error)}.
+        """
+        names = list(self.targets)
+        results = list(self._executor.map(self._probe, names))
+        now = self.last_probed = self.clock()
+        changed = {}
+        for name, (ok, error, latency_ms) in zip(names, results):
+            health = self._health[name]
+            health["latencyMs"] = latency_ms
+            if ok:
+                health["consecutiveSuccesses"] += 1
+                health["consecutiveFailures"] = 0
+                needed = 1 if health["status"] == UNKNOWN else self.success_threshold
+                new_status = HEALTHY if health["consecutiveSuccesses"] >= needed else health["status"]
+            else:
+                health["consecutiveFailures"] += 1
+                health["consecutiveSuccesses"] = 0
+                health["lastError"] = error
+                new_status = UNHEALTHY if health["consecutiveFailures"] >= self.failure_threshold else health["status"]
+            if new_status != health["status"]:
+                changed[name] = (health["status"], new_status, health["lastError"])
+                health["status"] = new_status
+                health["since"] = now
+        return changed
+
+    def seconds_until_due(self):
+        """Seconds until the next round of probes is due; 0 if it is due now."""
+        if self.last_probed is None:
+            return 0.0
+        return max(0.0, self.last_probed + self.interval - self.clock())
+
+    def status(self, name):
+        """'healthy', 'unhealthy' or 'unknown' (also for names that are not probed)."""
+        health = self._health.get(name)
+        return health["status"] if health else UNKNOWN
+
+    def snapshot(self):
+        """A copy of every target's health record, for logs and metrics."""
+        return {name: dict(health, url=self.targets[name]) for name, health in self._health.items()}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+def combine_state(ec2_state, probe_status):
+    """
+    Folds a probe status into an EC2 instance state: an instance EC2 reports as running whose
+    application is unhealthy is 'impaired', which the monitors treat like any other outage.
+    """
+    if ec2_state == "running" and probe_status == UNHEALTHY:
+        return "impaired"
+    return ec2_state
@@ -0,0 +1,148 @@
+"""
+Adaptive, throttle-aware polling scheduler for the failover monitors.
+
+Polls slowly while every primary is steady and quickly (sub-second, with
+jitter) while something is transitioning or unhealthy. Every AWS call is
+charged against a token bucket per (account, region), and throttling errors
+(see Shared/aws_errors.py) back that region off exponentially instead of
+being treated as an outage. Backoff is per region: callers skip a region
+while `region_delay(region)` is positive and keep polling the others on
+schedule.
+"""
+import os
+import random
+import time
+from collections import deque
+
+STEADY_INTERVAL_SECONDS = float(os.getenv("MONITOR_STEADY_INTERVAL_SECONDS", "15"))
+FAST_INTERVAL_SECONDS = float(os.getenv("MONITOR_FAST_INTERVAL_SECONDS", "0.75"))
+JITTER_FRACTION = float(os.getenv("MONITOR_JITTER_FRACTION", "0.2"))
+MAX_BACKOFF_SECONDS = float(os.getenv("MONITOR_MAX_BACKOFF_SECONDS", "60"))
+API_CALLS_PER_SECOND = float(os.getenv("MONITOR_API_CALLS_PER_SECOND", "2"))
+API_BURST = int(os.getenv("MONITOR_API_BURST", "10"))
+AWS_ACCOUNT_KEY = os.getenv("AWS_ACCOUNT_ID") or os.getenv("AWS_PROFILE") or "default"
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def reserve(self):
+        """Takes one token and returns how many seconds the caller must wait before using it."""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class AdaptivePollScheduler:
+    """
+    Decides how long to wait before the next poll and rations AWS calls.
+
+    Callers report what they saw with `set_urgent()` and `record_call()`, ask
+    `reserve(region)` before each call, skip regions whose `region_delay()` is
+    positive, and sleep for `next_delay()` between polls.
+    """
+
+    def __init__(self, steady_interval=STEADY_INTERVAL_SECONDS, fast_interval=FAST_INTERVAL_SECONDS,
+                 jitter=JITTER_FRACTION, max_backoff=MAX_BACKOFF_SECONDS, rate=API_CALLS_PER_SECOND,
+                 burst=API_BURST, account=AWS_ACCOUNT_KEY, clock=time.monotonic, rng=random.random):
+        self.steady_interval = steady_interval
+        self.fast_interval = fast_interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.rate = rate
+        self.burst = burst
+        self.account = account
+        self.clock = clock
+        self.rng = rng
+        self.urgent = False
+        self.throttled_calls = 0
+        self._throttles = {}  # region -> consecutive throttled calls
+        self._backoff_until = {}  # region -> clock time before which it should not be called again
+        self._buckets = {}
+        self._calls = deque()  # timestamps of AWS calls in the last minute
+        self._polls = deque(maxlen=20)  # timestamps of recent polls
+
+    def set_urgent(self, urgent):
+        """Switches between fast polling (something is transitioning/unhealthy) and steady polling."""
+        self.urgent = bool(urgent)
+
+    def reserve(self, region):
+        """Charges one call to the (account, region) budget; returns seconds to wait before making it."""
+        key = (self.account, region)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, self.clock)
+        return bucket.reserve()
+
+    @property
+    def consecutive_throttles(self):
+        """Consecutive throttled calls in the most throttled region, for stats."""
+        return max(self._throttles.values(), default=0)
+
+    def record_call(self, throttled=False, region=None):
+        """
+        Counts an AWS call; a throttled one extends its region's backoff, a successful one resets it.
+        Regions are tracked separately so a healthy region does not cancel another region's backoff,
+        and a throttled region does not slow down the others.
+        """
+        now = self.clock()
+        self._calls.append(now)
+        while self._calls and self._calls[0] < now - 60:
+            self._calls.popleft()
+        if throttled:
+            count = self._throttles[region] = self._throttles.get(region, 0) + 1
+            self.throttled_calls += 1
+            base = self.fast_interval if self.urgent else self.steady_interval
+            backoff = min(self.max_backoff, base * 2 ** count)
+            self._backoff_until[region] = now + backoff * (0.5 + 0.5 * self.rng())  # Jittered so monitors do not retry in step
+        else:
+            self._throttles.pop(region, None)
+            self._backoff_until.pop(region, None)
+
+    def region_delay(self, region):
+        """Seconds until a throttled region may be called again; 0 for a region that is not backing off."""
+        until = self._backoff_until.get(region)
+        return max(0.0, until - self.clock()) if until is not None else 0.0
+
+    def record_poll(self):
+        """Marks the start of a poll, for the effective detection interval."""
+        self._polls.append(self.clock())
+
+    def next_delay(self):
+        """
+        Seconds to wait before the next poll. Throttled regions do not stretch it while another
+        region can still be polled; once every region seen so far is backing off, the poll waits
+        for the first of them to come out of backoff.
+        """
+        base = self.fast_interval if self.urgent else self.steady_interval
+        delay = base * (1 + self.jitter * (2 * self.rng() - 1))
+        regions = {region for _, region in self._buckets}
+        if regions:
+            waits = [self.region_delay(region) for region in regions]
+            if all(waits):
+                delay = max(delay, min(waits))
+        return delay
+
+    def stats(self):
+        """Counters for logs and metrics."""
+        now = self.clock()
+        calls_last_minute = sum(1 for t in self._calls if t >= now - 60)
+        polls = list(self._polls)
+        interval = (polls[-1] - polls[0]) / (len(polls) - 1) if len(polls) > 1 else None
+        return {
+            "mode": "fast" if self.urgent else "steady",
+            "api_calls_per_minute": calls_last_minute,
+            "throttled_calls_total": self.throttled_calls,
+            "consecutive_throttles": self.consecutive_throttles,
+            "backed_off_regions": sorted(region for region in self._backoff_until if self.region_delay(region) > 0),
+            "effective_detection_interval_seconds": round(interval, 3) if interval is not None else None,
+        }
@@ -17,6 +17,8 @@ type Device = {
   awsInstanceId: string | null; 
   awsRegion: string | null;    
   status: string;              
+  health?: string;       // Status checks + alarm verdict from 'health' stream events
+  healthReasons?: string;
 };
 
 // --- Initial Device Configuration ---
@@ -72,6 +74,10 @@ function DeviceCard({ device, onShutdown, onOn, onDelete }: DeviceCardProps) {
   else if (device.status === "stopped") statusColor = "text-red-500";
   else if (device.status === "Error" || device.status === "Fetch Err" || device.status === "Status Err") statusColor = "text-orange-400";
 
+  let healthColor = "text-yellow-400"; // initializing/unknown
+  if (device.health === "healthy") healthColor = "text-green-400";
+  else if (device.health === "impaired" || device.health === "down") healthColor = "text-red-500";
+
   return (
     <div
       style={{ width: 230 }} // Adjusted width
@@ -94,6 +100,11 @@ function DeviceCard({ device, onShutdown, onOn, onDelete }: DeviceCardProps) {
       <div className="text-xs text-gray-400 mb-2">Region: {device.region}</div>
       
       <div className="text-sm mb-1">Status: <span className={`font-semibold ${statusColor}`}>{device.status}</span></div>
+      {device.health && (
+        <div className="text-sm mb-1" title={device.healthReasons}>
+          Health: <span className={`font-semibold ${healthColor}`}>{device.health}</span>
+        </div>
+      )}
       <div className="text-sm mb-1">Uptime: {device.uptime}</div>
       <div className="text-sm mb-3">
         CPU: {typeof device.cpuUsage === 'number' ? `${device.cpuUsage}%` : device.cpuUsage}
@@ -221,12 +232,53 @@ function App() {
     }
   }, [API_BASE_URL]);
 
+  // Applies a single record pushed by /api/stream to the matching device
+  const applyStreamRecord = useCallback((kind: string, record: any) => {
+    setDevices(prevDevices =>
+      prevDevices.map(device => {
+        if (device.awsInstanceId !== record.instanceId || device.awsRegion !== record.region) {
+          return device;
+        }
+        if (kind === "cpu") {
+          return { ...device, cpuUsage: record.cpu !== null ? record.cpu : (record.error ? `CPU Err` : 'N/A') };
+        }
+        if (kind === "health") {
+          return {
+            ...device,
+            health: record.error ? 'Health Err' : record.health,
+            healthReasons: record.error || (record.reasons || []).join("; ") || undefined,
+          };
+        }
+        return {
+          ...device,
+          uptime: record.uptime || (record.error ? `Uptime Err` : 'N/A'),
+          status: record.status || (record.error ? `Status Err` : 'Unknown'),
+        };
+      })
+    );
+  }, []);
+
   useEffect(() => {
     setIsLoading(true); // Set loading for the very first fetch
     fetchData();
-    const interval = setInterval(fetchData, 30000);
-    return () => clearInterval(interval);
-  }, [fetchData]);
+
+    // The backend pushes only changed records; EventSource reconnects on its own
+    // and resumes from the last event id, so no polling is needed.
+    if (typeof EventSource === "undefined") {
+      const interval = setInterval(fetchData, 30000);
+      return () => clearInterval(interval);
+    }
+    const source = new EventSource(`${API_BASE_URL}/stream`);
+    const onCpu = (e: MessageEvent) => applyStreamRecord("cpu", JSON.parse(e.data));
+    const onUptime = (e: MessageEvent) => applyStreamRecord("uptime", JSON.parse(e.data));
+    const onHealth = (e: MessageEvent) => applyStreamRecord("health", JSON.parse(e.data));
+    source.addEventListener("cpu", onCpu);
+    source.addEventListener("uptime", onUptime);
+    source.addEventListener("health", onHealth);
+    source.onopen = () => setFetchError(null);
+    source.onerror = () => setFetchError("Live updates disconnected. Reconnecting...");
+    return () => source.close();
+  }, [fetchData, applyStreamRecord, API_BASE_URL]);
 
   // --- Action Handlers ---
   const handleActionConfirm = (message: string, actionFn: () => void) => {
@@ -249,7 +301,6 @@ function App() {
           const data = await response.json();
           if (!response.ok) throw new Error(data.error || `Failed to start ${awsInstanceId}`);
           alert(data.message || `Start initiated for ${awsInstanceId}.`);
-          setTimeout(fetchData, 2000); // Refresh data sooner after action
         } catch (err: any) {
           alert(`Start Error: ${err.message}`);
         }
@@ -270,7 +321,6 @@ function App() {
           const data = await response.json();
           if (!response.ok) throw new Error(data.error || `Failed to shutdown ${awsInstanceId}`);
           alert(data.message || `Shutdown initiated for ${awsInstanceId}.`);
-          setTimeout(fetchData, 2000); 
         } catch (err: any) {
           alert(`Shutdown Error: ${err.message}`);
         }
@@ -0,0 +1,14 @@
+"""
+AWS error codes shared by the backend's call metrics and the failover monitors' backoff.
+"""
+
+THROTTLING_ERROR_CODES = {
+    "RequestLimitExceeded", "Throttling", "ThrottlingException",
+    "TooManyRequestsException", "RequestThrottled", "SlowDown",
+}
+
+
+def is_throttling_error(error):
+    """True for botocore ClientErrors that mean 'slow down' rather than 'something is wrong'."""
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
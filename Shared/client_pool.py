@@ -0,0 +1,84 @@
+"""
+Shared, thread-safe pool of boto3 clients for the dashboard backend and the failover monitors.
+
+Clients are created lazily, once per (service, region), from a single boto3
+session, so credentials and service models are resolved once per process
+rather than once per client or per call. Each client gets a larger urllib3
+connection pool and TCP keep-alive so concurrent fan-out calls reuse warm
+connections. `prewarm` creates the clients for known regions on a background
+thread so the first request does not pay for it.
+"""
+import logging
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "32"))
+AWS_TCP_KEEPALIVE = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true"
+AWS_PREWARM_CLIENTS = os.getenv("AWS_PREWARM_CLIENTS", "true").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+
+class ClientPool:
+    """
+    Hands out one client per (service, region). Lookups of existing clients take no lock;
+    creation is serialised because boto3 sessions are not safe to share while creating clients.
+
+    `config` is merged over the pool's connection settings. `on_create(client)`, if given,
+    is applied to every new client (e.g. to instrument it) and must return the client.
+    """
+
+    def __init__(self, config=None, max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+                 tcp_keepalive=AWS_TCP_KEEPALIVE, on_create=None, session_factory=boto3.session.Session):
+        pool_config = Config(max_pool_connections=max_pool_connections, tcp_keepalive=tcp_keepalive)
+        self.config = pool_config.merge(config) if config is not None else pool_config
+        self.on_create = on_create
+        self._session_factory = session_factory
+        self._session = None
+        self._clients = {}
+        self._create_lock = threading.Lock()
+
+    def get(self, service_name, region_name):
+        """Returns the shared client for a service and region, creating it on first use."""
+        key = (service_name, region_name)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._create_lock:
+            client = self._clients.get(key)
+            if client is None:
+                started = time.perf_counter()
+                if self._session is None:
+                    self._session = self._session_factory()
+                client = self._session.client(service_name, region_name=region_name, config=self.config)
+                if self.on_create is not None:
+                    client = self.on_create(client)
+                self._clients[key] = client
+                logger.info(f"Created {service_name} client for {region_name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return client
+
+    def prewarm(self, services, regions, background=True):
+        """
+        Creates the clients for every service in every region ahead of use. Runs on a daemon
+        thread unless background is False; returns the thread (or None). Failures are only
+        logged, the client is then created on first use as usual.
+        """
+        keys = [(service, region) for region in dict.fromkeys(regions) for service in services]
+
+        def warm():
+            for service, region in keys:
+                try:
+                    self.get(service, region)
+                except Exception as e:
+                    logger.warning(f"Could not pre-warm {service} client for {region}: {e}")
+
+        if not background:
+            warm()
+            return None
+        thread = threading.Thread(target=warm, name="aws-client-prewarm", daemon=True)
+        thread.start()
+        return thread
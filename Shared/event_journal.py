@@ -0,0 +1,263 @@
+"""
+Non-blocking logging and a state-transition journal for the failover monitors.
+
+`setup_queue_logging` moves log file writes off the monitoring loop: records go
+onto an in-memory queue and a background listener writes them to a
+size-rotated file. `EventJournal` writes one compact JSON line per change only
+(state edges, actions with their duration, errors with how long they lasted),
+through the same kind of queue, so an incident timeline can be rebuilt without
+wading through per-tick log lines.
+
+Rebuilding a timeline streams the journal (and its rotated files) line by line,
+so it works on multi-GB journals:
+
+    python event_journal.py failover_journal.jsonl --since 2025-06-02T19:00 --pair web
+    python event_journal.py failover_journal.jsonl --incidents --json
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_MAX_BYTES = int(os.getenv("MONITOR_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("MONITOR_LOG_BACKUP_COUNT", "5"))
+JOURNAL_MAX_BYTES = int(os.getenv("MONITOR_JOURNAL_MAX_BYTES", str(100 * 1024 * 1024)))
+JOURNAL_BACKUP_COUNT = int(os.getenv("MONITOR_JOURNAL_BACKUP_COUNT", "10"))
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+def _start_listener(handlers):
+    """Returns a QueueHandler whose records are written by `handlers` on a background thread."""
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Drains whatever is still queued on shutdown
+    return QueueHandler(records)
+
+
+def setup_queue_logging(log_file, level=logging.INFO, console=True, max_bytes=LOG_MAX_BYTES,
+                        backup_count=LOG_BACKUP_COUNT, fmt=LOG_FORMAT):
+    """
+    Configures the root logger to hand records to a queue; a listener thread writes them to
+    `log_file` (rotated at max_bytes, keeping backup_count old files) and, optionally, the console.
+    """
+    formatter = logging.Formatter(fmt)
+    handlers = [RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, delay=True)]
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_start_listener(handlers))
+    root.setLevel(level)
+
+
+class EventJournal:
+    """
+    Append-only JSONL journal of changes. Every line has "ts" (epoch seconds) and "event":
+
+    - "state": a subject (usually an instance id) moved "from" one state "to" another
+    - "action": something was done, with "ok" and "durationMs"
+    - "error" / "recovered": an error source started failing, and stopped after "durationSeconds"
+
+    Repeated observations of the same state or the same error are not written.
+    A journal created with path=None keeps its bookkeeping but writes nothing.
+    """
+
+    def __init__(self, path, max_bytes=JOURNAL_MAX_BYTES, backup_count=JOURNAL_BACKUP_COUNT, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._states = {}
+        self._errors = {}  # source -> (message, since)
+        self._logger = None
+        if path:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger(f"event_journal.{os.path.abspath(path)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.handlers = [_start_listener([handler])]
+
+    def record(self, event, **fields):
+        """Writes one event unconditionally."""
+        if self._logger is not None:
+            line = json.dumps({"ts": round(self.clock(), 3), "event": event, **fields}, separators=(",", ":"), default=str)
+            self._logger.info(line)
+
+    def transition(self, subject, state, **fields):
+        """Records a state edge for a subject if its state changed. Returns True if it did."""
+        previous = self._states.get(subject)
+        if subject in self._states and previous == state:
+            return False
+        self._states[subject] = state
+        self.record("state", subject=subject, **{"from": previous, "to": state}, **fields)
+        return True
+
+    def error(self, source, message, **fields):
+        """Records that a source is failing; repeats of the same message are not written."""
+        current = self._errors.get(source)
+        if current is not None and current[0] == message:
+            return
+        self._errors[source] = (message, current[1] if current else self.clock())
+        self.record("error", source=source, message=message, **fields)
+
+    def recovered(self, source, **fields):
+        """Records that a failing source works again, with how long it was failing."""
+        current = self._errors.pop(source, None)
+        if current is not None:
+            self.record("recovered", source=source, durationSeconds=round(self.clock() - current[1], 3), **fields)
+
+
+# --- Reading the journal back ---
+
+def journal_files(path):
+    """The journal and its rotated files, oldest first (path.N ... path.1, path)."""
+    rotated = []
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        rotated.append(f"{path}.{n}")
+        n += 1
+    return list(reversed(rotated)) + ([path] if os.path.exists(path) else [])
+
+
+def _first_timestamp(path):
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                return json.loads(line)["ts"]
+            except (ValueError, KeyError):
+                continue
+    return None
+
+
+def read_events(path, since=None, until=None, pair=None, subject=None):
+    """
+    Yields journal events in order, streaming every file line by line. Rotated files that end
+    before `since` are skipped without being read, and lines that cannot match the pair or
+    subject filter are skipped before being parsed.
+    """
+    files = journal_files(path)
+    needles = [f'"pair":{json.dumps(pair)}' if pair else None, f'"subject":{json.dumps(subject)}' if subject else None]
+    needles = [needle.encode() for needle in needles if needle]
+    for index, file_path in enumerate(files):
+        if since is not None and index + 1 < len(files):
+            next_start = _first_timestamp(files[index + 1])
+            if next_start is not None and next_start <= since:
+                continue  # Everything in this file is older than the next file's first event
+        with open(file_path, "rb") as f:
+            for line in f:
+                if needles and not all(needle in line for needle in needles):
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # A torn last line from a crash
+                ts = event.get("ts", 0)
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    return
+                yield event
+
+
+def build_incidents(events):
+    """
+    Groups events into incidents: from a main instance leaving 'running' until it is running
+    again and any backup started meanwhile has been stopped (or the journal ends).
+    Yields one summary per incident with the seconds from its start to each first successful action.
+    """
+    open_incidents = {}
+    for event in events:
+        pair = event.get("pair")
+        incident = open_incidents.get(pair)
+        if event["event"] == "state" and event.get("role") == "main":
+            if event["from"] == "running" and event["to"] != "running" and incident is None:
+                incident = open_incidents[pair] = {"pair": pair, "mainInstanceId": event["subject"],
+                                                   "start": event["ts"], "end": None, "events": [], "actions": {}}
+            elif event["to"] == "running" and incident is not None:
+                incident["mainRecovered"] = event["ts"]
+        if incident is None:
+            continue
+        incident["events"].append(event)
+        if event["event"] == "action" and event.get("ok"):
+            incident["actions"].setdefault(event["action"], event["ts"])
+        actions = incident["actions"]
+        if "mainRecovered" in incident and ("start" not in actions or "stop" in actions):
+            incident["end"] = event["ts"]
+            yield _summarise(open_incidents.pop(pair))
+    for incident in open_incidents.values():
+        yield _summarise(incident)
+
+
+def _summarise(incident):
+    start = incident["start"]
+    return {
+        "pair": incident["pair"], "mainInstanceId": incident["mainInstanceId"],
+        "start": _iso(start), "end": _iso(incident["end"]) if incident["end"] else None,
+        "secondsToAction": {action: round(ts - start, 3) for action, ts in incident["actions"].items()},
+        "secondsToMainRecovered": round(incident["mainRecovered"] - start, 3) if "mainRecovered" in incident else None,
+        "events": len(incident["events"]),
+    }
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _parse_time(value):
+    """Accepts epoch seconds or an ISO 8601 time (UTC if no offset is given)."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _describe(event):
+    if event["event"] == "state":
+        head = f"{event['subject']} {event['from']} -> {event['to']}"
+        hidden = ("subject", "from", "to")
+    else:
+        head = event.get("action") or event.get("source") or ""
+        hidden = ("action", "source")
+    details = {k: v for k, v in event.items() if k not in ("ts", "event") + hidden}
+    extra = " ".join(f"{k}={v}" for k, v in details.items())
+    return f"{_iso(event['ts'])}  {event['event']:<9} {head}  {extra}".rstrip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a failover timeline from a monitor journal.")
+    parser.add_argument("journal", help="journal path; its rotated files (.1, .2, ...) are read too")
+    parser.add_argument("--since", help="epoch seconds or ISO time")
+    parser.add_argument("--until", help="epoch seconds or ISO time")
+    parser.add_argument("--pair", help="only events for this failover pair")
+    parser.add_argument("--subject", help="only state events for this instance id")
+    parser.add_argument("--incidents", action="store_true", help="summarise incidents instead of listing events")
+    parser.add_argument("--json", action="store_true", help="print JSON lines instead of text")
+    args = parser.parse_args()
+
+    events = read_events(args.journal, _parse_time(args.since), _parse_time(args.until), args.pair, args.subject)
+    rows = build_incidents(events) if args.incidents else events
+    for row in rows:
+        if args.json:
+            print(json.dumps(row, separators=(",", ":")))
+        elif args.incidents:
+            print(" ".join(f"{k}={v}" for k, v in row.items()))
+        else:
+            print(_describe(row))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
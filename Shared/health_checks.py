@@ -0,0 +1,127 @@
+"""
+EC2 status checks and CloudWatch alarm state, aggregated per instance.
+
+For each region this makes a fixed number of calls whatever the number of
+tracked instances: a paginated DescribeInstanceStatus with IncludeAllInstances
+(100 ids per call, so stopped instances are reported too) and one paginated
+DescribeAlarms by alarm-name prefix. Alarms are matched to instances through
+their InstanceId dimension. Used by the backend's /api/health and by the
+failover monitors.
+
+A throttled DescribeAlarms is raised like a throttled status call, so callers
+back off; any other alarm failure makes an otherwise healthy instance "unknown"
+rather than healthy, since its alarms could not be checked.
+"""
+import os
+import re
+
+from botocore.exceptions import ClientError
+
+from aws_errors import is_throttling_error
+
+# Defaults to the alarm Terraform creates for the main instance; set it empty to match every alarm in the region
+HEALTH_ALARM_NAME_PREFIX = os.getenv("HEALTH_ALARM_NAME_PREFIX", "MainInstanceUnhealthyAlarm")
+MAX_IDS_PER_STATUS_CALL = 100 # DescribeInstanceStatus limit for explicit instance ids
+
+HEALTHY, IMPAIRED, INITIALIZING, DOWN, UNKNOWN = "healthy", "impaired", "initializing", "down", "unknown"
+
+
+def fetch_instance_statuses(ec2_client, instance_ids):
+    """
+    Returns {instance_id: InstanceStatuses entry} for the given ids in one region.
+    Ids that no longer exist are dropped and the call retried, instead of failing the whole batch.
+    """
+    statuses = {}
+    paginator = ec2_client.get_paginator("describe_instance_status")
+    for offset in range(0, len(instance_ids), MAX_IDS_PER_STATUS_CALL):
+        chunk = list(instance_ids[offset:offset + MAX_IDS_PER_STATUS_CALL])
+        while chunk:
+            try:
+                for page in paginator.paginate(InstanceIds=chunk, IncludeAllInstances=True):
+                    for status in page.get("InstanceStatuses", []):
+                        statuses[status["InstanceId"]] = status
+                break
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "InvalidInstanceID.NotFound":
+                    raise
+                missing = set(re.findall(r"i-[0-9a-f]+", e.response["Error"].get("Message", "")))
+                if not missing & set(chunk):
+                    raise
+                chunk = [instance_id for instance_id in chunk if instance_id not in missing]
+    return statuses
+
+
+def fetch_alarms_by_instance(cloudwatch_client, alarm_prefix=HEALTH_ALARM_NAME_PREFIX):
+    """Returns {instance_id: [alarm, ...]} for the region's metric alarms whose name starts with alarm_prefix."""
+    kwargs = {"AlarmTypes": ["MetricAlarm"]}
+    if alarm_prefix:
+        kwargs["AlarmNamePrefix"] = alarm_prefix
+    alarms = {}
+    for page in cloudwatch_client.get_paginator("describe_alarms").paginate(**kwargs):
+        for alarm in page.get("MetricAlarms", []):
+            for dimension in alarm.get("Dimensions", []):
+                if dimension["Name"] != "InstanceId":
+                    continue
+                updated = alarm.get("StateUpdatedTimestamp")
+                alarms.setdefault(dimension["Value"], []).append({
+                    "name": alarm["AlarmName"], "state": alarm["StateValue"], "metric": alarm.get("MetricName"),
+                    "reason": alarm.get("StateReason"), "updatedAt": updated.isoformat() if updated else None,
+                })
+    return alarms
+
+
+def build_health_record(instance_id, region, status, alarms, alarms_error=None):
+    """Merges one instance's status entry (or None) and alarms into a health record with an overall verdict."""
+    state = status["InstanceState"]["Name"] if status else None
+    system_status = status.get("SystemStatus", {}).get("Status") if status else None
+    instance_status = status.get("InstanceStatus", {}).get("Status") if status else None
+    reasons = [f"alarm {alarm['name']} is in ALARM" for alarm in alarms if alarm["state"] == "ALARM"]
+    if system_status == "impaired":
+        reasons.append("system status check failed")
+    if instance_status == "impaired":
+        reasons.append("instance status check failed")
+
+    if state is None:
+        health, reasons = UNKNOWN, [f"Instance {instance_id} not found in region {region}."]
+    elif state != "running":
+        health = DOWN
+    elif reasons:
+        health = IMPAIRED
+    elif alarms_error:
+        health = UNKNOWN
+        reasons.append(f"alarm state unknown: {alarms_error}")
+    elif "initializing" in (system_status, instance_status) or "insufficient-data" in (system_status, instance_status):
+        health = INITIALIZING
+    else:
+        health = HEALTHY
+
+    record = {
+        "instanceId": instance_id, "region": region, "state": state, "health": health,
+        "systemStatus": system_status, "instanceStatus": instance_status,
+        "alarms": alarms, "reasons": reasons,
+    }
+    if alarms_error:
+        record["alarmsError"] = alarms_error
+    return record
+
+
+def fetch_region_health(ec2_client, cloudwatch_client, region, instance_ids, alarm_prefix=HEALTH_ALARM_NAME_PREFIX):
+    """
+    Returns {instance_id: health record} for every requested id in one region.
+    Raises if the status checks cannot be read or DescribeAlarms is throttled. Any other failed
+    alarm lookup is reported through build_health_record's alarms_error; cloudwatch_client=None
+    skips alarms.
+    """
+    statuses = fetch_instance_statuses(ec2_client, instance_ids)
+    alarms, alarms_error = {}, None
+    if cloudwatch_client is not None:
+        try:
+            alarms = fetch_alarms_by_instance(cloudwatch_client, alarm_prefix)
+        except Exception as e:
+            if is_throttling_error(e):
+                raise
+            alarms_error = str(e)
+    return {
+        instance_id: build_health_record(instance_id, region, statuses.get(instance_id), alarms.get(instance_id, []), alarms_error)
+        for instance_id in instance_ids
+    }
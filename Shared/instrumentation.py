@@ -0,0 +1,229 @@
+"""
+In-process metrics for the dashboard backend and the failover monitors.
+
+A deliberately small Prometheus-compatible registry (histograms, counters,
+gauges rendered in the text exposition format), plus botocore event hooks that
+time every AWS call made through an instrumented client. Recording a sample is
+a dict lookup, a bisect and a few additions under a lock, so it costs about a
+microsecond; `python Backend/benchmarks.py instrumentation` measures it.
+"""
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from aws_errors import THROTTLING_ERROR_CODES
+
+# Upper bounds in seconds; wide enough for a local Flask route and a slow cross-region call.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Family:
+    """One named metric with a fixed set of label names; samples are keyed by label-value tuples."""
+
+    kind = None
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._samples[labels] = self._samples.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            samples = list(self._samples.items())
+        return self._header() + [f"{self.name}{_label_text(self.label_names, labels)} {value}" for labels, value in samples]
+
+
+class Gauge(_Family):
+    kind = "gauge"
+
+    def set(self, labels, value):
+        with self._lock:
+            self._samples[labels] = value
+
+    def render(self):
+        with self._lock:
+            samples = list(self._samples.items())
+        return self._header() + [f"{self.name}{_label_text(self.label_names, labels)} {value}" for labels, value in samples]
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._samples.get(labels)
+            if sample is None:
+                # Per-bucket counts (the last slot is +Inf), then sum; made cumulative when rendered.
+                sample = self._samples[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            sample[index] += 1
+            sample[-1] += value
+
+    def render(self):
+        with self._lock:
+            samples = [(labels, list(sample)) for labels, sample in self._samples.items()]
+        lines = self._header()
+        for labels, sample in samples:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), sample[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, labels, le)} {cumulative}")
+            label_text = _label_text(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {sample[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families by name; asking for an existing name returns the same family."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}
+
+    def _family(self, cls, name, help_text, label_names, **kwargs):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = cls(name, help_text, label_names, **kwargs)
+            return family
+
+    def counter(self, name, help_text, label_names=()):
+        return self._family(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._family(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._family(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def render(self):
+        """The whole registry in the Prometheus text exposition format."""
+        with self._lock:
+            families = list(self._families.values())
+        lines = []
+        for family in families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+AWS_CALL_SECONDS = REGISTRY.histogram(
+    "aws_api_call_duration_seconds", "Duration of AWS API calls, including botocore retries.",
+    ("service", "region", "operation"))
+AWS_CALL_ERRORS = REGISTRY.counter(
+    "aws_api_call_errors_total", "AWS API calls that failed, by error code.",
+    ("service", "region", "operation", "code"))
+AWS_CALL_THROTTLES = REGISTRY.counter(
+    "aws_api_throttled_attempts_total", "AWS API attempts rejected with a throttling error, retried or not.",
+    ("service", "region", "operation"))
+
+_START_KEY = "_instrumentation_started"
+
+
+def instrument_client(client):
+    """
+    Hooks a boto3 client so every call it makes is timed and its errors and throttles
+    are counted, labelled by service, region and operation. Returns the client.
+    """
+    service = client.meta.service_model.service_name
+    region = client.meta.region_name or ""
+    labels_by_operation = {}
+
+    def labels(model):
+        key = labels_by_operation.get(model.name)
+        if key is None:
+            key = labels_by_operation[model.name] = (service, region, model.name)
+        return key
+
+    def before_call(model, context, **kwargs):
+        context[_START_KEY] = (time.perf_counter(), model.name)
+
+    def after_call(model, http_response, parsed, context, **kwargs):
+        started = context.pop(_START_KEY, None)
+        if started is not None:
+            AWS_CALL_SECONDS.observe(labels(model), time.perf_counter() - started[0])
+        error = parsed.get("Error") if isinstance(parsed, dict) else None
+        if error and error.get("Code"):
+            AWS_CALL_ERRORS.inc(labels(model) + (error["Code"],))
+
+    def after_call_error(context, exception, **kwargs):
+        # Raised before a response was parsed (connection errors, timeouts); no model is passed here.
+        started = context.pop(_START_KEY, None)
+        if started is None:
+            return
+        key = (service, region, started[1])
+        AWS_CALL_SECONDS.observe(key, time.perf_counter() - started[0])
+        AWS_CALL_ERRORS.inc(key + (type(exception).__name__,))
+
+    def needs_retry(response, operation, **kwargs):
+        if response is not None:
+            code = response[1].get("Error", {}).get("Code")
+            if code in THROTTLING_ERROR_CODES:
+                AWS_CALL_THROTTLES.inc(labels(operation))
+
+    events = client.meta.events
+    events.register_first("before-call", before_call)
+    events.register_last("after-call", after_call)
+    events.register_last("after-call-error", after_call_error)
+    events.register("needs-retry", needs_retry)
+    return client
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would otherwise flood the monitor's output
+
+
+def start_metrics_server(port, host="0.0.0.0", registry=REGISTRY):
+    """Serves GET /metrics from a daemon thread, for processes that have no web framework. Returns the server."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -79,6 +79,8 @@ resource "aws_instance" "main" {
   tags = {
     Name        = "Main-EC2-Instance"
     Environment = "failover-pair"
+    DR-Role     = "primary"
+    DR-Pair     = "failover-pair"
     Region      = var.primary_aws_region
   }
 }
@@ -164,6 +166,8 @@ resource "aws_instance" "backup" {
   tags = {
     Name        = "Backup-EC2-Instance"
     Environment = "failover-pair"
+    DR-Role     = "backup"
+    DR-Pair     = "failover-pair"
     Region      = var.secondary_aws_region
   }
 }
@@ -183,7 +187,8 @@ resource "aws_iam_policy" "home_server_ec2_manager_policy" {
           "ec2:DescribeInstances",
           "ec2:DescribeInstanceStatus",
           "cloudwatch:DescribeAlarms",
-          "cloudwatch:GetMetricStatistics"
+          "cloudwatch:GetMetricStatistics",
+          "cloudwatch:GetMetricData"
         ]
         Resource = "*"
       },
@@ -194,12 +199,58 @@ resource "aws_iam_policy" "home_server_ec2_manager_policy" {
           "ec2:StopInstances"
         ]
         Resource = "*" # Scope down with conditions if possible.
+      },
+      { # Failover handler: consume alarm notifications from the SQS queue
+        Effect = "Allow"
+        Action = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:DeleteMessageBatch",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = aws_sqs_queue.failover_events.arn
       }
     ]
   })
   tags = { Purpose = "FailoverAutomation" }
 }
 
+# --- Alarm notifications for the failover handler (in Primary Region) ---
+resource "aws_sns_topic" "failover_alerts" {
+  provider = aws.primary
+  name     = "main-instance-failover-alerts"
+}
+
+resource "aws_sqs_queue" "failover_events" {
+  provider                   = aws.primary
+  name                       = "main-instance-failover-events"
+  receive_wait_time_seconds  = 20  # Long polling by default
+  visibility_timeout_seconds = 60  # A failed start is retried after this
+  message_retention_seconds  = 3600
+}
+
+resource "aws_sqs_queue_policy" "failover_events" {
+  provider  = aws.primary
+  queue_url = aws_sqs_queue.failover_events.id
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Effect    = "Allow"
+      Principal = { Service = "sns.amazonaws.com" }
+      Action    = "sqs:SendMessage"
+      Resource  = aws_sqs_queue.failover_events.arn
+      Condition = { ArnEquals = { "aws:SourceArn" = aws_sns_topic.failover_alerts.arn } }
+    }]
+  })
+}
+
+resource "aws_sns_topic_subscription" "failover_events" {
+  provider  = aws.primary
+  topic_arn = aws_sns_topic.failover_alerts.arn
+  protocol  = "sqs"
+  endpoint  = aws_sqs_queue.failover_events.arn
+}
+
 # --- CloudWatch Alarm for Main Instance Health (in Primary Region) ---
 resource "aws_cloudwatch_metric_alarm" "main_instance_unhealthy" {
   provider            = aws.primary
@@ -218,10 +269,9 @@ resource "aws_cloudwatch_metric_alarm" "main_instance_unhealthy" {
     InstanceId = aws_instance.main.id
   }
 
-  # NOTE: alarm_actions and ok_actions are now empty as SNS is removed.
-  # If you need notifications, you'll need to re-add SNS or another notification method.
-  alarm_actions = []
-  ok_actions    = []
+  # Alarm and OK transitions go to SNS -> SQS, where FailoverMonitor/failover_handler.py picks them up.
+  alarm_actions = [aws_sns_topic.failover_alerts.arn]
+  ok_actions    = [aws_sns_topic.failover_alerts.arn]
 }
 
 
@@ -252,6 +302,11 @@ output "backup_instance_region" {
   value       = var.secondary_aws_region
 }
 
+output "failover_sqs_queue_url" {
+  description = "URL of the SQS queue the failover handler consumes"
+  value       = aws_sqs_queue.failover_events.url
+}
+
 output "home_server_iam_policy_arn" {
   description = "ARN of the IAM policy for the home server"
   value       = aws_iam_policy.home_server_ec2_manager_policy.arn
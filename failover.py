@@ -1,52 +1,267 @@
+import os
 import subprocess
+import sys
 import requests
 import time
-import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "FailoverMonitor"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Shared"))
+from poll_scheduler import FAST_INTERVAL_SECONDS, AdaptivePollScheduler
+from health_probes import UNHEALTHY, HealthProber
+from aws_errors import is_throttling_error
+from client_pool import ClientPool
+from event_journal import EventJournal, setup_queue_logging
+from health_checks import IMPAIRED, fetch_region_health
 
 # Configuration
 EC2_INSTANCE_ID = "i-0dc17676ee962edcd"
 REGION = "eu-west-2"
-CHECK_INTERVAL = 60  # in seconds
-FRONTEND_CONTAINER = "disasterrecoverydashboard-frontend-1"
-BACKEND_CONTAINER = "disasterrecoverydashboard-backend-1"
+CHECK_INTERVAL = 60  # in seconds, while EC2 is running normally
+FAST_CHECK_INTERVAL = FAST_INTERVAL_SECONDS  # in seconds, while EC2 is down; the monitor's MONITOR_FAST_INTERVAL_SECONDS
+STATS_LOG_INTERVAL_SECONDS = 300 # How often the poll scheduler counters are logged
+# Optional health check for the application on the instance, e.g. http://<ec2-ip>:5000/api/status_check.
+# Probed every PROBE_INTERVAL_SECONDS between EC2 checks; a failing probe counts as EC2 being down.
+EC2_PROBE_URL = os.getenv("LOCAL_FAILOVER_PROBE_URL")
+
+# Local recovery: containers are found through their docker compose labels
+DOCKER_BIN = os.getenv("DOCKER_BIN", "docker")  # Point at a stand-in script to try the recovery without Docker
+COMPOSE_PROJECT = os.getenv("COMPOSE_PROJECT_NAME", "disasterrecoverydashboard")
+LOCAL_SERVICES = {  # compose service -> URL that answers once the service is ready
+    "backend": os.getenv("LOCAL_BACKEND_READY_URL", "http://localhost:5000/api/status_check"),
+    "frontend": os.getenv("LOCAL_FRONTEND_READY_URL", "http://localhost:3000/"),
+}
+DOCKER_TIMEOUT_SECONDS = 30
+READY_TIMEOUT_SECONDS = int(os.getenv("LOCAL_READY_TIMEOUT_SECONDS", "120"))
+READY_POLL_SECONDS = 1
+READY_PROBE_TIMEOUT_SECONDS = 2
+
+# Log lines are written to a size-rotated file by a background thread; state changes,
+# actions and errors also go to a compact JSONL journal (see Shared/event_journal.py).
+# Both are opened by the __main__ block below, so importing this module writes nothing.
+LOG_FILE = 'failover.log'
+JOURNAL_FILE = os.getenv("LOCAL_FAILOVER_JOURNAL_FILE", "local_failover_journal.jsonl") # Empty disables it
+journal = EventJournal(None)
 
-logging.basicConfig(filename='failover.log', level=logging.INFO)
+aws_clients = ClientPool() # One EC2 client for the life of the process instead of one per check
+http = requests.Session() # Keeps the readiness probe connections alive between polls
 
-def is_ec2_running():
+def is_ec2_running(scheduler=None):
+    """
+    Returns True if the instance is running and healthy, False if it is not (or cannot be reached),
+    and None if AWS throttled the check, which says nothing about the instance.
+    A running instance whose status checks fail or whose CloudWatch alarm is in ALARM counts as not running.
+    """
+    calls = 2 # DescribeInstanceStatus and DescribeAlarms (see Shared/health_checks.py)
     try:
-        ec2 = boto3.client('ec2', region_name=REGION)
-        response = ec2.describe_instance_status(InstanceIds=[EC2_INSTANCE_ID])
-        statuses = response.get('InstanceStatuses', [])
-        if not statuses:
-            logging.info("No instance status available (likely stopped or terminated).")
-            return False
-        state = statuses[0]['InstanceState']['Name']
-        logging.info(f"EC2 instance state: {state}")
+        if scheduler is not None:
+            time.sleep(sum(scheduler.reserve(REGION) for _ in range(calls)))
+        record = fetch_region_health(aws_clients.get('ec2', REGION), aws_clients.get('cloudwatch', REGION),
+                                     REGION, [EC2_INSTANCE_ID])[EC2_INSTANCE_ID]
+        if scheduler is not None:
+            for _ in range(calls):
+                scheduler.record_call(region=REGION)
+        journal.recovered('describe_instance_status', region=REGION)
+        state = 'impaired' if record['health'] == IMPAIRED else (record['state'] or 'not-found')
+        if journal.transition(EC2_INSTANCE_ID, state, pair='local', role='main', region=REGION):
+            logging.info(f"EC2 instance state: {state}" + (f" ({'; '.join(record['reasons'])})" if record['reasons'] else ""))
         return state == 'running'
     except Exception as e:
+        if is_throttling_error(e):
+            logging.warning(f"EC2 status check throttled, backing off: {e}")
+            journal.error('describe_instance_status', 'throttled', region=REGION)
+            if scheduler is not None:
+                scheduler.record_call(throttled=True, region=REGION)
+            return None
         logging.error(f"Error checking EC2 status: {e}")
+        journal.error('describe_instance_status', str(e), region=REGION)
+        if scheduler is not None:
+            scheduler.record_call(region=REGION)
+        return False
+
+def local_container_states():
+    """
+    Returns {service: {"id", "name", "state"}} for the compose project's containers from a single
+    `docker ps -a`. Containers are matched by their compose labels rather than by name, so a
+    renamed project or a recreated container (new name suffix) is still found.
+    """
+    fmt = '{{.ID}}\t{{.Names}}\t{{.State}}\t{{.Label "com.docker.compose.service"}}'
+    result = subprocess.run([DOCKER_BIN, "ps", "-a", "--filter", f"label=com.docker.compose.project={COMPOSE_PROJECT}",
+                             "--format", fmt], check=True, capture_output=True, text=True, timeout=DOCKER_TIMEOUT_SECONDS)
+    containers = {}
+    for line in result.stdout.splitlines():
+        fields = line.split("\t")
+        if len(fields) != 4 or fields[3] not in LOCAL_SERVICES:
+            continue
+        container_id, name, state, service = fields
+        # With several containers for one service (e.g. replicas), prefer one that is already running
+        if service not in containers or (state == "running" and containers[service]["state"] != "running"):
+            containers[service] = {"id": container_id, "name": name, "state": state}
+    return containers
+
+def is_ready(url):
+    """True if the service answers its readiness URL with a success status."""
+    try:
+        return http.get(url, timeout=READY_PROBE_TIMEOUT_SECONDS).ok
+    except requests.RequestException:
         return False
 
-def start_local_services():
+# Services whose container was started and which have not answered their readiness URL yet:
+# service -> when `docker start` was issued. Their wait carries over from one check to the next.
+starting_since = {}
+
+def _recover_service(service, container, wait_until):
+    """
+    Starts one container if it is not running, then probes its readiness URL until `wait_until`.
+    A started service keeps being waited for on later checks, up to READY_TIMEOUT_SECONDS after
+    its start, so the main loop is never held up for longer than one check's budget.
+    Returns the seconds from `docker start` until it was ready (0 if it needed no start), or None.
+    """
+    if container["state"] != "running":
+        action_started = time.time()
+        try:
+            subprocess.run([DOCKER_BIN, "start", container["id"]], check=True, capture_output=True, text=True,
+                           timeout=DOCKER_TIMEOUT_SECONDS)
+            ok = True
+            logging.info(f"Started {service} container {container['name']}.")
+        except (OSError, subprocess.SubprocessError) as e:
+            ok = False
+            logging.error(f"Error starting {service} container {container['name']}: {getattr(e, 'stderr', None) or e}")
+        journal.record('action', action='docker_start', pair='local', subject=container['name'], service=service,
+                       fromState=container['state'], ok=ok, durationMs=round((time.time() - action_started) * 1000, 1))
+        if not ok:
+            starting_since.pop(service, None)
+            return None
+        starting_since.setdefault(service, action_started)
+
+    url = LOCAL_SERVICES[service]
+    since = starting_since.get(service)
+    # A container that was already running, and not started by us, gets one probe; the next check probes it again
+    give_up_at = since + READY_TIMEOUT_SECONDS if since is not None else 0
+    deadline = min(wait_until, give_up_at)
+    while not is_ready(url):
+        now = time.time()
+        if now >= give_up_at:
+            starting_since.pop(service, None)
+            logging.warning(f"{service} is not ready at {url}.")
+            return None
+        if now >= deadline:
+            return None # Still starting; checked again on the next poll
+        time.sleep(min(READY_POLL_SECONDS, deadline - now))
+    starting_since.pop(service, None)
+    return time.time() - since if since is not None else 0.0
+
+def recover_local_services(wait_seconds=FAST_CHECK_INTERVAL):
+    """
+    Brings the local services up: one batched `docker ps`, a parallel `docker start` for the
+    containers that are not running, then waits on each service's readiness URL rather than on
+    the start command's exit code. Readiness is waited for at most `wait_seconds` per call; services
+    still starting are picked up again by the next call. Already-running, ready services cost one
+    HTTP request each. Returns True when every service is ready.
+    """
+    started = time.time()
     try:
-        # Start backend
-        subprocess.run(["docker", "start", BACKEND_CONTAINER], check=True)
-        logging.info("Backend started successfully.")
-        # Start frontend
-        subprocess.run(["docker", "start", FRONTEND_CONTAINER], check=True)
-        logging.info("Frontend started successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error starting local services: {e}")
-
-def main():
+        containers = local_container_states()
+        journal.recovered('docker_ps')
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.error(f"Error listing local containers: {getattr(e, 'stderr', None) or e}")
+        journal.error('docker_ps', str(e))
+        return False
+
+    missing = [service for service in LOCAL_SERVICES if service not in containers]
+    if missing:
+        logging.error(f"No container for {', '.join(missing)} in compose project {COMPOSE_PROJECT}; run `docker compose up` once to create them.")
+        journal.error('local_containers', f"missing: {', '.join(missing)}")
+    else:
+        journal.recovered('local_containers')
+
+    waited_for = [service for service, container in containers.items()
+                  if container["state"] != "running" or service in starting_since]
+    with ThreadPoolExecutor(max_workers=max(1, len(containers))) as pool:
+        futures = {service: pool.submit(_recover_service, service, container, started + wait_seconds)
+                   for service, container in containers.items()}
+        ready_after = {service: future.result() for service, future in futures.items()}
+
+    for service, seconds in ready_after.items():
+        state = "ready" if seconds is not None else "starting" if service in starting_since else "not-ready"
+        journal.transition(f"local:{service}", state, pair='local')
+    all_ready = not missing and all(seconds is not None for seconds in ready_after.values())
+    if waited_for and not any(service in starting_since for service in waited_for):
+        # Reported once, when every started service is ready or has been given up on
+        slowest = max((seconds for seconds in ready_after.values() if seconds is not None), default=0.0)
+        report = ", ".join(f"{service} {seconds:.1f}s" if seconds is not None else f"{service} not ready"
+                           for service, seconds in ready_after.items())
+        logging.info(f"Local recovery {'complete' if all_ready else 'incomplete'} ({report}).")
+        journal.record('action', action='start_local_services', pair='local', ok=all_ready, services=waited_for,
+                       durationMs=round(slowest * 1000, 1),
+                       secondsToReady={service: round(seconds, 3) for service, seconds in ready_after.items() if seconds is not None})
+    return all_ready
+
+def probe_ec2(prober):
+    """Runs one round of health probes. Returns True if the probe became unhealthy or recovered."""
+    changed = prober.probe_all()
+    if EC2_INSTANCE_ID not in changed:
+        return False
+    old, new, error = changed[EC2_INSTANCE_ID]
+    if new == UNHEALTHY:
+        logging.warning(f"Health probe for {EC2_INSTANCE_ID} is failing ({error}).")
+    else:
+        logging.info(f"Health probe for {EC2_INSTANCE_ID} is {new}.")
+    journal.transition(f"probe:{EC2_INSTANCE_ID}", new, url=EC2_PROBE_URL, error=error if new == UNHEALTHY else None)
+    return UNHEALTHY in (old, new)
+
+def wait_for_next_check(delay, prober=None):
+    """
+    Sleeps `delay` seconds until the next EC2 check. With a prober the wait is spent probing the
+    application every prober.interval seconds, and ends early when its health changes.
+    """
+    deadline = time.time() + delay
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        if prober is None:
+            time.sleep(remaining)
+            return
+        due = prober.seconds_until_due()
+        if due > 0:
+            time.sleep(min(remaining, due))
+        elif probe_ec2(prober):
+            return
+
+def main(prober=None):
+    scheduler = AdaptivePollScheduler(steady_interval=CHECK_INTERVAL, fast_interval=FAST_CHECK_INTERVAL, clock=time.monotonic)
+    if prober is None and EC2_PROBE_URL:
+        prober = HealthProber({EC2_INSTANCE_ID: EC2_PROBE_URL}, clock=time.time)
+    last_stats_log = time.monotonic()
     while True:
-        if not is_ec2_running():
-            logging.warning("EC2 is down. Starting local services...")
-            start_local_services()
+        scheduler.record_poll()
+        running = is_ec2_running(scheduler)
+        if running and prober is not None and prober.status(EC2_INSTANCE_ID) == UNHEALTHY:
+            logging.debug("EC2 is running but its application is not answering.")
+            running = False
+        recovered = False
+        if running is None:
+            logging.info("EC2 state unknown this check; keeping the current setup.")
+        elif not running:
+            if journal.transition('local_recovery', 'active', pair='local'):
+                logging.warning("EC2 is down. Starting local services...")
+            recovered = recover_local_services()
         else:
-            logging.info("EC2 is running normally.")
-        time.sleep(CHECK_INTERVAL)
+            journal.transition('local_recovery', 'idle', pair='local')
+            logging.debug("EC2 is running normally.")
+        if running is not None: # A throttled check backs off instead of polling fast
+            # Poll fast only while EC2 is down and the local services are not all ready yet;
+            # once they are, the failover is complete and steady polling is enough.
+            scheduler.set_urgent(not running and not recovered)
+        journal.transition('scheduler', 'fast' if scheduler.urgent else 'steady', pair='local')
+        if time.monotonic() - last_stats_log >= STATS_LOG_INTERVAL_SECONDS:
+            last_stats_log = time.monotonic()
+            logging.info(f"Poll scheduler: {scheduler.stats()}")
+        wait_for_next_check(scheduler.next_delay(), prober)
 
 if __name__ == "__main__":
+    setup_queue_logging(LOG_FILE, console=False)
+    journal = EventJournal(JOURNAL_FILE or None)
     main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+MetricsCollector: background refreshes woken by invalidate(), and one fetch per missing entry.
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Backend"))
+from collector import MetricsCollector
+
+CONFIGS = [{"id": "i-1", "region": "eu-west-2"}, {"id": "i-2", "region": "eu-west-2"}]
+
+
+def records(configs, value=1):
+    return [{"instanceId": c["id"], "region": c["region"], "cpu": value} for c in configs]
+
+
+def test_invalidate_during_a_refresh_triggers_another_refresh():
+    refreshes = []
+    second_refresh = threading.Event()
+    collector = None
+
+    def fetch(configs):
+        refreshes.append(len(configs))
+        if len(refreshes) == 1:
+            collector.invalidate("i-1", "eu-west-2")  # Lands while the first refresh is running
+        else:
+            second_refresh.set()
+        return records(configs)
+
+    collector = MetricsCollector({"cpu": fetch}, lambda: CONFIGS, interval=60)
+    collector.start()
+
+    assert second_refresh.wait(5)
+
+
+def test_concurrent_requests_for_a_missing_entry_share_one_fetch():
+    fetched = []
+
+    def fetch(configs):
+        fetched.extend(c["id"] for c in configs)
+        time.sleep(0.2)
+        return records(configs, value=len(fetched))
+
+    collector = MetricsCollector({"cpu": fetch}, lambda: [], interval=60)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: collector.get("cpu", CONFIGS), range(8)))
+
+    assert sorted(fetched) == ["i-1", "i-2"]
+    assert all([r["instanceId"] for r in result] == ["i-1", "i-2"] for result in results)
+
+
+def test_waiting_requests_see_a_failed_fetch_as_missing_records():
+    calls = []
+
+    def fetch(configs):
+        calls.append(configs)
+        time.sleep(0.2)
+        if len(calls) == 1:
+            raise RuntimeError("AWS is down")
+        return records(configs)
+
+    collector = MetricsCollector({"cpu": fetch}, lambda: [], interval=60)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(collector.get, "cpu", CONFIGS[:1])
+        time.sleep(0.05)
+        second = pool.submit(collector.get, "cpu", CONFIGS[:1])
+        assert second.result(timeout=5) == []
+        assert isinstance(first.exception(timeout=5), RuntimeError)
+
+    assert [r["instanceId"] for r in collector.get("cpu", CONFIGS[:1])] == ["i-1"]  # The next request fetches it again
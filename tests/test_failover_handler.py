@@ -0,0 +1,128 @@
+"""
+failover_handler.poll_once against a moto SQS queue: dedupe, deletion, redrive of failed starts and malformed messages.
+"""
+import json
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FailoverMonitor"))
+import failover_handler
+
+REGION = "eu-west-2"
+
+
+def alarm_body(state="ALARM", changed_at="2025-06-02T19:50:56.123+0000", name=failover_handler.PRIMARY_ALARM_NAME, sns=True):
+    alarm = json.dumps({"AlarmName": name, "NewStateValue": state, "StateChangeTime": changed_at,
+                        "Trigger": {"Dimensions": [{"name": "InstanceId", "value": "i-main"}]}})
+    return json.dumps({"Type": "Notification", "Message": alarm}) if sns else alarm
+
+
+class FakeStarts:
+    """Stands in for EC2FailoverScript.start_instance and records every call."""
+
+    def __init__(self, ok=True):
+        self.ok = ok
+        self.calls = []
+
+    def __call__(self, instance_id, region):
+        self.calls.append((instance_id, region))
+        return self.ok
+
+
+@pytest.fixture
+def sqs(monkeypatch):
+    monkeypatch.setattr(failover_handler, "RECEIVE_WAIT_SECONDS", 0)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with mock_aws():
+        yield boto3.client("sqs", region_name=REGION)
+
+
+@pytest.fixture
+def queues(sqs):
+    """A failover queue whose messages go to a dead-letter queue after two failed receives."""
+    dead_letter_url = sqs.create_queue(QueueName="failover-dlq")["QueueUrl"]
+    dead_letter_arn = sqs.get_queue_attributes(QueueUrl=dead_letter_url, AttributeNames=["QueueArn"])["Attributes"]["QueueArn"]
+    queue_url = sqs.create_queue(QueueName="failover", Attributes={
+        "VisibilityTimeout": "0",
+        "RedrivePolicy": json.dumps({"deadLetterTargetArn": dead_letter_arn, "maxReceiveCount": "2"}),
+    })["QueueUrl"]
+    return queue_url, dead_letter_url
+
+
+def queued(sqs, queue_url):
+    attributes = sqs.get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"])["Attributes"]
+    return int(attributes["ApproximateNumberOfMessages"]) + int(attributes["ApproximateNumberOfMessagesNotVisible"])
+
+
+def test_started_backup_deletes_the_message_and_reports_latency(sqs, queues):
+    queue_url, _ = queues
+    sqs.send_message(QueueUrl=queue_url, MessageBody=alarm_body())
+    starts = FakeStarts()
+
+    latencies = failover_handler.poll_once(sqs, queue_url, failover_handler.AlarmDeduplicator(), [], start_instance=starts)
+
+    assert starts.calls == [(failover_handler.BACKUP_INSTANCE_ID, failover_handler.BACKUP_INSTANCE_REGION)]
+    assert len(latencies) == 1 and latencies[0]["queueToStartSeconds"] is not None
+    assert queued(sqs, queue_url) == 0
+
+
+def test_repeated_notifications_of_one_transition_start_the_backup_once(sqs, queues):
+    queue_url, _ = queues
+    for _ in range(3):
+        sqs.send_message(QueueUrl=queue_url, MessageBody=alarm_body())
+    sqs.send_message(QueueUrl=queue_url, MessageBody=alarm_body(sns=False))
+    dedupe, starts = failover_handler.AlarmDeduplicator(), FakeStarts()
+
+    while queued(sqs, queue_url):
+        failover_handler.poll_once(sqs, queue_url, dedupe, [], start_instance=starts)
+
+    assert len(starts.calls) == 1
+
+
+def test_failed_start_leaves_the_message_for_redrive(sqs, queues):
+    queue_url, dead_letter_url = queues
+    sqs.send_message(QueueUrl=queue_url, MessageBody=alarm_body())
+    dedupe, starts = failover_handler.AlarmDeduplicator(), FakeStarts(ok=False)
+
+    for _ in range(3):
+        failover_handler.poll_once(sqs, queue_url, dedupe, [], start_instance=starts)
+
+    # Retried on each redelivery (the dedupe entry is forgotten), then moved to the dead-letter queue.
+    assert len(starts.calls) == 2
+    assert queued(sqs, queue_url) == 0
+    assert queued(sqs, dead_letter_url) == 1
+
+
+@pytest.mark.parametrize("body", [
+    "not json",
+    json.dumps({"Type": "Notification", "Message": "not json"}),
+    json.dumps({"Type": "Notification", "Message": json.dumps(["AlarmName"])}),
+    json.dumps({"Type": "Notification", "Message": json.dumps({"AlarmName": "x"})}),
+    json.dumps(["a", "list"]),
+])
+def test_malformed_messages_are_deleted_without_a_start(sqs, queues, body):
+    queue_url, _ = queues
+    sqs.send_message(QueueUrl=queue_url, MessageBody=body)
+    starts = FakeStarts()
+
+    assert failover_handler.poll_once(sqs, queue_url, failover_handler.AlarmDeduplicator(), [], start_instance=starts) == []
+    assert starts.calls == []
+    assert queued(sqs, queue_url) == 0
+
+
+def test_other_alarms_and_ok_transitions_are_deleted_without_a_start(sqs, queues):
+    queue_url, _ = queues
+    sqs.send_message(QueueUrl=queue_url, MessageBody=alarm_body(state="OK"))
+    sqs.send_message(QueueUrl=queue_url, MessageBody=alarm_body(name="SomeOtherAlarm"))
+    starts = FakeStarts()
+
+    while queued(sqs, queue_url):
+        failover_handler.poll_once(sqs, queue_url, failover_handler.AlarmDeduplicator(), [], start_instance=starts)
+
+    assert starts.calls == []
@@ -0,0 +1,89 @@
+"""
+Tests for Backend/fanout.py against stubbed botocore clients made slow with an event hook.
+"""
+import os
+import sys
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from functools import partial
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Backend"))
+from fanout import fan_out
+
+SLOW_CALL_SECONDS = 0.3
+
+
+def slow_ec2_client(region, delay, instance_id):
+    """An EC2 client whose DescribeInstances answers after `delay` seconds with one stubbed instance."""
+    client = boto3.client("ec2", region_name=region, aws_access_key_id="test", aws_secret_access_key="test")
+    # before-call is answered by the Stubber's own handler, so the delay goes on an earlier event
+    client.meta.events.register("before-parameter-build.ec2.DescribeInstances", lambda **kwargs: time.sleep(delay))
+    stubber = Stubber(client)
+    stubber.add_response(
+        "describe_instances",
+        {"Reservations": [{"Instances": [{"InstanceId": instance_id, "State": {"Code": 16, "Name": "running"}}]}]},
+        expected_params=None,
+    )
+    stubber.activate()
+    return client
+
+
+def describe_ids(client):
+    response = client.describe_instances()
+    return [i["InstanceId"] for r in response["Reservations"] for i in r["Instances"]]
+
+
+@pytest.fixture
+def regions():
+    return ["eu-west-1", "eu-west-2", "eu-west-3", "eu-north-1"]
+
+
+def test_results_come_back_in_task_order(regions):
+    # The first task is the slowest, so completion order is the reverse of task order.
+    delays = [0.4, 0.3, 0.2, 0.1]
+    tasks = [
+        (region, partial(describe_ids, slow_ec2_client(region, delay, f"i-{index:017x}")))
+        for index, (region, delay) in enumerate(zip(regions, delays))
+    ]
+
+    results = fan_out(tasks, timeout=2)
+
+    assert [key for key, _, _ in results] == regions
+    assert [result for _, result, _ in results] == [[f"i-{index:017x}"] for index in range(len(regions))]
+    assert all(error is None for _, _, error in results)
+
+
+def test_total_latency_is_one_slow_call_not_the_sum(regions):
+    tasks = [
+        (region, partial(describe_ids, slow_ec2_client(region, SLOW_CALL_SECONDS, "i-0123456789abcdef0")))
+        for region in regions
+    ]
+
+    started = time.perf_counter()
+    results = fan_out(tasks, timeout=2)
+    elapsed = time.perf_counter() - started
+
+    assert all(error is None for _, _, error in results)
+    assert SLOW_CALL_SECONDS <= elapsed < SLOW_CALL_SECONDS * 2
+    assert elapsed < SLOW_CALL_SECONDS * len(regions)
+
+
+def test_call_past_its_deadline_is_reported_without_holding_up_the_others(regions):
+    tasks = [
+        (regions[0], partial(describe_ids, slow_ec2_client(regions[0], 1.0, "i-00000000000000001"))),
+        (regions[1], partial(describe_ids, slow_ec2_client(regions[1], 0.05, "i-00000000000000002"))),
+    ]
+
+    started = time.perf_counter()
+    results = fan_out(tasks, timeout=0.3)
+    elapsed = time.perf_counter() - started
+
+    (slow_key, slow_result, slow_error), (fast_key, fast_result, fast_error) = results
+    assert (slow_key, slow_result) == (regions[0], None)
+    assert isinstance(slow_error, FuturesTimeoutError)
+    assert (fast_key, fast_result, fast_error) == (regions[1], ["i-00000000000000002"], None)
+    assert elapsed < 0.8
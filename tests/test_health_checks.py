@@ -0,0 +1,71 @@
+"""
+fetch_region_health when DescribeAlarms fails: throttling is raised, other errors make the alarm state unknown.
+"""
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Shared"))
+from health_checks import DOWN, HEALTHY, IMPAIRED, UNKNOWN, fetch_region_health
+
+REGION = "eu-west-2"
+
+
+def status(instance_id, state="running", checks="ok"):
+    return {"InstanceId": instance_id, "InstanceState": {"Name": state},
+            "SystemStatus": {"Status": checks}, "InstanceStatus": {"Status": "ok"}}
+
+
+class Client:
+    """A client whose only paginator yields `pages`, or raises `error`."""
+
+    def __init__(self, pages=(), error=None):
+        self.pages, self.error = list(pages), error
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                if client.error is not None:
+                    raise client.error
+                return client.pages
+
+        return Paginator()
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "DescribeAlarms")
+
+
+EC2 = Client([{"InstanceStatuses": [status("i-ok"), status("i-bad", checks="impaired"), status("i-off", state="stopped")]}])
+IDS = ["i-ok", "i-bad", "i-off"]
+
+
+def test_alarm_in_alarm_state_makes_the_instance_impaired():
+    cloudwatch = Client([{"MetricAlarms": [{"AlarmName": "MainInstanceUnhealthyAlarm", "StateValue": "ALARM",
+                                            "Dimensions": [{"Name": "InstanceId", "Value": "i-ok"}]}]}])
+    records = fetch_region_health(EC2, cloudwatch, REGION, ["i-ok"])
+    assert records["i-ok"]["health"] == IMPAIRED
+
+
+@pytest.mark.parametrize("code", ["Throttling", "RequestLimitExceeded"])
+def test_throttled_alarm_lookup_is_raised(code):
+    with pytest.raises(ClientError):
+        fetch_region_health(EC2, Client(error=client_error(code)), REGION, IDS)
+
+
+def test_failed_alarm_lookup_is_unknown_not_healthy():
+    records = fetch_region_health(EC2, Client(error=client_error("AccessDenied")), REGION, IDS)
+
+    assert records["i-ok"]["health"] == UNKNOWN
+    assert records["i-ok"]["alarmsError"] and "alarm state unknown" in records["i-ok"]["reasons"][0]
+    # What the status checks already prove still stands.
+    assert records["i-bad"]["health"] == IMPAIRED
+    assert records["i-off"]["health"] == DOWN
+
+
+def test_skipping_alarms_keeps_the_status_check_verdict():
+    assert fetch_region_health(EC2, None, REGION, ["i-ok"])["i-ok"]["health"] == HEALTHY
@@ -0,0 +1,152 @@
+"""
+HealthProber's real HTTP and TCP checks against stub servers on 127.0.0.1, and combine_state.
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FailoverMonitor"))
+from health_probes import HEALTHY, UNHEALTHY, UNKNOWN, HealthProber, combine_state
+
+
+class StubApp:
+    """A local HTTP server whose answer (status code and delay) can be changed between probes."""
+
+    def __init__(self):
+        self.status, self.delay = 200, 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(stub.delay)
+                self.send_response(stub.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/status_check"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def app():
+    stub = StubApp()
+    yield stub
+    stub.close()
+
+
+def closed_port():
+    """A local port with nothing listening on it."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_prober(targets, **kwargs):
+    kwargs.setdefault("timeout", 0.3)
+    kwargs.setdefault("failure_threshold", 3)
+    kwargs.setdefault("success_threshold", 2)
+    return HealthProber(targets, **kwargs)
+
+
+def test_http_status_codes(app):
+    prober = make_prober({"main": app.url})
+    try:
+        for status, ok in ((200, True), (204, True), (302, True), (404, False), (500, False), (503, False)):
+            app.status = status
+            assert prober._probe("main")[0] is ok, status
+    finally:
+        prober.close()
+
+
+def test_failures_are_debounced_before_turning_unhealthy_and_back(app):
+    prober = make_prober({"main": app.url})
+    try:
+        assert prober.probe_all() == {"main": (UNKNOWN, HEALTHY, None)}  # One success is enough from unknown
+
+        app.status = 500
+        assert prober.probe_all() == {} and prober.probe_all() == {}
+        assert prober.status("main") == HEALTHY
+        changed = prober.probe_all()
+        assert changed["main"][:2] == (HEALTHY, UNHEALTHY) and "500" in changed["main"][2]
+
+        app.status = 200
+        assert prober.probe_all() == {}
+        assert prober.probe_all()["main"][:2] == (UNHEALTHY, HEALTHY)
+    finally:
+        prober.close()
+
+
+def test_slow_answer_times_out_and_counts_as_a_failure(app):
+    app.delay = 0.5
+    prober = make_prober({"main": app.url}, timeout=0.1, failure_threshold=1)
+    try:
+        started = time.perf_counter()
+        changed = prober.probe_all()
+        assert time.perf_counter() - started < 0.45
+        assert changed["main"][:2] == (UNKNOWN, UNHEALTHY)
+        assert prober.snapshot()["main"]["lastError"]
+    finally:
+        prober.close()
+
+
+def test_connection_refused_over_http_and_tcp():
+    port = closed_port()
+    prober = make_prober({"http": f"http://127.0.0.1:{port}/", "tcp": f"tcp://127.0.0.1:{port}"}, failure_threshold=2)
+    try:
+        assert prober.probe_all() == {}
+        assert set(prober.probe_all()) == {"http", "tcp"}
+        assert prober.status("http") == prober.status("tcp") == UNHEALTHY
+    finally:
+        prober.close()
+
+
+def test_tcp_probe_is_healthy_while_the_port_accepts_connections():
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    prober = make_prober({"main": f"tcp://127.0.0.1:{listener.getsockname()[1]}"}, failure_threshold=1)
+    try:
+        assert prober.probe_all() == {"main": (UNKNOWN, HEALTHY, None)}
+        listener.close()
+        assert prober.probe_all()["main"][:2] == (HEALTHY, UNHEALTHY)
+    finally:
+        listener.close()
+        prober.close()
+
+
+def test_probes_run_concurrently(app):
+    app.delay = 0.2
+    prober = make_prober({f"main-{i}": app.url for i in range(5)}, timeout=1)
+    try:
+        started = time.perf_counter()
+        prober.probe_all()
+        assert time.perf_counter() - started < 0.2 * 3
+        assert all(prober.status(name) == HEALTHY for name in prober.targets)
+    finally:
+        prober.close()
+
+
+@pytest.mark.parametrize("ec2_state, probe_status, expected", [
+    ("running", HEALTHY, "running"),
+    ("running", UNKNOWN, "running"),
+    ("running", UNHEALTHY, "impaired"),
+    ("stopped", UNHEALTHY, "stopped"),
+    ("pending", UNHEALTHY, "pending"),
+    (None, UNHEALTHY, None),
+])
+def test_combine_state(ec2_state, probe_status, expected):
+    assert combine_state(ec2_state, probe_status) == expected
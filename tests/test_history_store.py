@@ -0,0 +1,59 @@
+"""
+HistoryStore rollups: 1-minute samples fold into 5-minute and 1-hour averages; backfilled rollups are final.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Backend"))
+from history_store import HistoryStore
+
+HOUR = 1_750_000_000 // 3600 * 3600
+
+
+@pytest.fixture(params=["memory", "mmap"])
+def store(request, tmp_path):
+    return HistoryStore(str(tmp_path) if request.param == "mmap" else None)
+
+
+def test_minute_samples_are_averaged_into_rollups(store):
+    for minute, value in enumerate((10, 20, 30, 40, 50, 60)):
+        store.record("i-1", "cpu", HOUR + minute * 60, value)
+
+    assert store.query("i-1", "cpu", HOUR, HOUR + 299, 300) == ([[HOUR, 30.0]], [])
+    assert store.query("i-1", "cpu", HOUR, HOUR, 3600) == ([[HOUR, 35.0]], [])
+
+
+def test_recording_a_minute_again_replaces_it(store):
+    store.record("i-1", "cpu", HOUR, 10)
+    store.record("i-1", "cpu", HOUR + 60, 20)
+    store.record("i-1", "cpu", HOUR + 60, 40)
+
+    assert store.query("i-1", "cpu", HOUR, HOUR, 300)[0] == [[HOUR, 25.0]]
+
+
+def test_backfilled_rollup_is_not_averaged_with_later_samples(store):
+    store.record_rollup("i-1", "cpu", 300, HOUR, 80.0)
+    store.record_rollup("i-1", "cpu", 3600, HOUR, 50.0)
+    store.record("i-1", "cpu", HOUR + 60, 0.0)
+
+    assert store.query("i-1", "cpu", HOUR, HOUR, 300)[0] == [[HOUR, 80.0]]
+    assert store.query("i-1", "cpu", HOUR, HOUR, 3600)[0] == [[HOUR, 50.0]]
+    assert store.query("i-1", "cpu", HOUR + 60, HOUR + 60, 60)[0] == [[HOUR + 60, 0.0]]
+
+
+def test_backfill_does_not_overwrite_buckets_that_already_have_samples(store):
+    store.record("i-1", "cpu", HOUR, 10)
+    store.record_rollup("i-1", "cpu", 300, HOUR, 80.0)
+    store.record("i-1", "cpu", HOUR + 60, 30)
+
+    assert store.query("i-1", "cpu", HOUR, HOUR, 300)[0] == [[HOUR, 20.0]]
+
+
+def test_final_slots_survive_a_restart(tmp_path):
+    HistoryStore(str(tmp_path)).record_rollup("i-1", "cpu", 300, HOUR, 80.0)
+    store = HistoryStore(str(tmp_path))
+    store.record("i-1", "cpu", HOUR + 60, 0.0)
+
+    assert store.query("i-1", "cpu", HOUR, HOUR, 300)[0] == [[HOUR, 80.0]]
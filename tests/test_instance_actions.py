@@ -0,0 +1,69 @@
+"""
+Request validation for POST /api/instances/actions; malformed bodies must get a 400, never a 500.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("AWS_PREWARM_CLIENTS", "false")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Backend"))
+import flaskBackend
+
+
+@pytest.fixture
+def client(monkeypatch):
+    submitted = []
+    def submit(action, targets):
+        submitted.append((action, targets))
+        return {"jobId": "job-1", "action": action, "status": "pending"}
+    monkeypatch.setattr(flaskBackend.instance_jobs, "submit", submit)
+    client = flaskBackend.app.test_client()
+    client.submitted = submitted
+    return client
+
+
+@pytest.mark.parametrize("entry", [
+    {"instanceId": ["i-1"], "region": "us-east-1"},
+    {"instanceId": 42, "region": "us-east-1"},
+    {"instanceId": "i-1", "region": ["us-east-1"]},
+    {"instanceId": {"id": "i-1"}},
+    ["i-1"],
+    7,
+])
+def test_non_string_ids_are_rejected_with_their_index(client, entry):
+    response = client.post("/api/instances/actions",
+                           json={"action": "start", "instances": [{"instanceId": "i-ok", "region": "us-east-1"}, entry]})
+
+    assert response.status_code == 400
+    assert response.get_json()["index"] == 1
+    assert client.submitted == []
+
+
+def test_missing_region_for_an_unknown_instance_is_rejected(client):
+    response = client.post("/api/instances/actions", json={"action": "stop", "instances": [{"instanceId": "i-unknown"}]})
+
+    assert response.status_code == 400
+    assert response.get_json()["instances"] == [{"instanceId": "i-unknown"}]
+    assert client.submitted == []
+
+
+@pytest.mark.parametrize("body", [
+    ["start", "i-1"],
+    {"action": "start", "instances": "i-1"},
+    {"action": "start", "instances": {"instanceId": "i-1", "region": "us-east-1"}},
+    {"action": "start", "instances": []},
+])
+def test_non_list_payloads_are_rejected(client, body):
+    response = client.post("/api/instances/actions", json=body)
+
+    assert response.status_code == 400
+    assert client.submitted == []
+
+
+def test_valid_entries_are_deduplicated_and_submitted(client):
+    entry = {"instanceId": "i-1", "region": "us-east-1"}
+    response = client.post("/api/instances/actions", json={"action": "start", "instances": [entry, entry]})
+
+    assert response.status_code == 202
+    assert client.submitted == [("start", [("i-1", "us-east-1")])]
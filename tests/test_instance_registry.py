@@ -0,0 +1,83 @@
+"""
+InstanceRegistry discovery: applied as a diff, and never holding the lock while talking to AWS.
+"""
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Backend"))
+from instance_registry import InstanceRegistry
+
+STATIC = {"id": "i-static", "region": "eu-west-2", "name": "static", "role": None, "pair": None}
+
+
+def instance(instance_id, role="main", pair="web", name=None):
+    tags = [{"Key": "DR-Role", "Value": role}, {"Key": "DR-Pair", "Value": pair}]
+    if name:
+        tags.append({"Key": "Name", "Value": name})
+    return {"InstanceId": instance_id, "Tags": tags}
+
+
+class FakeEC2:
+    """A client whose describe_instances paginator returns `fleet[region]`, optionally after a gate opens."""
+
+    def __init__(self, fleet, gate=None):
+        self.fleet = fleet
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self, service, region):
+        client = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                client.calls += 1
+                if client.gate is not None:
+                    client.gate.wait(5)
+                return [{"Reservations": [{"Instances": list(client.fleet.get(region, []))}]}]
+
+        class Client:
+            def get_paginator(self, name):
+                return Paginator()
+
+        return Client()
+
+
+def test_refresh_applies_adds_updates_and_removals():
+    ec2 = FakeEC2({"eu-west-2": [instance("i-1"), instance("i-2", role="backup")], "eu-west-1": [instance("i-3")]})
+    registry = InstanceRegistry(ec2, ["eu-west-2", "eu-west-1"], static_configs=[STATIC])
+    registry.refresh()
+    assert [c["id"] for c in registry.configs()] == ["i-static", "i-1", "i-2", "i-3"]
+
+    ec2.fleet["eu-west-2"] = [instance("i-2", role="main", name="web-2")]
+    registry.refresh()
+    assert registry.get("i-1") is None
+    assert registry.get("i-2")["role"] == "main" and registry.get("i-2")["name"] == "web-2"
+    assert registry.get("i-static") == STATIC
+
+
+def test_failed_region_keeps_what_was_known():
+    ec2 = FakeEC2({"eu-west-2": [instance("i-1")]})
+    registry = InstanceRegistry(ec2, ["eu-west-2"])
+    registry.refresh()
+    registry.get_client = lambda service, region: None
+
+    registry.refresh()
+    assert registry.get("i-1") is not None
+
+
+def test_lookups_answer_while_the_first_discovery_is_waiting_on_aws():
+    gate = threading.Event()
+    ec2 = FakeEC2({"eu-west-2": [instance("i-1")]}, gate=gate)
+    registry = InstanceRegistry(ec2, ["eu-west-2"], static_configs=[STATIC], refresh_interval=3600)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        first = [pool.submit(registry.configs) for _ in range(3)]
+        lookup = pool.submit(registry.get, "i-static")
+        assert lookup.result(timeout=1) == STATIC  # Not blocked behind the DescribeInstances call
+        gate.set()
+        results = [future.result(timeout=5) for future in first]
+
+    assert all([c["id"] for c in result] == ["i-static", "i-1"] for result in results)
+    assert ec2.calls == 1  # Concurrent first requests share one discovery
@@ -0,0 +1,62 @@
+"""
+Conditional GET /api/instances: the ETag is weak, ignores fetchedAt and is compared weakly.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("AWS_PREWARM_CLIENTS", "false")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Backend"))
+import flaskBackend
+
+CONFIGS = [{"id": f"i-{n}", "region": "eu-west-2", "name": f"node-{n}", "role": "main", "pair": None} for n in range(20)]
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    fleet = {"cpu": 12.5, "fetchedAt": "2025-06-02T19:50:00+00:00"}
+
+    def get(kind, configs):
+        key = "cpu" if kind == "cpu" else "uptime"
+        return [{"instanceId": c["id"], "region": c["region"], key: fleet["cpu"], "fetchedAt": fleet["fetchedAt"]}
+                for c in configs]
+
+    monkeypatch.setattr(flaskBackend, "get_instance_configs", lambda: CONFIGS)
+    monkeypatch.setattr(flaskBackend.metrics_collector, "get", get)
+    return fleet
+
+
+@pytest.fixture
+def client():
+    return flaskBackend.app.test_client()
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip"])
+def test_etag_is_weak_and_survives_a_refresh_that_changes_only_fetched_at(client, fleet, encoding):
+    first = client.get("/api/instances", headers={"Accept-Encoding": encoding})
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and etag.startswith('W/"')
+
+    fleet["fetchedAt"] = "2025-06-02T19:51:00+00:00"
+    again = client.get("/api/instances", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+
+
+def test_strong_form_of_the_tag_also_matches(client, fleet):
+    etag = client.get("/api/instances").headers["ETag"]
+    assert client.get("/api/instances", headers={"If-None-Match": etag[2:]}).status_code == 304
+
+
+def test_changed_rows_get_a_new_tag(client, fleet):
+    etag = client.get("/api/instances").headers["ETag"]
+    fleet["cpu"] = 80.0
+    response = client.get("/api/instances", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+
+def test_gzip_and_identity_bodies_have_different_tags(client, fleet):
+    plain = client.get("/api/instances").headers["ETag"]
+    gzipped = client.get("/api/instances", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] != plain
@@ -0,0 +1,187 @@
+"""
+failover.py's local recovery driven through DOCKER_BIN pointing at a stub docker CLI, with
+readiness URLs served by a local HTTP stub that reports a service ready once the stub CLI started it.
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import failover
+
+START_SECONDS = 0.4
+
+# Keeps one JSON file per container in $FAKE_DOCKER_DIR; `start` takes FAKE_DOCKER_START_SECONDS and
+# the service answers its readiness URL FAKE_DOCKER_READY_SECONDS later ("never" for a service that hangs).
+STUB_DOCKER = '''
+import json, os, sys, time
+
+directory = os.environ["FAKE_DOCKER_DIR"]
+args = sys.argv[1:]
+if args[0] == "ps":
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                c = json.load(f)
+            print(f"{name[:-5]}\\tproject-{c['service']}-1\\t{c['state']}\\t{c['service']}")
+elif args[0] == "start":
+    path = os.path.join(directory, args[1] + ".json")
+    with open(path) as f:
+        if json.load(f).get("fail_start"):
+            sys.exit(f"Error response from daemon: cannot start container {args[1]}")
+    began = time.time()
+    time.sleep(float(os.environ["FAKE_DOCKER_START_SECONDS"]))
+    with open(path) as f:
+        c = json.load(f)
+    ready = os.environ["FAKE_DOCKER_READY_SECONDS"]
+    c.update(state="running", ready_at=None if ready == "never" else time.time() + float(ready))
+    with open(path, "w") as f:
+        json.dump(c, f)
+    with open(os.path.join(directory, args[1] + ".started"), "w") as f:
+        f.write(f"{began} {time.time()}")
+else:
+    sys.exit(f"unsupported: {args}")
+'''
+
+
+class Docker:
+    """The stub CLI's container table, plus a readiness server answering for the services it started."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        docker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                ready = any(c["service"] == self.path.strip("/") and c["state"] == "running"
+                            and c.get("ready_at") is not None and time.time() >= c["ready_at"]
+                            for c in docker.containers().values())
+                self.send_response(200 if ready else 503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add(self, container_id, service, state, ready_at=None, fail_start=False):
+        with open(os.path.join(self.directory, container_id + ".json"), "w") as f:
+            json.dump({"service": service, "state": state, "ready_at": ready_at, "fail_start": fail_start}, f)
+
+    def containers(self):
+        containers = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            with open(path) as f:
+                containers[os.path.basename(path)[:-5]] = json.load(f)
+        return containers
+
+    def starts(self):
+        """{container_id: (began, ended)} for every `docker start` the stub ran."""
+        starts = {}
+        for path in glob.glob(os.path.join(self.directory, "*.started")):
+            with open(path) as f:
+                starts[os.path.basename(path)[:-8]] = tuple(map(float, f.read().split()))
+        return starts
+
+    def url(self, service):
+        return f"http://127.0.0.1:{self.server.server_port}/{service}"
+
+
+@pytest.fixture
+def docker(tmp_path, monkeypatch):
+    state = tmp_path / "containers"
+    state.mkdir()
+    script = tmp_path / "docker"
+    script.write_text(f"#!{sys.executable}\n{STUB_DOCKER}")
+    script.chmod(0o755)
+    stub = Docker(str(state))
+
+    monkeypatch.setenv("FAKE_DOCKER_DIR", str(state))
+    monkeypatch.setenv("FAKE_DOCKER_START_SECONDS", str(START_SECONDS))
+    monkeypatch.setenv("FAKE_DOCKER_READY_SECONDS", "0.2")
+    monkeypatch.setattr(failover, "DOCKER_BIN", str(script))
+    monkeypatch.setattr(failover, "LOCAL_SERVICES", {"backend": stub.url("backend"), "frontend": stub.url("frontend")})
+    monkeypatch.setattr(failover, "READY_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(failover, "starting_since", {})
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+def test_stopped_containers_are_started_in_parallel(docker):
+    docker.add("c1", "backend", "exited")
+    docker.add("c2", "frontend", "exited")
+
+    assert failover.recover_local_services(wait_seconds=5) is True
+
+    starts = docker.starts()
+    assert set(starts) == {"c1", "c2"}
+    (began_1, ended_1), (began_2, ended_2) = starts.values()
+    assert began_1 < ended_2 and began_2 < ended_1  # The two `docker start` runs overlapped
+    assert failover.starting_since == {}
+
+
+def test_running_and_ready_services_are_not_started(docker):
+    docker.add("c1", "backend", "running", ready_at=0)
+    docker.add("c2", "frontend", "running", ready_at=0)
+
+    assert failover.recover_local_services(wait_seconds=5) is True
+    assert docker.starts() == {}
+
+
+def test_only_the_stopped_service_is_started(docker):
+    docker.add("c1", "backend", "running", ready_at=0)
+    docker.add("c2", "frontend", "exited")
+
+    assert failover.recover_local_services(wait_seconds=5) is True
+    assert set(docker.starts()) == {"c2"}
+
+
+def test_readiness_wait_is_bounded_per_call_and_carries_over(docker, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_READY_SECONDS", "1.0")
+    docker.add("c1", "backend", "exited")
+    docker.add("c2", "frontend", "running", ready_at=0)
+
+    started = time.time()
+    assert failover.recover_local_services(wait_seconds=0.1) is False
+    # Returns once the start is done and the budget is spent, not after READY_TIMEOUT_SECONDS.
+    assert time.time() - started < START_SECONDS + 1
+    assert set(failover.starting_since) == {"backend"}
+
+    deadline = time.time() + 5
+    while not failover.recover_local_services(wait_seconds=0.1):
+        assert time.time() < deadline
+    assert list(docker.starts()) == ["c1"]  # Later calls wait for it rather than starting it again
+    assert failover.starting_since == {}
+
+
+def test_service_that_never_gets_ready_is_given_up_after_the_timeout(docker, monkeypatch):
+    monkeypatch.setenv("FAKE_DOCKER_READY_SECONDS", "never")
+    monkeypatch.setattr(failover, "READY_TIMEOUT_SECONDS", 0.8)
+    docker.add("c1", "backend", "exited")
+    docker.add("c2", "frontend", "running", ready_at=0)
+
+    assert failover.recover_local_services(wait_seconds=0.1) is False
+    assert "backend" in failover.starting_since
+    time.sleep(0.8)
+    assert failover.recover_local_services(wait_seconds=0.1) is False
+    assert failover.starting_since == {}
+    assert list(docker.starts()) == ["c1"]
+
+
+def test_failed_docker_start_reports_not_ready(docker):
+    docker.add("c1", "backend", "exited", fail_start=True)
+    docker.add("c2", "frontend", "running", ready_at=0)
+
+    assert failover.recover_local_services(wait_seconds=5) is False
+    assert docker.starts() == {}
+    assert failover.starting_since == {}
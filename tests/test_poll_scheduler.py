@@ -0,0 +1,116 @@
+"""
+Per-region throttle backoff in AdaptivePollScheduler, and EC2FailoverScript.read_states skipping backed-off regions.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FailoverMonitor"))
+import EC2FailoverScript
+from poll_scheduler import AdaptivePollScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    # No jitter: rng() == 0.5 makes the base interval exact and the backoff 75% of its nominal value.
+    return AdaptivePollScheduler(steady_interval=10, fast_interval=1, jitter=0, max_backoff=60,
+                                 rate=100, burst=100, clock=clock, rng=lambda: 0.5)
+
+
+def throttle(scheduler, region, times=1):
+    for _ in range(times):
+        scheduler.reserve(region)
+        scheduler.record_call(throttled=True, region=region)
+
+
+def test_throttled_region_backs_off_alone(scheduler):
+    scheduler.reserve("eu-west-1")
+    scheduler.record_call(region="eu-west-1")
+    throttle(scheduler, "eu-west-2", times=2)
+
+    assert scheduler.region_delay("eu-west-2") == pytest.approx(10 * 2 ** 2 * 0.75)
+    assert scheduler.region_delay("eu-west-1") == 0
+    # eu-west-1 can still be polled, so the next poll is not pushed out
+    assert scheduler.next_delay() == pytest.approx(10)
+    assert scheduler.stats()["backed_off_regions"] == ["eu-west-2"]
+
+
+def test_backoff_grows_is_capped_and_resets_on_success(scheduler, clock):
+    throttle(scheduler, "eu-west-2", times=1)
+    first = scheduler.region_delay("eu-west-2")
+    throttle(scheduler, "eu-west-2", times=5)
+    assert first < scheduler.region_delay("eu-west-2") <= 60
+
+    scheduler.record_call(region="eu-west-2")
+    assert scheduler.region_delay("eu-west-2") == 0
+    assert scheduler.consecutive_throttles == 0
+
+
+def test_poll_waits_for_the_first_region_out_of_backoff_when_all_are_throttled(scheduler, clock):
+    throttle(scheduler, "eu-west-1", times=1)  # 15 s
+    throttle(scheduler, "eu-west-2", times=2)  # 30 s
+
+    assert scheduler.next_delay() == pytest.approx(15)
+    clock.now += 15
+    assert scheduler.region_delay("eu-west-1") == 0
+    assert scheduler.next_delay() == pytest.approx(10)
+
+
+def test_throttling_does_not_make_polling_urgent(scheduler):
+    throttle(scheduler, "eu-west-2", times=3)
+    assert scheduler.urgent is False
+    assert scheduler.stats()["mode"] == "steady"
+
+
+def test_read_states_skips_backed_off_regions_and_reads_the_others(scheduler, clock, monkeypatch):
+    calls = []
+
+    def describe(region, instance_ids):
+        calls.append(region)
+        if region == "eu-west-2":
+            raise ClientError({"Error": {"Code": "RequestLimitExceeded", "Message": "slow down"}}, "DescribeInstances")
+        return {instance_id: "running" for instance_id in instance_ids}
+
+    monkeypatch.setattr(EC2FailoverScript, "describe_instance_states", describe)
+    pairs = [
+        EC2FailoverScript.FailoverPair("a", "i-a-main", "eu-west-1", "i-a-backup", "eu-west-1"),
+        EC2FailoverScript.FailoverPair("b", "i-b-main", "eu-west-2", "i-b-backup", "eu-west-1"),
+    ]
+
+    def read():
+        return asyncio.run(EC2FailoverScript.read_states(pairs, scheduler=scheduler, sleep=clock.sleep))
+
+    states, throttled, _ = read()
+    assert sorted(calls) == ["eu-west-1", "eu-west-2"] and throttled == {"eu-west-2"}
+
+    calls.clear()
+    clock.now += 1
+    states, throttled, _ = read()
+    assert calls == ["eu-west-1"]  # eu-west-2 is still backing off and is not called
+    assert throttled == {"eu-west-2"}
+    assert states[("i-b-main", "eu-west-2")] is None
+    assert states[("i-a-main", "eu-west-1")] == "running"
+
+    calls.clear()
+    clock.now += scheduler.region_delay("eu-west-2")
+    read()
+    assert sorted(calls) == ["eu-west-1", "eu-west-2"]